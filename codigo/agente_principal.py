@@ -10,49 +10,311 @@ Autor: Evaluación 2 - Everlast Chile
 Versión: 2.0 (Sin errores 400)
 """
 
+import asyncio
 import os
 import sys
 import json
+import re
 import requests
+import threading
 import time
+import uuid
 from pathlib import Path
 from dotenv import load_dotenv
-from typing import List, Dict, Optional
+from typing import AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
 
-from tools_everlast import buscar_documentos_everlast, simple_calculator
+from cliente_http import ErrorHTTP, ejecutar_sync, iterar_sync, obtener_cliente_async
+from presupuesto_tokens import (
+    PresupuestoTokens, contar_tokens, recortar_a_tokens, recortar_fragmentos
+)
+from tools_everlast import (
+    buscar_documentos_everlast_async, consultar_catalogo, obtener_cache_respuestas,
+    obtener_almacen_sesiones, obtener_embeddings_consultas_async, precalentar,
+    simple_calculator, version_vector_store
+)
+from sesiones import AlmacenSesiones
 
 
 # =============================================================================
 # MEMORIA SIMPLE
 # =============================================================================
 
+# Palabras que delatan un dato del cliente que conviene no perder al resumir
+PALABRAS_DATO = {
+    "kg", "kilos", "oz", "cm", "peso", "mido", "talla", "mano", "manos",
+    "region", "región", "comuna", "ciudad", "vivo", "santiago", "valparaíso",
+    "concepción", "presupuesto", "principiante", "intermedio", "avanzado",
+    "sparring", "saco", "competencia", "nombre", "llamo", "pedido", "orden"
+}
+
+
+def resumen_extractivo(resumen: str, mensajes: List[Dict]) -> str:
+    """
+    Resumen sin LLM (respaldo): agrega al resumen previo las frases del
+    cliente que traen datos (números, pesos, región, nivel...), sin repetir.
+    """
+    lineas = [l for l in resumen.splitlines() if l.strip()]
+    vistas = {l.lower() for l in lineas}
+    for msg in mensajes:
+        if msg["role"] != "user":
+            continue
+        for frase in re.split(r"(?<=[.!?])\s+|\n", msg["content"]):
+            frase = frase.strip()
+            palabras = set(re.findall(r"[a-záéíóúñü]+", frase.lower()))
+            if frase and (re.search(r"\d", frase) or palabras & PALABRAS_DATO):
+                linea = f"- Cliente: {frase}"
+                if linea.lower() not in vistas:
+                    vistas.add(linea.lower())
+                    lineas.append(linea)
+    return "\n".join(lineas)
+
+
 class MemoriaSimple:
-    """Memoria conversacional básica con límite de caracteres"""
-    def __init__(self, max_mensajes: int = 10, max_chars_por_mensaje: int = 1000):
+    """
+    Memoria conversacional acotada con resumen progresivo.
+    
+    Guarda los últimos max_mensajes mensajes textuales; los que salen de esa
+    ventana quedan pendientes y se pliegan en un resumen corriente
+    (resumir_async, fuera del camino crítico: el agente lo lanza después de
+    responder). El resumen se limita a max_tokens_resumen, así que lo que
+    ocupa una sesión no crece con el largo de la conversación.
+    
+    Si el resumen con LLM se atrasa o falla, los pendientes se pliegan con
+    resumen_extractivo (sin red), que conserva las frases con datos del cliente.
+    
+    Las operaciones toman un lock corto y no esperan nada dentro, así que es
+    segura tanto entre hilos como entre corrutinas del mismo loop.
+    obtener_historial() devuelve una copia: un turno en curso no ve mensajes
+    agregados por otro a la mitad.
+    """
+    def __init__(self, max_mensajes: int = 10, max_tokens_por_mensaje: int = 250,
+                 max_tokens_resumen: int = 300):
         self.historial = []
+        self.resumen = ""
         self.max_mensajes = max_mensajes
-        self.max_chars = max_chars_por_mensaje
+        self.max_tokens = max_tokens_por_mensaje
+        self.max_tokens_resumen = max_tokens_resumen
+        self._por_resumir: List[Dict] = []
+        self._generacion = 0  # cambia con limpiar() y con cada pliegue: descarta resúmenes en curso
+        self._resumiendo = False
+        self._lock = threading.Lock()
     
     def agregar(self, rol: str, contenido: str):
-        """Agrega mensaje truncando si es muy largo"""
-        if len(contenido) > self.max_chars:
-            contenido = contenido[:self.max_chars] + "... [truncado]"
+        """Agrega mensaje truncando si es muy largo; los más viejos pasan a resumirse"""
+        contenido = recortar_a_tokens(contenido, self.max_tokens)
+        
+        with self._lock:
+            self.historial.append({"role": rol, "content": contenido})
+            while len(self.historial) > self.max_mensajes:
+                self._por_resumir.append(self.historial.pop(0))
+            
+            # El resumen con LLM va atrasado: plegar sin red para no crecer
+            if len(self._por_resumir) > self.max_mensajes:
+                self._plegar(resumen_extractivo(self.resumen, self._por_resumir),
+                             len(self._por_resumir))
+    
+    def _plegar(self, nuevo_resumen: str, consumidos: int):
+        """Reemplaza el resumen y descarta los pendientes ya incluidos (con el lock tomado)"""
+        nuevo_resumen = nuevo_resumen.strip()
+        if contar_tokens(nuevo_resumen) > self.max_tokens_resumen:
+            # Sobre el tope se van las líneas más antiguas
+            lineas = nuevo_resumen.splitlines()
+            while len(lineas) > 1 and contar_tokens("\n".join(lineas)) > self.max_tokens_resumen:
+                lineas.pop(0)
+            nuevo_resumen = recortar_a_tokens("\n".join(lineas), self.max_tokens_resumen)
+        self.resumen = nuevo_resumen
+        del self._por_resumir[:consumidos]
+        self._generacion += 1
+    
+    def pendiente_resumen(self) -> bool:
+        """True si hay mensajes fuera de la ventana esperando entrar al resumen"""
+        with self._lock:
+            return bool(self._por_resumir) and not self._resumiendo
+    
+    async def resumir_async(self, resumidor: Callable[[str, List[Dict]], Awaitable[str]]):
+        """
+        Pliega los mensajes pendientes en el resumen.
+        
+        Args:
+            resumidor: Corrutina (resumen_previo, mensajes) -> resumen nuevo;
+                si falla o devuelve vacío se usa resumen_extractivo
+        """
+        with self._lock:
+            if self._resumiendo or not self._por_resumir:
+                return
+            self._resumiendo = True
+            generacion = self._generacion
+            resumen_previo = self.resumen
+            pendientes = [dict(msg) for msg in self._por_resumir]
         
-        self.historial.append({"role": rol, "content": contenido})
+        try:
+            try:
+                nuevo = (await resumidor(resumen_previo, pendientes)).strip()
+            except Exception as e:
+                print(f"⚠️  Resumen con LLM falló ({e}); usando resumen extractivo")
+                nuevo = ""
+            if not nuevo:
+                nuevo = resumen_extractivo(resumen_previo, pendientes)
+            
+            with self._lock:
+                # Si entretanto hubo limpiar() o un pliegue extractivo, este resumen ya no aplica
+                if generacion == self._generacion:
+                    self._plegar(nuevo, len(pendientes))
+        finally:
+            with self._lock:
+                self._resumiendo = False
     
     def obtener_historial(self, ultimos_n: Optional[int] = None):
         """Obtiene últimos N mensajes"""
         n = ultimos_n or self.max_mensajes
-        return self.historial[-n:]
+        with self._lock:
+            return [dict(msg) for msg in self.historial[-n:]]
+    
+    def vacia(self) -> bool:
+        """True si no hay turnos previos, resumen ni pendientes (nada personaliza el prompt)"""
+        with self._lock:
+            return not self.historial and not self.resumen and not self._por_resumir
+    
+    def obtener_resumen(self) -> str:
+        """Resumen de la parte de la conversación que ya salió de la ventana"""
+        with self._lock:
+            return self.resumen
     
     def limpiar(self):
         """Limpia toda la memoria"""
-        self.historial = []
+        with self._lock:
+            self.historial = []
+            self.resumen = ""
+            self._por_resumir = []
+            self._generacion += 1
+    
+    def a_dict(self) -> Dict:
+        """Estado serializable (JSON) para el almacén de sesiones"""
+        with self._lock:
+            return {
+                "historial": [dict(msg) for msg in self.historial],
+                "resumen": self.resumen,
+                "por_resumir": [dict(msg) for msg in self._por_resumir]
+            }
+    
+    def restaurar(self, estado: Dict):
+        """Reemplaza el contenido por un estado de a_dict() (descarta resúmenes en curso)"""
+        with self._lock:
+            self.historial = list(estado.get("historial", []))[-self.max_mensajes:]
+            self.resumen = estado.get("resumen", "")
+            self._por_resumir = list(estado.get("por_resumir", []))
+            self._generacion += 1
     
     def contar_tokens_aprox(self) -> int:
-        """Estimación aproximada de tokens (4 chars = 1 token)"""
-        total_chars = sum(len(msg["content"]) for msg in self.historial)
-        return total_chars // 4
+        """Tokens guardados (historial + resumen + pendientes) según el tokenizer del modelo"""
+        with self._lock:
+            contenidos = [msg["content"] for msg in self.historial + self._por_resumir]
+            contenidos.append(self.resumen)
+        return sum(contar_tokens(c) for c in contenidos)
+
+
+# =============================================================================
+# HERRAMIENTAS NATIVAS (function calling)
+# =============================================================================
+
+HERRAMIENTAS_NATIVAS = [
+    {
+        "type": "function",
+        "function": {
+            "name": "buscar_documentos",
+            "description": "Busca en los documentos de Everlast: recomendaciones de productos, "
+                           "guías de tallas y políticas de envío y devolución.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "consulta": {"type": "string", "description": "Qué buscar, en español"}
+                },
+                "required": ["consulta"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "catalogo",
+            "description": "Datos exactos del catálogo: SKU, precio por peso/talla y colores. "
+                           "Todos los filtros son opcionales y se combinan.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "sku": {"type": "string", "description": "Ej: GPL-002"},
+                    "categoria": {"type": "string", "description": "Ej: guantes, sacos, vendas, ropa"},
+                    "nombre": {"type": "string", "description": "Palabras del nombre, ej: pro style"},
+                    "color": {"type": "string"},
+                    "medida": {"type": "string", "description": "Peso o talla, ej: 16 oz, L/XL, 42"},
+                    "precio_min": {"type": "number", "description": "CLP"},
+                    "precio_max": {"type": "number", "description": "CLP"}
+                }
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "calcular",
+            "description": "Evalúa una expresión aritmética (+, -, *, /, paréntesis).",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "expresion": {"type": "string", "description": "Ej: 37990 * 0.85"}
+                },
+                "required": ["expresion"]
+            }
+        }
+    }
+]
+
+# Con tools nativas el formato lo define la API: el prompt queda en las reglas
+SYSTEM_PROMPT_NATIVO = """Eres un asistente experto de Everlast Chile.
+- Precios, SKUs, pesos, tallas y colores → catalogo
+- Recomendaciones, guías de tallas y políticas → buscar_documentos
+- Descuentos y totales → calcular
+Puedes llamar varias herramientas a la vez. Saludos y charla: responde directo.
+Sé breve y directo."""
+
+# Un 400 cambia al protocolo de texto solo si el cuerpo dice que tools /
+# tool_choice no se soportan (content_filter o largo de contexto también son 400)
+PATRON_TOOLS_NO_SOPORTADAS = re.compile(
+    r"(tools?|tool_choice|function[ _]?call\w*)\W.{0,80}?"
+    r"(not (be )?supported|unsupported|not (allowed|permitted)|unrecognized|unknown|extra)"
+    r"|(not support\w*|unsupported|not permitted|unrecognized|unknown)\W.{0,80}?(tools?|tool_choice)\b",
+    re.IGNORECASE | re.DOTALL
+)
+
+
+def _input_desde_argumentos(nombre: str, argumentos: Dict) -> str:
+    """Convierte los argumentos JSON de una tool_call al input de texto de la herramienta"""
+    if nombre == "catalogo":
+        filtros = [f"{clave}={argumentos[clave]}"
+                   for clave in ("sku", "categoria", "nombre", "color", "medida")
+                   if argumentos.get(clave)]
+        if argumentos.get("precio_min") is not None:
+            filtros.append(f"precio>={int(float(argumentos['precio_min']))}")
+        if argumentos.get("precio_max") is not None:
+            filtros.append(f"precio<={int(float(argumentos['precio_max']))}")
+        return "; ".join(filtros)
+    
+    clave = {"buscar_documentos": "consulta", "calcular": "expresion"}.get(nombre)
+    valor = argumentos.get(clave) if clave else None
+    if valor is None and argumentos:
+        valor = next(iter(argumentos.values()))
+    return str(valor or "")
+
+
+_tokens_tools: Optional[int] = None
+
+
+def _tokens_herramientas_nativas() -> int:
+    """Tokens que ocupan los esquemas de tools en cada request (se cuentan una vez)"""
+    global _tokens_tools
+    if _tokens_tools is None:
+        _tokens_tools = contar_tokens(json.dumps(HERRAMIENTAS_NATIVAS, ensure_ascii=False))
+    return _tokens_tools
 
 
 # =============================================================================
@@ -62,17 +324,35 @@ class MemoriaSimple:
 class AgenteEverlast:
     """Agente conversacional para Everlast Chile con manejo avanzado de errores"""
     
-    def __init__(self, api_key: str, base_url: str):
+    def __init__(self, api_key: str, base_url: str, id_sesion: Optional[str] = None,
+                 almacen: Optional[AlmacenSesiones] = None):
         self.api_key = api_key
         self.base_url = base_url
-        self.memoria = MemoriaSimple(max_mensajes=8, max_chars_por_mensaje=800)
         
-        # Prompt mejorado y más conciso
+        # La memoria vive en el almacén de sesiones: se carga al empezar cada
+        # turno y se guarda al terminar, así cualquier worker atiende la sesión
+        self.id_sesion = id_sesion or uuid.uuid4().hex
+        self.almacen = almacen or obtener_almacen_sesiones()
+        self.presupuesto = PresupuestoTokens.desde_entorno()
+        self.memoria = MemoriaSimple(
+            max_mensajes=8, max_tokens_por_mensaje=self.presupuesto.max_tokens_mensaje_historial,
+            max_tokens_resumen=int(os.getenv("EVERLAST_TOKENS_RESUMEN", 300))
+        )
+        self._tareas_resumen = set()  # referencias para que el GC no corte las tareas
+        self.usar_cache_respuestas = os.getenv("EVERLAST_CACHE_RESPUESTAS", "1") == "1"
+        self.max_iteraciones = 3
+        
+        # "nativo" = tools JSON + tool_calls; "texto" = protocolo HERRAMIENTA/INPUT/RESPUESTA.
+        # Si el endpoint rechaza tools, el agente pasa solo a "texto".
+        self.modo_herramientas = os.getenv("EVERLAST_MODO_HERRAMIENTAS", "nativo")
+        
+        # Prompt del protocolo de texto (respaldo)
         self.system_prompt = """Eres un asistente experto de Everlast Chile.
 
 HERRAMIENTAS:
-1. buscar_documentos - Busca en catálogo de productos/políticas
-2. calcular - Hace cálculos matemáticos
+1. buscar_documentos - Busca en documentos de productos/políticas
+2. catalogo - Precios, SKUs, pesos/tallas y colores exactos (filtros clave=valor separados por ;)
+3. calcular - Hace cálculos matemáticos
 
 FORMATO DE RESPUESTA:
 
@@ -80,11 +360,14 @@ Si necesitas herramienta:
 HERRAMIENTA: nombre_herramienta
 INPUT: texto_del_input
 
+Si necesitas varias, escribe un par HERRAMIENTA/INPUT por cada una (se ejecutan a la vez).
+
 Si ya puedes responder:
 RESPUESTA: tu respuesta aquí
 
 REGLAS:
-- Para preguntas de productos/tallas/políticas → USA buscar_documentos
+- Para precios, SKUs, pesos, tallas o colores disponibles → USA catalogo
+- Para recomendaciones, guías de tallas y políticas → USA buscar_documentos
 - Para cálculos (descuentos, totales) → USA calcular
 - Para saludos/charla → RESPUESTA directa
 - Sé breve y directo
@@ -95,156 +378,356 @@ Usuario: "¿Qué guantes recomiendas?"
 HERRAMIENTA: buscar_documentos
 INPUT: guantes recomendados principiantes
 
+Usuario: "¿Cuánto cuestan los guantes de 16 oz bajo $40.000?"
+HERRAMIENTA: catalogo
+INPUT: categoria=guantes; peso=16 oz; precio<=40000
+
 Usuario: "Calcula 20% descuento de $50000"
 HERRAMIENTA: calcular
 INPUT: 50000 * 0.8
 
+Usuario: "Precio del Pro Style de 14 oz con 15% de descuento y la política de devolución"
+HERRAMIENTA: catalogo
+INPUT: nombre=pro style; peso=14 oz
+HERRAMIENTA: buscar_documentos
+INPUT: política de devolución
+
 Usuario: "Hola"
 RESPUESTA: ¡Hola! Soy tu asistente de Everlast. ¿En qué puedo ayudarte?"""
     
-    def _llamar_llm(self, mensajes: List[Dict], reintentos: int = 2) -> str:
-        """
-        Llama al LLM vía HTTP con manejo robusto de errores.
+    def _system_prompt_actual(self) -> str:
+        if self.modo_herramientas == "nativo":
+            return SYSTEM_PROMPT_NATIVO
+        return self.system_prompt
+    
+    def _preparar_payload(self, mensajes: List[Dict], herramientas: bool = True) -> Dict:
+        """Limpia los mensajes, los ajusta al presupuesto de tokens y arma el payload de /chat/completions"""
+        nativo = herramientas and self.modo_herramientas == "nativo"
         
-        Args:
-            mensajes: Lista de mensajes del chat
-            reintentos: Número de reintentos en caso de error
+        # Limpiar y validar mensajes (los de tool_calls pueden no traer texto)
+        mensajes_validos = [
+            msg for msg in mensajes
+            if (msg.get("content") or "").strip() or msg.get("tool_calls") or msg["role"] == "tool"
+        ]
         
-        Returns:
-            Respuesta del LLM o mensaje de error amigable
-        """
-        url = f"{self.base_url.rstrip('/')}/chat/completions"
+        # Repartir el presupuesto: system + reserva de respuesta + turno actual + historial
+        tokens_tools = _tokens_herramientas_nativas() if nativo else 0
+        ajustados = self.presupuesto.ajustar(mensajes_validos, tokens_extra=tokens_tools)
         
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
-        
-        # Limpiar y validar mensajes
         mensajes_limpios = []
-        for msg in mensajes:
-            if msg.get("content") and msg["content"].strip():
-                # Truncar mensajes muy largos
-                content = msg["content"]
-                if len(content) > 1500:
-                    content = content[:1500] + "... [truncado]"
-                
-                mensajes_limpios.append({
-                    "role": msg["role"],
-                    "content": content
-                })
-        
-        # Limitar total de mensajes para evitar exceder límite de tokens
-        if len(mensajes_limpios) > 12:
-            # Mantener system + últimos 10 mensajes
-            mensajes_limpios = [mensajes_limpios[0]] + mensajes_limpios[-10:]
+        for msg in ajustados:
+            limpio = {"role": msg["role"], "content": msg.get("content") or None}
+            if msg.get("tool_calls"):
+                limpio["tool_calls"] = msg["tool_calls"]
+            if msg.get("tool_call_id"):
+                limpio["tool_call_id"] = msg["tool_call_id"]
+            mensajes_limpios.append(limpio)
         
         payload = {
             "model": "gpt-4o-mini",
             "messages": mensajes_limpios,
             "temperature": 0.5,
-            "max_tokens": 800,  # Limitar respuesta para evitar timeouts
+            "max_tokens": self.presupuesto.reserva_respuesta,
             "top_p": 0.9
         }
+        if nativo:
+            payload["tools"] = HERRAMIENTAS_NATIVAS
+            payload["tool_choice"] = "auto"
+        return payload
+    
+    def _request_llm(self):
+        """URL y headers de /chat/completions"""
+        url = f"{self.base_url.rstrip('/')}/chat/completions"
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+        return url, headers
+    
+    def _manejar_estado(self, status_code: int, texto: str, intento: int):
+        """
+        Decide qué hacer con una respuesta HTTP no-200.
+        
+        Returns:
+            (mensaje, espera): mensaje de error final, o None y los segundos a
+            esperar antes de reintentar (429 / 5xx)
+        """
+        if status_code == 400:
+            print(f"⚠️  Error 400 (Bad Request): {texto[:200]}")
+            return "Disculpa, tu consulta es muy compleja. Intenta simplificarla.", 0
+        
+        elif status_code == 401:
+            return "❌ Error de autenticación. Token inválido o expirado.", 0
+        
+        elif status_code == 429:
+            print(f"⚠️  Rate limit alcanzado. Esperando {intento + 1} segundos...")
+            return None, intento + 1
+        
+        elif status_code >= 500:
+            print(f"⚠️  Error del servidor ({status_code}). Reintentando...")
+            return None, 1
+        
+        return f"Error técnico (código {status_code}). Por favor intenta de nuevo.", 0
+    
+    def _cambiar_a_texto(self, status_code: int, texto: str, nativo: bool) -> bool:
+        """
+        Si el endpoint rechaza tools (400 que lo dice en el cuerpo), pasa al
+        protocolo de texto. Cualquier otro 400 sigue a _manejar_estado.
+        """
+        if nativo and status_code == 400 and PATRON_TOOLS_NO_SOPORTADAS.search(texto or ""):
+            print(f"⚠️  El endpoint no aceptó tools ({texto[:120]}); usando protocolo de texto")
+            self.modo_herramientas = "texto"
+            return True
+        return False
+    
+    async def _solicitar_llm_async(self, mensajes: List[Dict], reintentos: int = 2,
+                                   herramientas: bool = True) -> Dict:
+        """
+        Llama al LLM vía HTTP (aiohttp) con manejo robusto de errores.
+        
+        Mientras espera la respuesta, el event loop atiende otras conversaciones.
+        
+        Args:
+            mensajes: Lista de mensajes del chat
+            reintentos: Número de reintentos en caso de error
+            herramientas: False para un request sin tools (p. ej. resúmenes)
+        
+        Returns:
+            Mensaje del asistente ('content' y, en modo nativo, 'tool_calls').
+            Los errores llegan como 'content' con un mensaje amigable; si el
+            endpoint rechazó tools, viene 'sin_tools': True.
+        """
+        url, headers = self._request_llm()
+        payload = self._preparar_payload(mensajes, herramientas)
+        nativo = "tools" in payload
         
         # Intentar llamada con reintentos
         for intento in range(reintentos + 1):
             try:
-                response = requests.post(
+                response = await obtener_cliente_async().post(
                     url, 
                     headers=headers, 
                     json=payload, 
-                    timeout=30  # Timeout de 30 segundos
+                    timeout=30  # Timeout de 30 segundos (conexión keep-alive compartida)
                 )
                 
-                # Manejar códigos de error HTTP
                 if response.status_code == 200:
                     data = response.json()
-                    return data["choices"][0]["message"]["content"]
-                
-                elif response.status_code == 400:
-                    print(f"⚠️  Error 400 (Bad Request): {response.text[:200]}")
-                    return "Disculpa, tu consulta es muy compleja. Intenta simplificarla."
-                
-                elif response.status_code == 401:
-                    return "❌ Error de autenticación. Token inválido o expirado."
+                    return data["choices"][0]["message"]
                 
-                elif response.status_code == 429:
-                    print(f"⚠️  Rate limit alcanzado. Esperando {intento + 1} segundos...")
-                    time.sleep(intento + 1)
-                    continue
+                if self._cambiar_a_texto(response.status_code, response.text, nativo):
+                    return {"role": "assistant", "content": "", "sin_tools": True}
                 
-                elif response.status_code >= 500:
-                    print(f"⚠️  Error del servidor ({response.status_code}). Reintentando...")
-                    time.sleep(1)
+                # Manejar códigos de error HTTP
+                mensaje, espera = self._manejar_estado(response.status_code, response.text, intento)
+                if mensaje:
+                    return {"role": "assistant", "content": mensaje}
+                await asyncio.sleep(espera)
+            
+            except requests.exceptions.Timeout:
+                print(f"⚠️  Timeout en intento {intento + 1}. Reintentando...")
+                if intento < reintentos:
+                    await asyncio.sleep(1)
                     continue
+                return {"role": "assistant",
+                        "content": "La consulta tardó demasiado. Intenta con una pregunta más simple."}
+            
+            except requests.exceptions.ConnectionError:
+                return {"role": "assistant", "content": "❌ Error de conexión. Verifica tu internet."}
+            
+            except Exception as e:
+                print(f"❌ Error inesperado: {e}")
+                return {"role": "assistant",
+                        "content": "Ocurrió un error al procesar tu consulta. Intenta reformularla."}
+        
+        return {"role": "assistant", "content": "No pude procesar tu consulta después de varios intentos."}
+    
+    async def _llamar_llm_async(self, mensajes: List[Dict], reintentos: int = 2) -> str:
+        """Texto de la respuesta del LLM (o mensaje de error amigable)"""
+        return (await self._solicitar_llm_async(mensajes, reintentos)).get("content") or ""
+    
+    def _llamar_llm(self, mensajes: List[Dict], reintentos: int = 2) -> str:
+        """Versión sync de _llamar_llm_async (corre en el loop de fondo)"""
+        return ejecutar_sync(self._llamar_llm_async(mensajes, reintentos))
+    
+    @staticmethod
+    def _detectar_modo(texto: str):
+        """
+        Con lo que va llegando del stream, decide si es un turno de herramienta
+        o la respuesta final.
+        
+        Returns:
+            ('herramienta' | 'respuesta' | None, posición donde empieza la respuesta)
+        """
+        texto_upper = texto.upper()
+        if any(k in texto_upper for k in ["HERRAMIENTA:", "TOOL:", "ACTION:"]):
+            return 'herramienta', 0
+        if "RESPUESTA:" in texto_upper:
+            return 'respuesta', texto_upper.index("RESPUESTA:") + len("RESPUESTA:")
+        return None, 0
+    
+    async def _llamar_llm_stream_async(self, mensajes: List[Dict],
+                                       reintentos: int = 2) -> AsyncIterator[Tuple[str, object]]:
+        """
+        Llama al LLM en modo streaming (SSE).
+        
+        Entrega ('token', fragmento) con cada trozo de la respuesta final apenas
+        llega y al terminar ('completo', mensaje) con el mensaje del asistente
+        armado (como _solicitar_llm_async). En modo texto solo se emite lo que
+        sigue a RESPUESTA:; en modo nativo se emite el contenido hasta que
+        llega el primer tool_call (el texto previo, p. ej. "Déjame revisar el
+        catálogo.", ya se mostró y el que venga después no se emite).
+        """
+        url, headers = self._request_llm()
+        payload = self._preparar_payload(mensajes)
+        payload["stream"] = True
+        nativo = "tools" in payload
+        
+        for intento in range(reintentos + 1):
+            texto = ""
+            llamadas = {}
+            modo = 'respuesta' if nativo else None
+            enviado = 0
+            emitido = False
+            
+            try:
+                async for datos in obtener_cliente_async().stream_sse(
+                    url, headers=headers, json=payload, timeout=30
+                ):
+                    opciones = json.loads(datos).get("choices") or [{}]
+                    delta = opciones[0].get("delta") or {}
+                    
+                    # tool_calls llegan por partes: id y nombre primero, argumentos después
+                    for parcial in delta.get("tool_calls") or []:
+                        llamada = llamadas.setdefault(parcial.get("index", 0), {
+                            "id": None, "type": "function", "function": {"name": "", "arguments": ""}
+                        })
+                        if parcial.get("id"):
+                            llamada["id"] = parcial["id"]
+                        funcion = parcial.get("function") or {}
+                        llamada["function"]["name"] += funcion.get("name") or ""
+                        llamada["function"]["arguments"] += funcion.get("arguments") or ""
+                        modo = 'herramienta'
+                    
+                    contenido = delta.get("content")
+                    if not contenido:
+                        continue
+                    texto += contenido
+                    
+                    if modo is None:
+                        modo, enviado = self._detectar_modo(texto)
+                    if modo == 'respuesta':
+                        nuevo = texto[enviado:]
+                        if not emitido:
+                            nuevo = nuevo.lstrip()
+                        enviado = len(texto)
+                        if nuevo:
+                            emitido = True
+                            yield 'token', nuevo
                 
-                else:
-                    return f"Error técnico (código {response.status_code}). Por favor intenta de nuevo."
+                mensaje = {"role": "assistant", "content": texto}
+                if llamadas:
+                    mensaje["tool_calls"] = [llamadas[i] for i in sorted(llamadas)]
+                yield 'completo', mensaje
+                return
+            
+            except ErrorHTTP as e:
+                if self._cambiar_a_texto(e.status_code, e.text, nativo):
+                    yield 'completo', {"role": "assistant", "content": "", "sin_tools": True}
+                    return
+                mensaje, espera = self._manejar_estado(e.status_code, e.text, intento)
+                if mensaje:
+                    yield 'completo', {"role": "assistant", "content": mensaje}
+                    return
+                await asyncio.sleep(espera)
             
             except requests.exceptions.Timeout:
                 print(f"⚠️  Timeout en intento {intento + 1}. Reintentando...")
+                # Con tokens ya mostrados no se puede reintentar sin duplicarlos
+                if emitido:
+                    yield 'completo', {"role": "assistant", "content": texto}
+                    return
                 if intento < reintentos:
-                    time.sleep(1)
+                    await asyncio.sleep(1)
                     continue
-                return "La consulta tardó demasiado. Intenta con una pregunta más simple."
+                yield 'completo', {"role": "assistant",
+                                   "content": "La consulta tardó demasiado. Intenta con una pregunta más simple."}
+                return
             
             except requests.exceptions.ConnectionError:
-                return "❌ Error de conexión. Verifica tu internet."
+                yield 'completo', {"role": "assistant", "content": "❌ Error de conexión. Verifica tu internet."}
+                return
             
             except Exception as e:
                 print(f"❌ Error inesperado: {e}")
-                return f"Ocurrió un error al procesar tu consulta. Intenta reformularla."
+                yield 'completo', {"role": "assistant",
+                                   "content": "Ocurrió un error al procesar tu consulta. Intenta reformularla."}
+                return
         
-        return "No pude procesar tu consulta después de varios intentos."
+        yield 'completo', {"role": "assistant",
+                           "content": "No pude procesar tu consulta después de varios intentos."}
+    
+    @staticmethod
+    def _normalizar_herramienta(nombre: str) -> str:
+        """Lleva las variantes que escribe el LLM al nombre interno de la herramienta"""
+        nombre = nombre.strip().lower()
+        if "catalog" in nombre:
+            return "catalogo"
+        elif "buscar" in nombre or "documento" in nombre:
+            return "buscar_documentos"
+        elif "calcul" in nombre:
+            return "calcular"
+        return nombre
     
     def _parsear_respuesta_llm(self, respuesta: str) -> Dict:
         """
         Parsea la respuesta del LLM de forma flexible.
         
         Returns:
-            Dict con 'tipo': 'herramienta' o 'respuesta' y datos asociados
+            Dict con 'tipo': 'herramienta' o 'respuesta' y datos asociados.
+            Las herramientas vienen en 'llamadas' (lista de {'nombre', 'input'});
+            'nombre' e 'input' repiten la primera.
         """
         respuesta_upper = respuesta.upper()
         
-        # Detectar uso de herramienta (múltiples variaciones)
+        # Detectar uso de herramientas (múltiples variaciones; puede haber varios pares)
         if any(keyword in respuesta_upper for keyword in [
             "HERRAMIENTA:", "USAR_HERRAMIENTA:", "TOOL:", "ACTION:"
         ]):
             try:
                 lineas = respuesta.split('\n')
-                nombre_herramienta = None
-                input_herramienta = None
+                llamadas = []
                 
                 for i, linea in enumerate(lineas):
                     linea_upper = linea.strip().upper()
                     
-                    # Detectar nombre de herramienta
+                    # Detectar nombre de herramienta: abre un nuevo par
                     if any(k in linea_upper for k in ["HERRAMIENTA:", "TOOL:", "ACTION:"]):
                         # Extraer valor después de ':'
                         partes = linea.split(':', 1)
                         if len(partes) > 1:
-                            nombre_herramienta = partes[1].strip().lower()
-                            # Normalizar nombres
-                            if "buscar" in nombre_herramienta or "documento" in nombre_herramienta:
-                                nombre_herramienta = "buscar_documentos"
-                            elif "calcul" in nombre_herramienta:
-                                nombre_herramienta = "calcular"
+                            llamadas.append({
+                                'nombre': self._normalizar_herramienta(partes[1]),
+                                'input': None
+                            })
                     
-                    # Detectar input
-                    if "INPUT:" in linea_upper or "QUERY:" in linea_upper:
+                    # Detectar input del último par abierto
+                    elif ("INPUT:" in linea_upper or "QUERY:" in linea_upper) and llamadas:
                         partes = linea.split(':', 1)
-                        if len(partes) > 1:
-                            input_herramienta = partes[1].strip()
+                        input_herramienta = partes[1].strip()
                         # Si el input viene en la siguiente línea
-                        elif i + 1 < len(lineas):
+                        if not input_herramienta and i + 1 < len(lineas):
                             input_herramienta = lineas[i + 1].strip()
+                        if llamadas[-1]['input'] is None:
+                            llamadas[-1]['input'] = input_herramienta
                 
-                if nombre_herramienta and input_herramienta:
+                llamadas = [l for l in llamadas if l['nombre'] and l['input']]
+                if llamadas:
                     return {
                         'tipo': 'herramienta',
-                        'nombre': nombre_herramienta,
-                        'input': input_herramienta
+                        'llamadas': llamadas,
+                        'nombre': llamadas[0]['nombre'],
+                        'input': llamadas[0]['input']
                     }
             
             except Exception as e:
@@ -267,24 +750,25 @@ RESPUESTA: ¡Hola! Soy tu asistente de Everlast. ¿En qué puedo ayudarte?"""
             'contenido': respuesta
         }
     
-    def _ejecutar_herramienta(self, nombre: str, input_str: str) -> str:
-        """Ejecuta una herramienta con manejo de errores"""
+    async def _ejecutar_herramienta_async(self, nombre: str, input_str: str) -> str:
+        """Ejecuta una herramienta con manejo de errores (la búsqueda no bloquea el loop)"""
         print(f"🔧 Ejecutando: {nombre}")
         print(f"   Input: {input_str[:100]}...")
         
         try:
             if nombre == "buscar_documentos":
-                resultado = buscar_documentos_everlast(input_str)
+                resultado = await buscar_documentos_everlast_async(input_str)
+            elif nombre == "catalogo":
+                resultado = await asyncio.to_thread(consultar_catalogo, input_str)
             elif nombre == "calcular":
-                resultado = simple_calculator(input_str)
+                resultado = await asyncio.to_thread(simple_calculator, input_str)
             else:
                 resultado = f"⚠️ Herramienta desconocida: {nombre}"
             
-            # Truncar resultados muy largos
-            if len(resultado) > 2000:
-                resultado = resultado[:2000] + "\n... [resultado truncado]"
+            # Recortar resultados muy largos (se van primero los fragmentos peor rankeados)
+            resultado = recortar_fragmentos(resultado, self.presupuesto.max_tokens_herramienta)
             
-            print(f"   ✅ Resultado: {len(resultado)} caracteres")
+            print(f"   ✅ Resultado: {contar_tokens(resultado)} tokens")
             return resultado
             
         except Exception as e:
@@ -292,15 +776,140 @@ RESPUESTA: ¡Hola! Soy tu asistente de Everlast. ¿En qué puedo ayudarte?"""
             print(f"   ❌ {error_msg}")
             return error_msg
     
-    def procesar(self, consulta_usuario: str) -> str:
+    async def _ejecutar_llamadas_async(self, llamadas: List[Dict]) -> List[str]:
         """
-        Procesa consulta con ciclo ReAct mejorado y robusto.
+        Ejecuta a la vez todas las herramientas pedidas en un mismo turno.
         
-        Args:
-            consulta_usuario: Pregunta del usuario
+        La búsqueda de documentos es async; catálogo y calculadora van al pool
+        de hilos del loop. El turno tarda lo que la herramienta más lenta.
+        """
+        if len(llamadas) > 1:
+            print(f"🔧 {len(llamadas)} herramientas en paralelo")
         
-        Returns:
-            Respuesta final del agente
+        return await asyncio.gather(*(
+            self._ejecutar_herramienta_async(llamada['nombre'], llamada['input'])
+            for llamada in llamadas
+        ))
+    
+    async def _ejecutar_herramientas_async(self, llamadas: List[Dict]) -> str:
+        """Protocolo de texto: ejecuta las herramientas y arma una sola observación"""
+        resultados = await self._ejecutar_llamadas_async(llamadas)
+        return "\n\n".join(
+            f"Resultado de {llamada['nombre']} ({llamada['input']}):\n{resultado}"
+            for llamada, resultado in zip(llamadas, resultados)
+        )
+    
+    def _llamada_desde_tool_call(self, tool_call: Dict) -> Dict:
+        """tool_call nativa -> {'nombre', 'input'} como las del protocolo de texto"""
+        funcion = tool_call.get("function") or {}
+        try:
+            argumentos = json.loads(funcion.get("arguments") or "{}")
+        except json.JSONDecodeError:
+            argumentos = {}
+        nombre = self._normalizar_herramienta(funcion.get("name", ""))
+        return {'nombre': nombre, 'input': _input_desde_argumentos(nombre, argumentos)}
+    
+    def _ejecutar_herramienta(self, nombre: str, input_str: str) -> str:
+        """Versión sync de _ejecutar_herramienta_async"""
+        return ejecutar_sync(self._ejecutar_herramienta_async(nombre, input_str))
+    
+    async def _vector_cacheable(self, consulta: str):
+        """
+        Embedding de la consulta si puede usar la caché semántica de respuestas;
+        None si no aplica o falla.
+        
+        La caché es compartida entre sesiones, así que solo se usa (para buscar
+        y para guardar) en el primer turno: con historial o resumen en el prompt
+        la respuesta puede estar personalizada para este cliente aunque la
+        pregunta en sí sea independiente.
+        """
+        from cache_respuestas import consulta_independiente
+        
+        if (not self.usar_cache_respuestas or not self.memoria.vacia()
+                or not consulta_independiente(consulta)):
+            return None
+        try:
+            obtener_cache_respuestas().invalidar_si_cambio(version_vector_store())
+            return (await obtener_embeddings_consultas_async([consulta]))[0]
+        except Exception as e:
+            print(f"⚠️  Caché de respuestas no disponible: {e}")
+            return None
+    
+    def _system_con_resumen(self, system_prompt: str) -> str:
+        resumen = self.memoria.obtener_resumen()
+        if not resumen:
+            return system_prompt
+        return f"{system_prompt}\n\nRESUMEN DE LA CONVERSACIÓN ANTERIOR:\n{resumen}"
+    
+    async def _resumir_llm(self, resumen: str, mensajes: List[Dict]) -> str:
+        """Pide al LLM un resumen nuevo = resumen previo + mensajes que salieron de la ventana"""
+        conversacion = "\n".join(
+            f"{'Cliente' if m['role'] == 'user' else 'Asistente'}: {m['content']}" for m in mensajes
+        )
+        pedido = [
+            {"role": "system", "content": (
+                "Resume la conversación entre un cliente y el asistente de Everlast Chile. "
+                "Conserva TODOS los datos del cliente (peso, estatura, talla, región o comuna, "
+                "nivel, presupuesto, productos que le interesan) y lo ya resuelto. "
+                f"Usa viñetas y no más de {self.memoria.max_tokens_resumen // 2} palabras."
+            )},
+            {"role": "user", "content": f"Resumen previo:\n{resumen or '(vacío)'}\n\nMensajes nuevos:\n{conversacion}"}
+        ]
+        mensaje = await self._solicitar_llm_async(pedido, reintentos=1, herramientas=False)
+        texto = mensaje.get("content") or ""
+        # Los errores llegan como texto amigable: no deben quedar como resumen
+        if texto.startswith(("❌", "Error", "Disculpa", "La consulta", "No pude", "Ocurrió")):
+            raise RuntimeError(texto[:80])
+        return texto
+    
+    async def _cargar_sesion(self):
+        """Trae la memoria de la sesión desde el almacén (vacía si no existe o venció)"""
+        try:
+            estado = await asyncio.to_thread(self.almacen.cargar, self.id_sesion)
+        except Exception as e:
+            print(f"⚠️  No se pudo cargar la sesión {self.id_sesion}: {e}")
+            return
+        if estado:
+            self.memoria.restaurar(estado)
+        else:
+            self.memoria.limpiar()
+    
+    async def _guardar_sesion(self):
+        try:
+            await asyncio.to_thread(self.almacen.guardar, self.id_sesion, self.memoria.a_dict())
+        except Exception as e:
+            print(f"⚠️  No se pudo guardar la sesión {self.id_sesion}: {e}")
+    
+    def cargar_sesion(self):
+        """Versión sync de _cargar_sesion (para mostrar una conversación retomada)"""
+        ejecutar_sync(self._cargar_sesion())
+    
+    def limpiar_memoria(self):
+        """Borra la conversación en memoria y en el almacén de sesiones"""
+        self.memoria.limpiar()
+        try:
+            self.almacen.eliminar(self.id_sesion)
+        except Exception as e:
+            print(f"⚠️  No se pudo borrar la sesión {self.id_sesion}: {e}")
+    
+    async def _resumir_y_guardar(self):
+        await self.memoria.resumir_async(self._resumir_llm)
+        await self._guardar_sesion()
+    
+    def _programar_resumen(self):
+        """Lanza el resumen de los mensajes pendientes sin esperar (corre en el loop actual)"""
+        if not self.memoria.pendiente_resumen():
+            return
+        tarea = asyncio.get_running_loop().create_task(self._resumir_y_guardar())
+        self._tareas_resumen.add(tarea)
+        tarea.add_done_callback(self._tareas_resumen.discard)
+    
+    async def _ciclo_react(self, consulta_usuario: str, stream: bool = False) -> AsyncIterator[str]:
+        """
+        Ciclo ReAct mejorado y robusto; entrega el texto de la respuesta final.
+        
+        Con stream=True la respuesta final sale en fragmentos a medida que el
+        LLM la genera; si no, sale entera en un solo fragmento.
         """
         print("\n" + "="*80)
         print(f"🤖 PROCESANDO: {consulta_usuario[:100]}...")
@@ -308,62 +917,129 @@ RESPUESTA: ¡Hola! Soy tu asistente de Everlast. ¿En qué puedo ayudarte?"""
         
         # Validar input
         if not consulta_usuario or len(consulta_usuario.strip()) == 0:
-            return "Por favor, escribe una pregunta válida."
+            yield "Por favor, escribe una pregunta válida."
+            return
         
         # Truncar consultas muy largas
         if len(consulta_usuario) > 500:
             consulta_usuario = consulta_usuario[:500] + "..."
         
+        # 0. Memoria de la sesión (puede venir de otro worker o de antes de un reinicio)
+        await self._cargar_sesion()
+        
+        # Caché semántica: una pregunta equivalente ya respondida sale sin LLM
+        inicio = time.perf_counter()
+        vector_consulta = await self._vector_cacheable(consulta_usuario)
+        if vector_consulta is not None:
+            entrada = obtener_cache_respuestas().buscar(vector_consulta)
+            if entrada is not None:
+                print(f"⚡ Respuesta desde caché (pregunta similar: '{entrada.consulta[:60]}')")
+                self.memoria.agregar("user", consulta_usuario)
+                self.memoria.agregar("assistant", entrada.respuesta)
+                await self._guardar_sesion()
+                self._programar_resumen()
+                yield entrada.respuesta
+                return
+        
         # 1. Agregar a memoria
         self.memoria.agregar("user", consulta_usuario)
         
-        # 2. Preparar mensajes
-        mensajes = [{"role": "system", "content": self.system_prompt}]
+        # 2. Preparar mensajes (lo que salió de la ventana llega como resumen en el system)
+        mensajes = [{"role": "system", "content": self._system_con_resumen(self._system_prompt_actual())}]
         
-        # Agregar solo últimos 6 mensajes de historial
-        historial = self.memoria.obtener_historial(6)
+        # Historial marcado como descartable: el presupuesto de tokens decide cuánto entra
+        historial = self.memoria.obtener_historial()
         for msg in historial[:-1]:  # Excluir consulta actual
+            msg["_historial"] = True
             mensajes.append(msg)
         
         # Agregar consulta actual
         mensajes.append({"role": "user", "content": consulta_usuario})
         
-        # 3. Ciclo ReAct (máximo 2 iteraciones)
+        # 3. Ciclo ReAct (máximo self.max_iteraciones)
         respuesta_final = None
+        respuesta_llm = ""
+        mostrado = []  # lo que ya vio el usuario: es lo que se guarda como respuesta
+        emitido_iteracion = False
+        completa = False
+        iteracion = 0
         
-        for iteracion in range(1, 3):  # Solo 2 iteraciones
-            print(f"\n🔄 Iteración {iteracion}/2")
+        while iteracion < self.max_iteraciones:
+            iteracion += 1
+            print(f"\n🔄 Iteración {iteracion}/{self.max_iteraciones}")
+            nativo = self.modo_herramientas == "nativo"
+            emitido_iteracion = False
             
-            # Llamar al LLM
-            respuesta_llm = self._llamar_llm(mensajes)
+            # Llamar al LLM (en streaming, los tokens de la respuesta salen de inmediato)
+            if stream:
+                mensaje = {}
+                async for tipo, dato in self._llamar_llm_stream_async(mensajes):
+                    if tipo == 'token':
+                        # Texto previo a un tool_call ya mostrado: separar del que sigue
+                        if mostrado and not emitido_iteracion:
+                            mostrado.append("\n\n")
+                            yield "\n\n"
+                        emitido_iteracion = True
+                        mostrado.append(dato)
+                        yield dato
+                    else:
+                        mensaje = dato
+            else:
+                mensaje = await self._solicitar_llm_async(mensajes)
+            
+            # El endpoint no acepta tools: repetir la iteración con el protocolo de texto
+            # (sin los tool_calls / resultados "tool" de este turno: el endpoint no los entiende)
+            if mensaje.get('sin_tools'):
+                mensajes[:] = [m for m in mensajes if not m.get('tool_calls') and m["role"] != "tool"]
+                mensajes[0] = {"role": "system", "content": self._system_con_resumen(self.system_prompt)}
+                iteracion -= 1
+                continue
+            
+            respuesta_llm = mensaje.get('content') or ""
             
             # Si hubo error en la llamada, retornar error
             if respuesta_llm.startswith("❌") or respuesta_llm.startswith("Error"):
-                return respuesta_llm
+                if not emitido_iteracion:
+                    yield ("\n\n" if mostrado else "") + respuesta_llm
+                return
+            
+            # Modo nativo: tool_calls estructuradas, sin parseo de texto
+            if mensaje.get('tool_calls'):
+                llamadas = [self._llamada_desde_tool_call(tc) for tc in mensaje['tool_calls']]
+                resultados = await self._ejecutar_llamadas_async(llamadas)
+                
+                mensajes.append({"role": "assistant", "content": respuesta_llm or None,
+                                 "tool_calls": mensaje['tool_calls']})
+                for tool_call, resultado in zip(mensaje['tool_calls'], resultados):
+                    mensajes.append({"role": "tool", "tool_call_id": tool_call.get("id"),
+                                     "content": resultado})
+                
+                print(f"   ✅ {len(llamadas)} herramienta(s) ejecutada(s)")
+                continue  # Siguiente iteración
             
             print(f"💬 LLM responde: {respuesta_llm[:150]}...")
             
-            # Parsear respuesta
-            parsed = self._parsear_respuesta_llm(respuesta_llm)
+            # Parsear respuesta (en modo nativo el texto ya es la respuesta)
+            if nativo:
+                parsed = {'tipo': 'respuesta', 'contenido': respuesta_llm}
+            else:
+                parsed = self._parsear_respuesta_llm(respuesta_llm)
             
-            if parsed['tipo'] == 'herramienta':
-                # Ejecutar herramienta
-                resultado_tool = self._ejecutar_herramienta(
-                    parsed['nombre'],
-                    parsed['input']
-                )
+            if parsed['tipo'] == 'herramienta' and not emitido_iteracion:
+                # Ejecutar herramientas (todas las del turno a la vez)
+                observacion = await self._ejecutar_herramientas_async(parsed['llamadas'])
                 
-                # Agregar resultado al contexto
-                observacion = f"Resultado de {parsed['nombre']}:\n{resultado_tool}"
+                # Agregar resultados al contexto en un solo mensaje
                 mensajes.append({"role": "assistant", "content": respuesta_llm})
                 mensajes.append({"role": "user", "content": observacion})
                 
-                print(f"   ✅ Herramienta ejecutada")
+                print(f"   ✅ {len(parsed['llamadas'])} herramienta(s) ejecutada(s)")
                 continue  # Siguiente iteración
             
             else:
                 # Respuesta directa
                 respuesta_final = parsed['contenido']
+                completa = True
                 print(f"✅ Respuesta final lista")
                 break
         
@@ -377,11 +1053,68 @@ RESPUESTA: ¡Hola! Soy tu asistente de Everlast. ¿En qué puedo ayudarte?"""
         if not respuesta_final:
             respuesta_final = "No pude procesar tu consulta. Intenta reformularla."
         
-        # Agregar a memoria
+        # Lo que no salió en streaming (respuesta sin marcador, límite de iteraciones) sale entero
+        if not emitido_iteracion:
+            if mostrado:
+                mostrado.append("\n\n")
+                yield "\n\n"
+            mostrado.append(respuesta_final)
+            yield respuesta_final
+        
+        # Memoria, sesión y caché guardan exactamente lo que se mostró
+        respuesta_final = "".join(mostrado)
+        
+        # Agregar a memoria (el resumen de lo que sale de la ventana corre en segundo plano)
         self.memoria.agregar("assistant", respuesta_final)
+        await self._guardar_sesion()
+        self._programar_resumen()
+        
+        # Solo respuestas completas entran a la caché (no límites de iteración)
+        if vector_consulta is not None and completa and respuesta_final:
+            obtener_cache_respuestas().guardar(
+                consulta_usuario, vector_consulta, respuesta_final, time.perf_counter() - inicio
+            )
         
         print("="*80 + "\n")
-        return respuesta_final
+    
+    async def procesar_async(self, consulta_usuario: str) -> str:
+        """
+        Procesa consulta con ciclo ReAct mejorado y robusto.
+        
+        Camino asyncio: las llamadas al LLM y la búsqueda de documentos ceden el
+        event loop, así un proceso atiende muchas conversaciones a la vez
+        (una instancia de AgenteEverlast por conversación).
+        
+        Args:
+            consulta_usuario: Pregunta del usuario
+        
+        Returns:
+            Respuesta final del agente
+        """
+        return "".join([texto async for texto in self._ciclo_react(consulta_usuario)])
+    
+    def procesar(self, consulta_usuario: str) -> str:
+        """
+        Versión sync de procesar_async (CLI y Streamlit).
+        
+        Corre la corrutina en el loop de fondo compartido: varios hilos que
+        llaman a procesar() avanzan sus conversaciones en paralelo.
+        """
+        return ejecutar_sync(self.procesar_async(consulta_usuario))
+    
+    def procesar_stream_async(self, consulta_usuario: str) -> AsyncIterator[str]:
+        """
+        Como procesar_async, pero entrega los tokens de la respuesta final a
+        medida que el LLM los genera (SSE). Los turnos de herramienta no se muestran.
+        """
+        return self._ciclo_react(consulta_usuario, stream=True)
+    
+    def procesar_stream(self, consulta_usuario: str) -> Iterator[str]:
+        """
+        Versión sync de procesar_stream_async: generador de fragmentos de texto
+        (para st.write_stream y la CLI).
+        """
+        return iterar_sync(self.procesar_stream_async(consulta_usuario))
 
 
 # =============================================================================
@@ -412,11 +1145,16 @@ def main():
     # Crear agente
     print("\n🔧 Inicializando agente...")
     try:
-        agente = AgenteEverlast(github_token, base_url)
+        # Con EVERLAST_SESIONES=sqlite la conversación sigue tras reiniciar la CLI
+        agente = AgenteEverlast(github_token, base_url,
+                                id_sesion=os.getenv("EVERLAST_ID_SESION", "cli"))
     except Exception as e:
         print(f"❌ Error al crear agente: {e}")
         sys.exit(1)
     
+    # El vector store se carga mientras el usuario escribe la primera pregunta
+    precalentar()
+    
     print("\n" + "=" * 80)
     print("✅ ASISTENTE LISTO")
     print("=" * 80)
@@ -444,14 +1182,18 @@ def main():
             break
         
         elif user_input.lower() in ['limpiar', 'clear', 'reset']:
-            agente.memoria.limpiar()
+            agente.limpiar_memoria()
             print("\n🧹 Memoria limpiada\n")
             continue
         
         elif user_input.lower() in ['historial', 'history', 'h']:
             print("\n📜 HISTORIAL:")
             print("=" * 80)
-            historial = agente.memoria.historial
+            agente.cargar_sesion()
+            resumen = agente.memoria.obtener_resumen()
+            if resumen:
+                print(f"\n🗂️  RESUMEN:\n{resumen}")
+            historial = agente.memoria.obtener_historial()
             if not historial:
                 print("(Vacío)")
             else:
@@ -468,8 +1210,13 @@ def main():
         
         # Procesar consulta
         try:
-            respuesta = agente.procesar(user_input)
-            print(f"\n🤖 Everlast: {respuesta}\n")
+            # Los tokens de la respuesta se imprimen apenas llegan
+            fragmentos = agente.procesar_stream(user_input)
+            primero = next(fragmentos, "")
+            print(f"\n🤖 Everlast: {primero}", end="", flush=True)
+            for fragmento in fragmentos:
+                print(fragmento, end="", flush=True)
+            print("\n")
         
         except KeyboardInterrupt:
             print("\n\n⚠️  Operación cancelada")
@@ -0,0 +1,313 @@
+"""
+almacen_chunks.py
+=================
+Almacén columnar de chunks en disco, leído con memory-mapping.
+
+Reemplaza a chunks.pkl: en vez de des-serializar todos los Document de
+LangChain al arrancar, la búsqueda solo lee los bytes de los top-k chunks.
+Varios procesos que abren el mismo almacén comparten el page cache del SO.
+
+Archivos (dentro de la carpeta del vector store):
+    chunks_formato.json   Versión y tamaño (se escribe al final: marca de commit)
+    chunks_textos.bin     Textos UTF-8 concatenados
+    chunks_offsets.npy    uint64[n+1]: el chunk i ocupa [offsets[i], offsets[i+1])
+    chunks_ids.npy        int64[n] ordenados: ID del índice FAISS de cada chunk
+    chunks_meta.jsonl     Tabla lateral de metadatos (una línea JSON por chunk)
+
+Migración desde el formato anterior (paso offline, con los agentes detenidos;
+al cargar solo se lee, y un vector store con solo chunks.pkl da un error claro):
+    python codigo/almacen_chunks.py datos/vectorstore_faiss
+
+Autor: Evaluación 2 - Everlast Chile
+"""
+
+import json
+import mmap
+import os
+import pickle
+from array import array
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+
+FORMATO_NOMBRE = "everlast-chunks"
+FORMATO_VERSION = 1
+
+ARCHIVO_FORMATO = "chunks_formato.json"
+ARCHIVO_TEXTOS = "chunks_textos.bin"
+ARCHIVO_OFFSETS = "chunks_offsets.npy"
+ARCHIVO_IDS = "chunks_ids.npy"
+ARCHIVO_META = "chunks_meta.jsonl"
+
+
+# =============================================================================
+# ESCRITURA
+# =============================================================================
+
+class EscritorAlmacenChunks:
+    """
+    Escribe un almacén de chunks de forma secuencial (memoria constante por chunk).
+
+    Los IDs deben llegar en orden creciente. Todo se escribe en archivos
+    temporales y se publica con os.replace() al cerrar; el archivo de formato
+    va al final, así un lector nunca ve un almacén a medio escribir.
+    """
+
+    def __init__(self, carpeta: Path):
+        self.carpeta = Path(carpeta)
+        self.carpeta.mkdir(parents=True, exist_ok=True)
+
+        self._sufijo = f".tmp{os.getpid()}"
+        self._textos = open(self._tmp(ARCHIVO_TEXTOS), 'wb')
+        self._meta = open(self._tmp(ARCHIVO_META), 'w', encoding='utf-8')
+        self._offsets = array('Q', [0])
+        self._ids = array('q')
+        self._cerrado = False
+
+    def _tmp(self, nombre: str) -> Path:
+        return self.carpeta / (nombre + self._sufijo)
+
+    def agregar(self, id_chunk: int, texto: str, metadata: Optional[Dict] = None):
+        """Agrega un chunk al final del almacén"""
+        if self._ids and id_chunk <= self._ids[-1]:
+            raise ValueError(f"IDs fuera de orden: {id_chunk} después de {self._ids[-1]}")
+
+        datos = texto.encode('utf-8')
+        self._textos.write(datos)
+        self._offsets.append(self._offsets[-1] + len(datos))
+        self._ids.append(id_chunk)
+        self._meta.write(json.dumps(metadata or {}, ensure_ascii=False) + "\n")
+
+    def __len__(self):
+        return len(self._ids)
+
+    def cerrar(self):
+        """Vuelca offsets/IDs y publica todos los archivos"""
+        if self._cerrado:
+            return
+        self._cerrado = True
+        self._textos.close()
+        self._meta.close()
+
+        with open(self._tmp(ARCHIVO_OFFSETS), 'wb') as f:
+            np.save(f, np.frombuffer(self._offsets, dtype=np.uint64))
+        with open(self._tmp(ARCHIVO_IDS), 'wb') as f:
+            np.save(f, np.frombuffer(self._ids, dtype=np.int64))
+
+        for nombre in (ARCHIVO_TEXTOS, ARCHIVO_META, ARCHIVO_OFFSETS, ARCHIVO_IDS):
+            os.replace(self._tmp(nombre), self.carpeta / nombre)
+
+        formato = {
+            'formato': FORMATO_NOMBRE,
+            'version': FORMATO_VERSION,
+            'num_chunks': len(self._ids),
+            'bytes_textos': int(self._offsets[-1])
+        }
+        with open(self._tmp(ARCHIVO_FORMATO), 'w', encoding='utf-8') as f:
+            json.dump(formato, f)
+        os.replace(self._tmp(ARCHIVO_FORMATO), self.carpeta / ARCHIVO_FORMATO)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo, valor, traza):
+        if tipo is None:
+            self.cerrar()
+        else:
+            self._textos.close()
+            self._meta.close()
+            for nombre in (ARCHIVO_TEXTOS, ARCHIVO_META):
+                self._tmp(nombre).unlink(missing_ok=True)
+
+
+def escribir_almacen(carpeta: Path, registros) -> int:
+    """
+    Escribe un almacén completo.
+
+    Args:
+        carpeta: Carpeta del vector store
+        registros: Iterable de (id, texto, metadata); se ordena por ID
+
+    Returns:
+        int: Número de chunks escritos
+    """
+    with EscritorAlmacenChunks(carpeta) as escritor:
+        for id_chunk, texto, metadata in sorted(registros, key=lambda r: r[0]):
+            escritor.agregar(int(id_chunk), texto, metadata)
+        return len(escritor)
+
+
+# =============================================================================
+# LECTURA
+# =============================================================================
+
+class AlmacenChunks:
+    """
+    Lector memory-mapped de un almacén de chunks.
+
+    Abrirlo no lee los textos: solo mapea los archivos. texto(id) hace una
+    búsqueda binaria del ID y decodifica únicamente ese tramo del blob.
+    """
+
+    def __init__(self, carpeta: Path):
+        self.carpeta = Path(carpeta)
+
+        with open(self.carpeta / ARCHIVO_FORMATO, 'r', encoding='utf-8') as f:
+            self.formato = json.load(f)
+
+        if self.formato.get('formato') != FORMATO_NOMBRE:
+            raise ValueError(f"{ARCHIVO_FORMATO} no corresponde a un almacén de chunks")
+        if self.formato.get('version') != FORMATO_VERSION:
+            raise ValueError(
+                f"Versión de almacén no soportada: {self.formato.get('version')} "
+                f"(esperada {FORMATO_VERSION}). Reconstruye el vector store."
+            )
+
+        self._offsets = np.load(self.carpeta / ARCHIVO_OFFSETS, mmap_mode='r')
+        self._ids = np.load(self.carpeta / ARCHIVO_IDS, mmap_mode='r')
+
+        self._archivo = open(self.carpeta / ARCHIVO_TEXTOS, 'rb')
+        if self.formato['bytes_textos'] > 0:
+            self._blob = mmap.mmap(self._archivo.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self._blob = b""
+        self._vista = memoryview(self._blob)
+
+        self._metadatos: Optional[List[Dict]] = None
+
+    def __len__(self) -> int:
+        return int(self._ids.shape[0])
+
+    def __contains__(self, id_chunk: int) -> bool:
+        return self._posicion(id_chunk) is not None
+
+    def _posicion(self, id_chunk: int) -> Optional[int]:
+        pos = int(np.searchsorted(self._ids, id_chunk))
+        if pos < len(self) and int(self._ids[pos]) == id_chunk:
+            return pos
+        return None
+
+    def ids(self) -> np.ndarray:
+        """IDs de todos los chunks (vista memory-mapped, ordenada)"""
+        return self._ids
+
+    def bytes_chunk(self, id_chunk: int) -> Optional[memoryview]:
+        """Vista sin copia sobre los bytes UTF-8 del chunk (None si no existe)"""
+        pos = self._posicion(id_chunk)
+        if pos is None:
+            return None
+        inicio, fin = int(self._offsets[pos]), int(self._offsets[pos + 1])
+        return self._vista[inicio:fin]
+
+    def texto(self, id_chunk: int) -> Optional[str]:
+        """Texto del chunk (None si el ID no existe)"""
+        datos = self.bytes_chunk(id_chunk)
+        if datos is None:
+            return None
+        return str(datos, 'utf-8')
+
+    def metadata(self, id_chunk: int) -> Dict:
+        """Metadatos del chunk; la tabla lateral se carga la primera vez que se pide"""
+        pos = self._posicion(id_chunk)
+        if pos is None:
+            return {}
+        if self._metadatos is None:
+            with open(self.carpeta / ARCHIVO_META, 'r', encoding='utf-8') as f:
+                self._metadatos = [json.loads(linea) for linea in f]
+        return self._metadatos[pos]
+
+    def registros(self) -> Iterator[Tuple[int, str, Dict]]:
+        """Recorre todos los chunks como (id, texto, metadata)"""
+        for id_chunk in self._ids:
+            id_chunk = int(id_chunk)
+            yield id_chunk, self.texto(id_chunk), self.metadata(id_chunk)
+
+    def cerrar(self):
+        self._vista.release()
+        if isinstance(self._blob, mmap.mmap):
+            self._blob.close()
+        self._archivo.close()
+
+
+# =============================================================================
+# MIGRACIÓN DESDE chunks.pkl
+# =============================================================================
+
+def existe_almacen(carpeta: Path) -> bool:
+    return (Path(carpeta) / ARCHIVO_FORMATO).exists()
+
+
+def registros_pickle(carpeta: Path) -> Iterator[Tuple[int, str, Dict]]:
+    """Chunks de un chunks.pkl antiguo (lista posicional o dict {id: Document}), sin escribir nada"""
+    with open(Path(carpeta) / "chunks.pkl", 'rb') as f:
+        chunks = pickle.load(f)
+
+    items = chunks.items() if isinstance(chunks, dict) else enumerate(chunks)
+    for id_chunk, doc in items:
+        yield id_chunk, doc.page_content, dict(doc.metadata)
+
+
+def leer_registros(carpeta: Path) -> List[Tuple[int, str, Dict]]:
+    """
+    Todos los chunks como (id, texto, metadata), del almacén o de un
+    chunks.pkl antiguo (para el build incremental; no migra nada).
+    """
+    if existe_almacen(carpeta) or not (Path(carpeta) / "chunks.pkl").exists():
+        almacen = abrir_almacen(carpeta)
+        try:
+            return list(almacen.registros())
+        finally:
+            almacen.cerrar()
+    return list(registros_pickle(carpeta))
+
+
+def migrar_desde_pickle(carpeta: Path) -> int:
+    """
+    Convierte chunks.pkl al almacén columnar y lo renombra a chunks.pkl.bak.
+
+    Es un paso offline (`python codigo/almacen_chunks.py <carpeta>`): escribe
+    en la carpeta, así que no debe correr mientras los agentes la sirven.
+
+    Returns:
+        int: Número de chunks migrados
+    """
+    carpeta = Path(carpeta)
+    total = escribir_almacen(carpeta, registros_pickle(carpeta))
+    os.replace(carpeta / "chunks.pkl", carpeta / "chunks.pkl.bak")
+    return total
+
+
+def abrir_almacen(carpeta: Path) -> AlmacenChunks:
+    """
+    Abre el almacén de chunks (solo lectura: nunca escribe en la carpeta).
+
+    Raises:
+        FileNotFoundError: Si no hay almacén; si solo está el chunks.pkl
+            antiguo, el mensaje indica cómo migrarlo
+    """
+    carpeta = Path(carpeta)
+
+    if not existe_almacen(carpeta):
+        if (carpeta / "chunks.pkl").exists():
+            raise FileNotFoundError(
+                f"{carpeta} tiene solo chunks.pkl (formato antiguo). Migra offline con "
+                f"'python codigo/almacen_chunks.py {carpeta}' o reconstruye con create_vectorstore.py"
+            )
+        raise FileNotFoundError(f"Archivo no encontrado: {carpeta / ARCHIVO_FORMATO}")
+
+    return AlmacenChunks(carpeta)
+
+
+if __name__ == '__main__':
+    import sys
+
+    destino = Path(sys.argv[1] if len(sys.argv) > 1 else "datos/vectorstore_faiss")
+    if not existe_almacen(destino) and (destino / "chunks.pkl").exists():
+        print("♻️  Migrando chunks.pkl al almacén memory-mapped...")
+        total = migrar_desde_pickle(destino)
+        print(f"✅ {total} chunks migrados (respaldo en chunks.pkl.bak)")
+    almacen = abrir_almacen(destino)
+    print(f"✅ Almacén listo en {destino}: {len(almacen)} chunks, "
+          f"{almacen.formato['bytes_textos'] / 1024:.1f} KB de texto")
@@ -12,12 +12,14 @@ Autor: Evaluación 2 - Everlast Chile
 import streamlit as st
 import os
 import sys
+import uuid
 from dotenv import load_dotenv
 
 # Agregar path del código
 sys.path.insert(0, os.path.join(os.path.dirname(__file__)))
 
 from agente_principal import AgenteEverlast
+from tools_everlast import obtener_cache_respuestas, precalentar
 
 
 # =============================================================================
@@ -77,11 +79,20 @@ def inicializar_agente():
             st.error("❌ Error: Variables de entorno no configuradas")
             st.stop()
         
-        st.session_state.agente = AgenteEverlast(github_token, base_url)
+        # El id de sesión va en la URL (?sesion=...): al recargar la página o
+        # caer en otro worker se retoma la misma conversación del almacén
+        id_sesion = st.query_params.get("sesion")
+        if not id_sesion:
+            id_sesion = uuid.uuid4().hex
+            st.query_params["sesion"] = id_sesion
+        st.session_state.agente = AgenteEverlast(github_token, base_url, id_sesion=id_sesion)
+        precalentar()
     
-    # Inicializar historial de mensajes si no existe
+    # Inicializar historial de mensajes si no existe (retomando el de la sesión guardada)
     if "messages" not in st.session_state:
-        st.session_state.messages = []
+        agente = st.session_state.agente
+        agente.cargar_sesion()
+        st.session_state.messages = agente.memoria.obtener_historial()
 
 
 # =============================================================================
@@ -116,7 +127,7 @@ def main():
         
         # Botón para limpiar
         if st.button("🧹 Nueva Conversación", use_container_width=True):
-            st.session_state.agente.memoria.limpiar()
+            st.session_state.agente.limpiar_memoria()
             st.session_state.messages = []
             st.success("✅ Memoria limpiada")
             st.rerun()
@@ -126,6 +137,12 @@ def main():
         st.subheader("📊 Estadísticas")
         st.metric("Mensajes", len(st.session_state.messages))
         
+        # Caché semántica de respuestas (compartida por todas las sesiones)
+        stats_cache = obtener_cache_respuestas().estadisticas()
+        col1, col2 = st.columns(2)
+        col1.metric("Acierto caché", f"{stats_cache['tasa_acierto']:.0%}")
+        col2.metric("Latencia ahorrada", f"{stats_cache['latencia_ahorrada']:.1f} s")
+        
         # Ejemplos
         st.markdown("---")
         st.subheader("💡 Prueba preguntar:")
@@ -163,16 +180,21 @@ def main():
             # Obtener la consulta del usuario
             user_query = st.session_state.messages[-1]["content"]
             
-             # Mostrar spinner y procesar
+            # Mostrar la respuesta a medida que llegan los tokens
             with st.chat_message("assistant"):
-                with st.spinner("🤔 Pensando..."):
-                    try:
-                        respuesta = st.session_state.agente.procesar(user_query)
-                        st.markdown(respuesta)
-                    except Exception as e:
-                        respuesta = f"❌ Error al procesar: {str(e)[:200]}"
-                        st.error(respuesta)
-                    
+                try:
+                    respuesta = st.write_stream(
+                        st.session_state.agente.procesar_stream(user_query)
+                    )
+                except Exception as e:
+                    respuesta = f"❌ Error al procesar: {str(e)[:200]}"
+                    st.error(respuesta)
+            
+            st.session_state.messages.append({
+                "role": "assistant",
+                "content": respuesta
+            })
+
                     
     except Exception as e:
         error_msg = f"❌ Error al procesar: {str(e)}"
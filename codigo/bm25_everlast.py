@@ -0,0 +1,197 @@
+"""
+bm25_everlast.py
+================
+Índice léxico BM25 sobre los chunks del vector store.
+
+Complementa a FAISS en las consultas donde los embeddings fallan y que además
+se pueden resolver sin llamar a la API: SKUs ("GPL-002"), pesos y tallas
+("16 oz", "100 lbs"). Lo construye create_vectorstore.py (bm25.json) y lo usa
+tools_everlast.buscar_hibrido() junto con la búsqueda vectorial.
+
+Autor: Evaluación 2 - Everlast Chile
+"""
+
+import json
+import math
+import os
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Dict, Iterable, List, Set, Tuple
+
+
+FORMATO_VERSION = 1
+ARCHIVO_BM25 = "bm25.json"
+
+# Códigos de producto: GPE-001, SPH-005, ...
+PATRON_SKU = re.compile(r"\b[a-z]{2,4}-\d{2,4}\b")
+# Número + unidad: "16 oz", "100lbs", "180\""
+PATRON_MEDIDA = re.compile(r"\b(\d+(?:[.,]\d+)?)\s*(oz|lbs?|kg|cm|m|mm|pulgadas|\")(?![a-z])")
+PATRON_PALABRA = re.compile(r"[a-z0-9ñ]+")
+
+# Palabras vacías frecuentes en las preguntas de clientes
+STOPWORDS = {
+    "a", "al", "con", "cual", "cuanto", "de", "del", "el", "en", "es", "la",
+    "las", "lo", "los", "me", "mi", "para", "por", "que", "se", "su", "tu",
+    "un", "una", "y", "o", "hay", "tiene", "tienen", "cuesta", "precio"
+}
+
+
+# =============================================================================
+# TOKENIZACIÓN
+# =============================================================================
+
+def normalizar(texto: str) -> str:
+    """Minúsculas, sin tildes (conserva la ñ) y sin separador de miles en precios"""
+    texto = texto.lower().replace("ñ", "\x00")
+    texto = unicodedata.normalize("NFKD", texto)
+    texto = "".join(c for c in texto if not unicodedata.combining(c)).replace("\x00", "ñ")
+    return re.sub(r"(\d)\.(\d{3})\b", r"\1\2", texto)
+
+
+def _unidad(unidad: str) -> str:
+    return "lbs" if unidad.startswith("lb") else unidad.replace('"', "pulgadas")
+
+
+def terminos_exactos(texto: str) -> Set[str]:
+    """SKUs y medidas (número+unidad) del texto, normalizados: {'gpl-002', '16oz'}"""
+    texto = normalizar(texto)
+    exactos = set(PATRON_SKU.findall(texto))
+    exactos.update(f"{numero.replace(',', '.')}{_unidad(unidad)}"
+                   for numero, unidad in PATRON_MEDIDA.findall(texto))
+    return exactos
+
+
+def tokenizar(texto: str) -> List[str]:
+    """Palabras sin stopwords + términos exactos como tokens adicionales"""
+    normalizado = normalizar(texto)
+    tokens = [t for t in PATRON_PALABRA.findall(normalizado) if t not in STOPWORDS]
+    palabras = set(tokens)
+    tokens.extend(e for e in terminos_exactos(texto) if e not in palabras)
+    return tokens
+
+
+# =============================================================================
+# ÍNDICE
+# =============================================================================
+
+class IndiceBM25:
+    """
+    Índice invertido BM25 (Okapi).
+
+    Args:
+        k1: Saturación de la frecuencia del término
+        b: Normalización por largo del documento
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, List[Tuple[int, int]]] = {}
+        self.largos: Dict[int, int] = {}
+        self.exactos: Dict[int, List[str]] = {}
+
+    @classmethod
+    def construir(cls, documentos: Iterable[Tuple[int, str]], **kwargs) -> "IndiceBM25":
+        """Construye el índice a partir de pares (id, texto)"""
+        indice = cls(**kwargs)
+        for id_doc, texto in documentos:
+            indice.agregar(id_doc, texto)
+        return indice
+
+    def agregar(self, id_doc: int, texto: str):
+        """Agrega un documento (para construir el índice a medida que llegan los chunks)"""
+        tokens = tokenizar(texto)
+        self.largos[id_doc] = len(tokens)
+        self.exactos[id_doc] = sorted(terminos_exactos(texto))
+        for termino, frecuencia in Counter(tokens).items():
+            self.postings.setdefault(termino, []).append((id_doc, frecuencia))
+
+    @property
+    def num_documentos(self) -> int:
+        return len(self.largos)
+
+    def _idf(self, termino: str) -> float:
+        n = len(self.postings.get(termino, ()))
+        return math.log(1 + (self.num_documentos - n + 0.5) / (n + 0.5))
+
+    def buscar(self, query: str, k: int = 10) -> List[Tuple[int, float]]:
+        """
+        Returns:
+            List[Tuple[int, float]]: (id, puntaje BM25) de mayor a menor, solo puntajes > 0
+        """
+        if not self.largos:
+            return []
+
+        promedio = sum(self.largos.values()) / self.num_documentos
+        puntajes = defaultdict(float)
+
+        for termino in set(tokenizar(query)):
+            idf = self._idf(termino)
+            for id_doc, frecuencia in self.postings.get(termino, ()):
+                norma = 1 - self.b + self.b * self.largos[id_doc] / promedio
+                puntajes[id_doc] += idf * frecuencia * (self.k1 + 1) / (frecuencia + self.k1 * norma)
+
+        return sorted(puntajes.items(), key=lambda item: item[1], reverse=True)[:k]
+
+    def contiene_exactos(self, id_doc: int, exactos: Set[str]) -> bool:
+        """True si el documento contiene todos los SKUs/medidas dados"""
+        return exactos.issubset(self.exactos.get(id_doc, ()))
+
+    # -------------------------------------------------------------------------
+    # Persistencia
+    # -------------------------------------------------------------------------
+
+    def guardar(self, carpeta: Path):
+        """Escribe bm25.json de forma atómica"""
+        datos = {
+            'version': FORMATO_VERSION,
+            'k1': self.k1,
+            'b': self.b,
+            'largos': self.largos,
+            'exactos': self.exactos,
+            'postings': self.postings
+        }
+        destino = Path(carpeta) / ARCHIVO_BM25
+        tmp = destino.with_suffix(f".tmp{os.getpid()}")
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(datos, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp, destino)
+
+    @classmethod
+    def cargar(cls, carpeta: Path) -> "IndiceBM25":
+        """
+        Raises:
+            FileNotFoundError: Si el vector store no tiene bm25.json
+            ValueError: Si el formato no es compatible
+        """
+        with open(Path(carpeta) / ARCHIVO_BM25, 'r', encoding='utf-8') as f:
+            datos = json.load(f)
+
+        if datos.get('version') != FORMATO_VERSION:
+            raise ValueError(f"Versión de bm25.json no soportada: {datos.get('version')}")
+
+        indice = cls(k1=datos['k1'], b=datos['b'])
+        indice.largos = {int(i): n for i, n in datos['largos'].items()}
+        indice.exactos = {int(i): e for i, e in datos['exactos'].items()}
+        indice.postings = {t: [tuple(p) for p in ps] for t, ps in datos['postings'].items()}
+        return indice
+
+
+# =============================================================================
+# FUSIÓN
+# =============================================================================
+
+def fusion_rrf(rankings: List[List[int]], k: int, constante: int = 60) -> List[Tuple[int, float]]:
+    """
+    Reciprocal Rank Fusion: puntaje(d) = Σ 1 / (constante + posición de d en cada ranking).
+
+    Returns:
+        List[Tuple[int, float]]: (id, puntaje RRF) de mayor a menor, máximo k
+    """
+    puntajes = defaultdict(float)
+    for ranking in rankings:
+        for posicion, id_doc in enumerate(ranking, 1):
+            puntajes[id_doc] += 1.0 / (constante + posicion)
+    return sorted(puntajes.items(), key=lambda item: item[1], reverse=True)[:k]
@@ -0,0 +1,208 @@
+"""
+cache_embeddings.py
+===================
+Caché de embeddings de consultas direccionada por contenido.
+
+Un LRU en memoria (microsegundos) delante de un almacén SQLite en disco
+(sobrevive a reinicios). La clave es un hash SHA-256 del nombre del modelo
+más el texto normalizado, así "¿Qué guantes...?" y "¿qué  guantes...? "
+comparten entrada.
+
+Autor: Evaluación 2 - Everlast Chile
+"""
+
+import hashlib
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional
+
+import numpy as np
+
+
+# =============================================================================
+# CLAVES
+# =============================================================================
+
+def normalizar_texto(texto: str) -> str:
+    """Normaliza unicode, mayúsculas y espacios para que consultas equivalentes coincidan"""
+    texto = unicodedata.normalize("NFC", texto)
+    return " ".join(texto.lower().split())
+
+
+def clave_embedding(modelo: str, texto: str) -> str:
+    """Clave direccionada por contenido: sha256(modelo + texto normalizado)"""
+    contenido = f"{modelo}\x00{normalizar_texto(texto)}"
+    return hashlib.sha256(contenido.encode("utf-8")).hexdigest()
+
+
+# =============================================================================
+# CACHÉ LRU + SQLITE
+# =============================================================================
+
+class CacheEmbeddings:
+    """
+    Caché de dos niveles para embeddings de consultas.
+
+    Args:
+        ruta: Archivo SQLite para el nivel en disco (None = solo memoria)
+        max_memoria: Máximo de vectores en el LRU en memoria
+        max_disco: Máximo de vectores en disco antes de desalojar los menos usados
+    """
+
+    def __init__(self, ruta: Optional[Path] = None, max_memoria: int = 1024,
+                 max_disco: int = 50000):
+        self.ruta = Path(ruta) if ruta else None
+        self.max_memoria = max_memoria
+        self.max_disco = max_disco
+
+        self._memoria: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conexion = None
+
+        self.hits_memoria = 0
+        self.hits_disco = 0
+        self.misses = 0
+        self.desalojos = 0
+
+        if self.ruta is not None:
+            self._abrir_disco()
+
+    def _abrir_disco(self):
+        """Abre (o crea) la base SQLite; si falla, la caché sigue solo en memoria"""
+        try:
+            self.ruta.parent.mkdir(parents=True, exist_ok=True)
+            self._conexion = sqlite3.connect(str(self.ruta), check_same_thread=False)
+            self._conexion.execute("PRAGMA journal_mode=WAL")
+            self._conexion.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " clave TEXT PRIMARY KEY,"
+                " modelo TEXT NOT NULL,"
+                " dimension INTEGER NOT NULL,"
+                " vector BLOB NOT NULL,"
+                " ultimo_uso REAL NOT NULL)"
+            )
+            self._conexion.execute(
+                "CREATE INDEX IF NOT EXISTS idx_ultimo_uso ON embeddings(ultimo_uso)"
+            )
+            self._conexion.commit()
+        except sqlite3.Error as e:
+            print(f"   ⚠️  Caché de embeddings sin disco ({e})")
+            self._conexion = None
+
+    def _recordar(self, clave: str, vector: np.ndarray):
+        """Inserta en el LRU en memoria desalojando el menos reciente"""
+        self._memoria[clave] = vector
+        self._memoria.move_to_end(clave)
+        while len(self._memoria) > self.max_memoria:
+            self._memoria.popitem(last=False)
+            self.desalojos += 1
+
+    def obtener(self, modelo: str, texto: str) -> Optional[np.ndarray]:
+        """
+        Busca el embedding de un texto.
+
+        Returns:
+            np.ndarray (float32) o None si no está en caché
+        """
+        clave = clave_embedding(modelo, texto)
+
+        with self._lock:
+            vector = self._memoria.get(clave)
+            if vector is not None:
+                self._memoria.move_to_end(clave)
+                self.hits_memoria += 1
+                return vector
+
+            if self._conexion is not None:
+                try:
+                    fila = self._conexion.execute(
+                        "SELECT dimension, vector FROM embeddings WHERE clave = ?",
+                        (clave,)
+                    ).fetchone()
+                    if fila is not None:
+                        self._conexion.execute(
+                            "UPDATE embeddings SET ultimo_uso = ? WHERE clave = ?",
+                            (time.time(), clave)
+                        )
+                        self._conexion.commit()
+                        vector = np.frombuffer(fila[1], dtype=np.float32, count=fila[0])
+                        self._recordar(clave, vector)
+                        self.hits_disco += 1
+                        return vector
+                except sqlite3.Error as e:
+                    print(f"   ⚠️  Error leyendo caché de embeddings: {e}")
+
+            self.misses += 1
+            return None
+
+    def guardar(self, modelo: str, texto: str, vector: np.ndarray):
+        """Guarda el embedding en memoria y en disco"""
+        clave = clave_embedding(modelo, texto)
+        vector = np.ascontiguousarray(vector, dtype=np.float32).reshape(-1)
+        vector.setflags(write=False)
+
+        with self._lock:
+            self._recordar(clave, vector)
+
+            if self._conexion is None:
+                return
+
+            try:
+                self._conexion.execute(
+                    "INSERT OR REPLACE INTO embeddings "
+                    "(clave, modelo, dimension, vector, ultimo_uso) VALUES (?, ?, ?, ?, ?)",
+                    (clave, modelo, int(vector.shape[0]), vector.tobytes(), time.time())
+                )
+                self._desalojar_disco()
+                self._conexion.commit()
+            except sqlite3.Error as e:
+                print(f"   ⚠️  Error guardando caché de embeddings: {e}")
+
+    def _desalojar_disco(self):
+        """Borra los vectores menos usados cuando el disco supera max_disco (10% de holgura)"""
+        total = self._conexion.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        if total <= self.max_disco:
+            return
+
+        sobrante = total - self.max_disco + max(1, self.max_disco // 10)
+        self._conexion.execute(
+            "DELETE FROM embeddings WHERE clave IN ("
+            " SELECT clave FROM embeddings ORDER BY ultimo_uso ASC LIMIT ?)",
+            (sobrante,)
+        )
+        self.desalojos += sobrante
+
+    def estadisticas(self) -> Dict:
+        """Contadores de aciertos/fallos y tamaños actuales"""
+        with self._lock:
+            en_disco = 0
+            if self._conexion is not None:
+                try:
+                    en_disco = self._conexion.execute(
+                        "SELECT COUNT(*) FROM embeddings"
+                    ).fetchone()[0]
+                except sqlite3.Error:
+                    pass
+
+            consultas = self.hits_memoria + self.hits_disco + self.misses
+            return {
+                'hits_memoria': self.hits_memoria,
+                'hits_disco': self.hits_disco,
+                'misses': self.misses,
+                'desalojos': self.desalojos,
+                'tasa_acierto': (self.hits_memoria + self.hits_disco) / consultas if consultas else 0.0,
+                'en_memoria': len(self._memoria),
+                'en_disco': en_disco
+            }
+
+    def limpiar(self):
+        """Vacía ambos niveles"""
+        with self._lock:
+            self._memoria.clear()
+            if self._conexion is not None:
+                self._conexion.execute("DELETE FROM embeddings")
+                self._conexion.commit()
@@ -0,0 +1,194 @@
+"""
+cache_respuestas.py
+===================
+Caché semántica de respuestas del agente.
+
+Preguntas casi iguales ("política de devolución", "¿cómo devuelvo un
+producto?") tienen embeddings muy cercanos. Si una pregunta nueva supera el
+umbral de similitud coseno con una ya respondida, se devuelve esa respuesta
+sin pasar por el ciclo ReAct: cero llamadas al LLM y sin recuperación.
+
+Solo se cachean preguntas que no dependen del historial (ver
+consulta_independiente). Las entradas vencen por TTL, se desalojan por LRU al
+superar el tamaño máximo y se descartan todas cuando cambia la versión del
+vector store.
+
+Autor: Evaluación 2 - Everlast Chile
+"""
+
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+import numpy as np
+
+
+# Palabras que suelen referirse a algo dicho antes en la conversación
+REFERENCIAS_CONTEXTO = {
+    "eso", "esa", "ese", "esos", "esas", "este", "esta", "estos", "estas",
+    "anterior", "antes", "mismo", "misma", "tambien", "también", "otro", "otra",
+    "entonces", "dijiste", "mencionaste", "ellos", "ellas"
+}
+
+
+def consulta_independiente(consulta: str) -> bool:
+    """
+    True si la pregunta se puede responder sin el historial y sin datos propios
+    del usuario: sin números (montos, pesos, tallas a calcular) y sin palabras
+    que apunten a mensajes anteriores.
+    """
+    if re.search(r"\d", consulta):
+        return False
+    palabras = set(re.findall(r"[a-záéíóúñü]+", consulta.lower()))
+    return len(palabras) >= 2 and not (palabras & REFERENCIAS_CONTEXTO)
+
+
+@dataclass
+class EntradaRespuesta:
+    consulta: str
+    respuesta: str
+    creada: float
+    latencia: float
+
+
+class CacheRespuestas:
+    """
+    Caché de respuestas indexada por el embedding de la pregunta.
+
+    La búsqueda es un producto punto contra la matriz de embeddings
+    normalizados (vecino más cercano exacto; con max_entradas en el orden de
+    miles toma ~1 ms).
+
+    Args:
+        umbral: Similitud coseno mínima para considerar dos preguntas equivalentes
+        ttl: Segundos de vida de cada respuesta
+        max_entradas: Tamaño máximo; al superarlo se desaloja la menos usada
+    """
+
+    def __init__(self, umbral: float = 0.92, ttl: float = 3600, max_entradas: int = 1000):
+        self.umbral = umbral
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+
+        self._entradas: "OrderedDict[int, EntradaRespuesta]" = OrderedDict()
+        self._vectores: Dict[int, np.ndarray] = {}
+        self._matriz: Optional[np.ndarray] = None
+        self._claves_matriz = []
+        self._siguiente = 0
+        self._version = None
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.latencia_ahorrada = 0.0
+        self.invalidaciones = 0
+
+    # -------------------------------------------------------------------------
+    # Internos (con el lock tomado)
+    # -------------------------------------------------------------------------
+
+    def _quitar(self, clave: int):
+        self._entradas.pop(clave, None)
+        self._vectores.pop(clave, None)
+        self._matriz = None
+
+    def _expirar(self, ahora: float):
+        vencidas = [c for c, e in self._entradas.items() if ahora - e.creada > self.ttl]
+        for clave in vencidas:
+            self._quitar(clave)
+
+    def _matriz_actual(self) -> Optional[np.ndarray]:
+        """Matriz (n, d) de embeddings; se rearma solo cuando cambió el contenido"""
+        if self._matriz is None and self._vectores:
+            self._claves_matriz = list(self._vectores)
+            self._matriz = np.vstack([self._vectores[c] for c in self._claves_matriz])
+        return self._matriz
+
+    @staticmethod
+    def _normalizar(vector: np.ndarray) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    # -------------------------------------------------------------------------
+    # API
+    # -------------------------------------------------------------------------
+
+    def invalidar_si_cambio(self, version: str):
+        """Vacía la caché si el vector store cambió desde que se llenó"""
+        with self._lock:
+            if version != self._version:
+                if self._entradas:
+                    self.invalidaciones += 1
+                    print(f"   ♻️  Caché de respuestas invalidada (vector store {version})")
+                self._entradas.clear()
+                self._vectores.clear()
+                self._matriz = None
+                self._version = version
+
+    def buscar(self, vector: np.ndarray) -> Optional[EntradaRespuesta]:
+        """
+        Respuesta de la pregunta más parecida si supera el umbral.
+
+        Returns:
+            EntradaRespuesta o None
+        """
+        inicio = time.perf_counter()
+        vector = self._normalizar(vector)
+
+        with self._lock:
+            self._expirar(time.time())
+            matriz = self._matriz_actual()
+
+            if matriz is not None and matriz.shape[1] == vector.shape[0]:
+                similitudes = matriz @ vector
+                mejor = int(np.argmax(similitudes))
+                if similitudes[mejor] >= self.umbral:
+                    clave = self._claves_matriz[mejor]
+                    entrada = self._entradas[clave]
+                    self._entradas.move_to_end(clave)
+                    self.hits += 1
+                    self.latencia_ahorrada += max(0.0, entrada.latencia - (time.perf_counter() - inicio))
+                    return entrada
+
+            self.misses += 1
+            return None
+
+    def guardar(self, consulta: str, vector: np.ndarray, respuesta: str, latencia: float):
+        """
+        Guarda la respuesta de una pregunta.
+
+        Args:
+            latencia: Segundos que tomó generarla (para la métrica de latencia ahorrada)
+        """
+        with self._lock:
+            clave = self._siguiente
+            self._siguiente += 1
+            self._entradas[clave] = EntradaRespuesta(consulta, respuesta, time.time(), latencia)
+            self._vectores[clave] = self._normalizar(vector)
+            self._matriz = None
+
+            self._expirar(time.time())
+            while len(self._entradas) > self.max_entradas:
+                self._quitar(next(iter(self._entradas)))
+
+    def estadisticas(self) -> Dict:
+        """Tasa de acierto, latencia ahorrada (s) y tamaño actual"""
+        with self._lock:
+            consultas = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'tasa_acierto': self.hits / consultas if consultas else 0.0,
+                'latencia_ahorrada': self.latencia_ahorrada,
+                'invalidaciones': self.invalidaciones,
+                'en_cache': len(self._entradas)
+            }
+
+    def limpiar(self):
+        with self._lock:
+            self._entradas.clear()
+            self._vectores.clear()
+            self._matriz = None
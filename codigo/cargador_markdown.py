@@ -0,0 +1,165 @@
+"""
+cargador_markdown.py
+====================
+Carga y división de los .md de datos/ sin LangChain.
+
+Los documentos se leen línea a línea y se cortan por estructura: cada título
+#, ## o ### abre un chunk nuevo, así que en productos.md queda un producto
+por chunk (antes el splitter cortaba por caracteres y mezclaba productos
+vecinos). Cada chunk lleva en metadata la ruta de títulos que lo contiene,
+p. ej. "Catálogo de Productos > GUANTES DE BOXEO > Guantes Pro Style".
+
+Todo es un generador: en memoria hay como máximo una sección a la vez, no
+el corpus completo.
+
+Solo si una sección supera max_caracteres se parte por párrafos (luego por
+líneas); las partes siguientes repiten el título de la sección.
+
+Autor: Evaluación 2 - Everlast Chile
+"""
+
+import hashlib
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+
+
+# Sube si cambia la forma de dividir: el build incremental vuelve a dividir
+# todos los archivos aunque su contenido sea el mismo
+DIVISOR_VERSION = 2
+
+MAX_CARACTERES = 2000
+NIVEL_CORTE = 3
+
+PATRON_TITULO = re.compile(r"^(#{1,6})\s+(.+?)\s*#*\s*$")
+SEPARADOR_TITULOS = " > "
+
+
+@dataclass
+class Fragmento:
+    """Chunk de texto con su metadata (mismos atributos que el Document de LangChain)"""
+    page_content: str
+    metadata: Dict = field(default_factory=dict)
+
+
+def listar_markdown(carpeta: Path, patron: str = "**/*.md") -> List[Path]:
+    """Archivos .md de la carpeta en orden estable"""
+    return sorted(Path(carpeta).glob(patron))
+
+
+def hash_archivo(ruta: Path) -> str:
+    """
+    SHA-256 del texto del archivo leído por líneas (igual a hashear
+    read_text() completo, sin cargarlo entero).
+    """
+    sha = hashlib.sha256()
+    with open(ruta, "r", encoding="utf-8") as f:
+        for linea in f:
+            sha.update(linea.encode("utf-8"))
+    return sha.hexdigest()
+
+
+def _titulo(linea: str) -> Tuple[int, str]:
+    """(nivel, texto) si la línea es un título markdown; (0, '') si no"""
+    coincidencia = PATRON_TITULO.match(linea)
+    if not coincidencia:
+        return 0, ""
+    return len(coincidencia.group(1)), coincidencia.group(2)
+
+
+def _partir(texto: str, max_caracteres: int) -> List[str]:
+    """Parte un texto largo por párrafos, luego por líneas y, si no queda otra, por caracteres"""
+    if len(texto) <= max_caracteres:
+        return [texto]
+
+    for separador in ("\n\n", "\n"):
+        bloques = texto.split(separador)
+        if len(bloques) > 1:
+            break
+    else:
+        return [texto[i:i + max_caracteres] for i in range(0, len(texto), max_caracteres)]
+
+    partes, actual = [], ""
+    for bloque in bloques:
+        candidato = f"{actual}{separador}{bloque}" if actual else bloque
+        if len(candidato) <= max_caracteres:
+            actual = candidato
+            continue
+        if actual:
+            partes.append(actual)
+        if len(bloque) > max_caracteres:
+            partes.extend(_partir(bloque, max_caracteres))
+            actual = ""
+        else:
+            actual = bloque
+    if actual:
+        partes.append(actual)
+    return partes
+
+
+def _emitir(lineas: List[str], titulos: List[str], fuente: str,
+            max_caracteres: int) -> Iterator[Fragmento]:
+    """Convierte las líneas de una sección en uno o más fragmentos"""
+    texto = "".join(lineas).strip()
+    # Secciones que son solo títulos (p. ej. "## GUANTES DE BOXEO" seguido
+    # directo de un ###) no aportan nada propio: quedan en la ruta de los hijos
+    if not texto or all(_titulo(l)[0] or not l.strip() for l in texto.splitlines()):
+        return
+
+    ruta_titulos = [t for t in titulos if t]
+    metadata = {'source': fuente, 'seccion': SEPARADOR_TITULOS.join(ruta_titulos)}
+
+    encabezado = lineas[0].strip() if _titulo(lineas[0])[0] else ""
+    margen = max_caracteres - (len(encabezado) + 2 if encabezado else 0)
+    partes = _partir(texto, max(margen, max_caracteres // 2))
+
+    for i, parte in enumerate(partes):
+        if i > 0 and encabezado:
+            parte = f"{encabezado}\n\n{parte.strip()}"
+        yield Fragmento(page_content=parte.strip(), metadata=dict(metadata))
+
+
+def dividir_markdown(ruta: Path, max_caracteres: int = MAX_CARACTERES,
+                     nivel_corte: int = NIVEL_CORTE) -> Iterator[Fragmento]:
+    """
+    Divide un .md por títulos leyendo línea a línea.
+
+    Args:
+        ruta: Archivo .md
+        max_caracteres: Tamaño sobre el cual una sección se parte por párrafos
+        nivel_corte: Títulos de este nivel o menos abren un chunk nuevo (3 = hasta ###)
+
+    Yields:
+        Fragmento con metadata {'source', 'seccion'}
+    """
+    fuente = str(ruta)
+    titulos: List[str] = []
+    seccion: List[str] = []
+    en_codigo = False
+
+    with open(ruta, "r", encoding="utf-8") as f:
+        for linea in f:
+            if linea.lstrip().startswith("```"):
+                en_codigo = not en_codigo
+            nivel, titulo = (0, "") if en_codigo else _titulo(linea)
+
+            if nivel and nivel <= nivel_corte:
+                yield from _emitir(seccion, titulos, fuente, max_caracteres)
+                seccion = []
+                # Ruta de títulos: se corta al nivel del nuevo (rellenando niveles saltados)
+                del titulos[nivel - 1:]
+                titulos.extend([""] * (nivel - 1 - len(titulos)))
+                titulos.append(titulo)
+
+            seccion.append(linea)
+
+    yield from _emitir(seccion, titulos, fuente, max_caracteres)
+
+
+def cargar_fragmentos(carpeta: Path, patron: str = "**/*.md",
+                      max_caracteres: int = MAX_CARACTERES) -> Iterator[Tuple[Path, Fragmento]]:
+    """Recorre los fragmentos de todos los .md de la carpeta, archivo por archivo"""
+    for ruta in listar_markdown(carpeta, patron):
+        for fragmento in dividir_markdown(ruta, max_caracteres):
+            yield ruta, fragmento
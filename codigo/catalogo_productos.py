@@ -0,0 +1,412 @@
+"""
+catalogo_productos.py
+=====================
+Catálogo estructurado de productos, parseado desde datos/productos.md.
+
+productos.md tiene una estructura regular (## categoría, ### producto, SKU,
+Precio, Pesos/Tallas Disponibles con precio por variante, Colores). Este
+módulo la convierte en una tabla tipada con índices por SKU, categoría,
+color, medida (peso/talla) y rango de precio, para que las preguntas de
+precio y disponibilidad se respondan con datos exactos y sin pasar por RAG.
+
+Autor: Evaluación 2 - Everlast Chile
+"""
+
+import json
+import os
+import re
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+from bm25_everlast import PATRON_SKU, normalizar, terminos_exactos
+
+
+FORMATO_VERSION = 1
+ARCHIVO_CATALOGO = "catalogo.json"
+
+PATRON_CAMPO = re.compile(r"^- \*\*(.+?):\*\*\s*(.*)$")
+PATRON_PRECIO = re.compile(r"\$\s*([\d.]+)")
+PATRON_VARIANTE = re.compile(r"^(.+?)\s*\(\$\s*([\d.]+)\)$")
+PATRON_TODOS = re.compile(r"\(todos\s*\$\s*([\d.]+)\)")
+PATRON_RANGO_TALLAS = re.compile(r"^(\d+)\s+al\s+(\d+)$")
+
+# Campos de productos.md que listan variantes con o sin precio
+CAMPOS_VARIANTES = ("pesos disponibles", "tallas disponibles", "tallas", "precio por tamaño")
+CAMPOS_COLORES = ("colores", "colores disponibles")
+
+
+# =============================================================================
+# MODELO
+# =============================================================================
+
+@dataclass
+class Variante:
+    """Peso, talla o tamaño de un producto con su precio"""
+    nombre: str
+    precio: int
+
+
+@dataclass
+class Producto:
+    """Fila del catálogo"""
+    sku: str
+    nombre: str
+    categoria: str
+    precio: int
+    variantes: List[Variante] = field(default_factory=list)
+    colores: List[str] = field(default_factory=list)
+    uso: str = ""
+
+    @property
+    def precio_min(self) -> int:
+        return min([self.precio] + [v.precio for v in self.variantes])
+
+    @property
+    def precio_max(self) -> int:
+        return max([self.precio] + [v.precio for v in self.variantes])
+
+    def formatear(self) -> str:
+        """Una línea compacta para el contexto del LLM"""
+        partes = [f"{self.sku} | {self.nombre} | {self.categoria} | {_pesos(self.precio)}"]
+        if self.variantes:
+            partes.append("Variantes: " + ", ".join(
+                f"{v.nombre} {_pesos(v.precio)}" for v in self.variantes
+            ))
+        if self.colores:
+            partes.append("Colores: " + ", ".join(self.colores))
+        return " | ".join(partes)
+
+
+def _pesos(valor: int) -> str:
+    """34990 -> '$34.990'"""
+    return "$" + f"{valor:,}".replace(",", ".")
+
+
+def _a_entero(precio: str) -> int:
+    return int(precio.replace(".", ""))
+
+
+# =============================================================================
+# PARSER
+# =============================================================================
+
+def _dividir_lista(valor: str) -> List[str]:
+    """Separa por comas que no estén dentro de paréntesis"""
+    partes, actual, nivel = [], "", 0
+    for c in valor:
+        if c == "(":
+            nivel += 1
+        elif c == ")":
+            nivel -= 1
+        if c == "," and nivel == 0:
+            partes.append(actual.strip())
+            actual = ""
+        else:
+            actual += c
+    if actual.strip():
+        partes.append(actual.strip())
+    return partes
+
+
+def _parsear_variantes(valor: str, precio_base: int) -> List[Variante]:
+    """
+    Soporta los formatos de productos.md:
+        12 oz ($34.990), 14 oz ($37.990)
+        S, M, L, XL (todos $29.990)
+        S, M, L, XL, XXL            (precio base)
+        38 al 46                    (rango de tallas numéricas)
+    """
+    todos = PATRON_TODOS.search(valor)
+    precio_comun = _a_entero(todos.group(1)) if todos else precio_base
+    valor = PATRON_TODOS.sub("", valor).strip()
+
+    rango = PATRON_RANGO_TALLAS.match(valor)
+    if rango:
+        return [Variante(str(t), precio_comun)
+                for t in range(int(rango.group(1)), int(rango.group(2)) + 1)]
+
+    variantes = []
+    for item in _dividir_lista(valor):
+        con_precio = PATRON_VARIANTE.match(item)
+        if con_precio:
+            variantes.append(Variante(con_precio.group(1).strip(), _a_entero(con_precio.group(2))))
+        elif item:
+            variantes.append(Variante(re.sub(r"\s*\(.*\)$", "", item), precio_comun))
+    return variantes
+
+
+def parsear_productos(texto: str) -> List[Producto]:
+    """Convierte el markdown de productos.md en una lista de Producto"""
+    productos = []
+    categoria = ""
+    categoria_producto = ""
+    actual: Optional[Dict] = None
+
+    def cerrar():
+        if actual and actual.get('sku'):
+            precio = actual.get('precio', 0)
+            variantes = []
+            for campo in CAMPOS_VARIANTES:
+                if campo in actual['campos']:
+                    variantes.extend(_parsear_variantes(actual['campos'][campo], precio))
+            colores = []
+            for campo in CAMPOS_COLORES:
+                if campo in actual['campos']:
+                    colores.extend(_dividir_lista(actual['campos'][campo]))
+            productos.append(Producto(
+                sku=actual['sku'],
+                nombre=actual['nombre'],
+                categoria=categoria_producto,
+                precio=precio,
+                variantes=variantes,
+                colores=colores,
+                uso=actual['campos'].get('uso recomendado', '')
+            ))
+
+    for linea in texto.splitlines():
+        if linea.startswith("### "):
+            cerrar()
+            actual = {'nombre': linea[4:].strip(), 'campos': {}}
+            categoria_producto = categoria
+        elif linea.startswith("## "):
+            cerrar()
+            actual = None
+            categoria = linea[3:].strip()
+        elif actual is not None:
+            campo = PATRON_CAMPO.match(linea.strip())
+            if campo:
+                clave = campo.group(1).strip().lower()
+                valor = campo.group(2).strip()
+                actual['campos'][clave] = valor
+                if clave == "sku":
+                    actual['sku'] = valor.upper()
+                elif clave == "precio":
+                    precio = PATRON_PRECIO.search(valor)
+                    actual['precio'] = _a_entero(precio.group(1)) if precio else 0
+    cerrar()
+
+    return productos
+
+
+# =============================================================================
+# CATÁLOGO INDEXADO
+# =============================================================================
+
+def _clave(texto: str) -> str:
+    return " ".join(normalizar(texto).split())
+
+
+def _claves_medida(nombre: str) -> Set[str]:
+    """'16 oz' -> {'16oz'}; 'S/M' -> {'s/m', 's', 'm'}; '42' -> {'42'}"""
+    exactos = terminos_exactos(nombre)
+    if exactos:
+        return exactos
+    clave = _clave(nombre)
+    return {clave} | set(clave.split("/"))
+
+
+class CatalogoProductos:
+    """
+    Tabla de productos con índices en memoria.
+
+    - por SKU: dict, O(1)
+    - por categoría, color y medida: dict clave -> set de SKUs
+    - por precio: lista ordenada de (precio, sku) por variante, rango con bisect
+    """
+
+    def __init__(self, productos: List[Producto]):
+        self.productos: Dict[str, Producto] = {p.sku: p for p in productos}
+        self.por_categoria: Dict[str, Set[str]] = defaultdict(set)
+        self.por_color: Dict[str, Set[str]] = defaultdict(set)
+        self.por_medida: Dict[str, Set[str]] = defaultdict(set)
+        precios = []
+
+        for p in productos:
+            self.por_categoria[_clave(p.categoria)].add(p.sku)
+            for color in p.colores:
+                clave = _clave(color)
+                self.por_color[clave].add(p.sku)
+                for parte in clave.split("/"):
+                    self.por_color[parte.strip()].add(p.sku)
+            for medida in terminos_exactos(p.nombre):
+                self.por_medida[medida].add(p.sku)
+            for variante in p.variantes:
+                for medida in _claves_medida(variante.nombre):
+                    self.por_medida[medida].add(p.sku)
+                precios.append((variante.precio, p.sku))
+            precios.append((p.precio, p.sku))
+
+        precios.sort()
+        self._precios = [precio for precio, _ in precios]
+        self._skus_por_precio = [sku for _, sku in precios]
+
+    def __len__(self) -> int:
+        return len(self.productos)
+
+    # -------------------------------------------------------------------------
+    # Consultas
+    # -------------------------------------------------------------------------
+
+    def por_sku(self, sku: str) -> Optional[Producto]:
+        return self.productos.get(sku.strip().upper())
+
+    def _skus_categoria(self, categoria: str) -> Set[str]:
+        clave = _clave(categoria)
+        skus = set()
+        for nombre, grupo in self.por_categoria.items():
+            if clave in nombre or any(palabra.startswith(clave.rstrip("s")) for palabra in nombre.split()):
+                skus |= grupo
+        return skus
+
+    def _skus_precio(self, minimo: Optional[int], maximo: Optional[int]) -> Set[str]:
+        inicio = bisect_left(self._precios, minimo) if minimo is not None else 0
+        fin = bisect_right(self._precios, maximo) if maximo is not None else len(self._precios)
+        return set(self._skus_por_precio[inicio:fin])
+
+    def buscar(self, sku: Optional[str] = None, categoria: Optional[str] = None,
+               color: Optional[str] = None, medida: Optional[str] = None,
+               precio_min: Optional[int] = None, precio_max: Optional[int] = None,
+               nombre: Optional[str] = None) -> List[Producto]:
+        """
+        Filtra el catálogo; todos los criterios se combinan con AND.
+
+        Returns:
+            List[Producto]: Productos que cumplen, ordenados por precio
+        """
+        if sku:
+            producto = self.por_sku(sku)
+            candidatos = {producto.sku} if producto else set()
+        else:
+            candidatos = set(self.productos)
+
+        if categoria:
+            candidatos &= self._skus_categoria(categoria)
+        if color:
+            candidatos &= self.por_color.get(_clave(color), set())
+        if medida:
+            skus = set()
+            for clave in _claves_medida(medida):
+                skus |= self.por_medida.get(clave, set())
+            candidatos &= skus
+        if precio_min is not None or precio_max is not None:
+            candidatos &= self._skus_precio(precio_min, precio_max)
+            if medida:
+                # El precio tiene que ser el de la variante pedida, no el de otra
+                claves = _claves_medida(medida)
+                candidatos = {s for s in candidatos if any(
+                    claves & _claves_medida(v.nombre)
+                    and (precio_min is None or v.precio >= precio_min)
+                    and (precio_max is None or v.precio <= precio_max)
+                    for v in self.productos[s].variantes
+                ) or not self.productos[s].variantes}
+        if nombre:
+            palabras = _clave(nombre).split()
+            candidatos = {s for s in candidatos
+                          if all(p in _clave(self.productos[s].nombre) for p in palabras)}
+
+        return sorted((self.productos[s] for s in candidatos), key=lambda p: p.precio_min)
+
+    def consultar(self, consulta: str) -> List[Producto]:
+        """
+        Consulta en texto, pensada para el agente:
+
+            "sku=GPL-002"
+            "categoria=guantes; peso=16 oz; precio<=40000"
+            "color=rojo; talla=L"
+            "GPL-002"  /  "guantes 16 oz rojo"   (texto libre)
+        """
+        filtros = {}
+        if re.search(r"[=<>]", consulta):
+            for parte in re.split(r"[;,\n]", consulta):
+                m = re.match(r"\s*([a-záéíóúñ_ ]+?)\s*(<=|>=|=|<|>)\s*(.+?)\s*$", parte, re.IGNORECASE)
+                if not m:
+                    continue
+                clave, operador, valor = _clave(m.group(1)), m.group(2), m.group(3)
+                if clave == "precio":
+                    numero = _a_entero(re.sub(r"[^\d.]", "", valor) or "0")
+                    # Precios en CLP enteros: "< n" es "<= n - 1"
+                    if operador == "<=":
+                        filtros['precio_max'] = numero
+                    elif operador == "<":
+                        filtros['precio_max'] = numero - 1
+                    elif operador == ">=":
+                        filtros['precio_min'] = numero
+                    elif operador == ">":
+                        filtros['precio_min'] = numero + 1
+                    else:
+                        filtros['precio_min'] = filtros['precio_max'] = numero
+                elif clave in ("peso", "talla", "medida", "tamano", "tamaño"):
+                    filtros['medida'] = valor
+                elif clave in ("sku", "categoria", "color", "nombre"):
+                    filtros[clave] = valor
+            return self.buscar(**filtros)
+
+        # Texto libre: SKU, medidas, colores y categorías conocidas
+        normalizado = normalizar(consulta)
+        sku = PATRON_SKU.search(normalizado)
+        if sku:
+            return self.buscar(sku=sku.group(0))
+
+        medidas = terminos_exactos(consulta)
+        if medidas:
+            filtros['medida'] = sorted(medidas)[0]
+        for color in self.por_color:
+            if re.search(rf"\b{re.escape(color)}\b", normalizado):
+                filtros['color'] = color
+                break
+        for palabra in normalizado.split():
+            if len(palabra) > 3 and self._skus_categoria(palabra):
+                filtros['categoria'] = palabra
+                break
+        return self.buscar(**filtros) if filtros else []
+
+    # -------------------------------------------------------------------------
+    # Persistencia
+    # -------------------------------------------------------------------------
+
+    def guardar(self, carpeta: Path):
+        """Escribe catalogo.json de forma atómica"""
+        destino = Path(carpeta) / ARCHIVO_CATALOGO
+        tmp = destino.with_suffix(f".tmp{os.getpid()}")
+        datos = {
+            'version': FORMATO_VERSION,
+            'productos': [asdict(p) for p in self.productos.values()]
+        }
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(datos, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, destino)
+
+    @classmethod
+    def cargar(cls, carpeta: Path) -> "CatalogoProductos":
+        """
+        Raises:
+            FileNotFoundError: Si no existe catalogo.json
+            ValueError: Si el formato no es compatible
+        """
+        with open(Path(carpeta) / ARCHIVO_CATALOGO, 'r', encoding='utf-8') as f:
+            datos = json.load(f)
+
+        if datos.get('version') != FORMATO_VERSION:
+            raise ValueError(f"Versión de catalogo.json no soportada: {datos.get('version')}")
+
+        productos = []
+        for p in datos['productos']:
+            p['variantes'] = [Variante(**v) for v in p['variantes']]
+            productos.append(Producto(**p))
+        return cls(productos)
+
+    @classmethod
+    def desde_markdown(cls, archivo: Path) -> "CatalogoProductos":
+        return cls(parsear_productos(Path(archivo).read_text(encoding='utf-8')))
+
+
+if __name__ == '__main__':
+    catalogo = CatalogoProductos.desde_markdown(Path("datos/productos.md"))
+    print(f"✅ {len(catalogo)} productos")
+    for consulta in ["sku=GPL-002", "categoria=guantes; peso=16 oz; precio<=40000", "color=rojo; talla=L/XL"]:
+        print(f"\n🔍 {consulta}")
+        for producto in catalogo.consultar(consulta):
+            print(f"   {producto.formatear()}")
@@ -0,0 +1,374 @@
+"""
+cliente_http.py
+===============
+Cliente HTTP compartido para las llamadas al LLM y a la API de embeddings.
+
+Una sola sesión por proceso con pool de conexiones keep-alive: las llamadas
+siguientes reutilizan la conexión TCP/TLS en vez de negociarla de nuevo.
+Es seguro usarlo desde varios hilos (la sesión no se modifica por request).
+
+Para el camino asyncio del agente hay un cliente aiohttp por event loop
+(obtener_cliente_async) y un loop de fondo (ejecutar_sync) que permite a
+código sync esperar corrutinas sin bloquear a las demás conversaciones.
+
+Configuración por variables de entorno:
+    EVERLAST_HTTP_POOLS             Hosts distintos con pool propio (4)
+    EVERLAST_HTTP_POOL_MAXIMO       Conexiones abiertas por host (16)
+    EVERLAST_HTTP_TIMEOUT_CONEXION  Segundos para conectar (5)
+    EVERLAST_HTTP_TIMEOUT_LECTURA   Segundos esperando respuesta (60)
+    EVERLAST_HTTP2                  1 = usar HTTP/2 si httpx[http2] está instalado
+    EVERLAST_HTTP_LIMITE_ASYNC      Conexiones totales del cliente async (100)
+
+Autor: Evaluación 2 - Everlast Chile
+"""
+
+import asyncio
+import atexit
+import json as _json
+import os
+import threading
+import weakref
+import queue
+from typing import AsyncIterator, Coroutine, Dict, Iterator, Optional, Tuple, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+Timeout = Union[float, Tuple[float, float]]
+
+
+def _httpx_http2_disponible() -> bool:
+    """True si httpx y h2 están instalados (dependencias opcionales)"""
+    try:
+        import httpx  # noqa: F401
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class ClienteHTTP:
+    """
+    Sesión HTTP con pool de conexiones.
+
+    Con http2=True y httpx[http2] instalado usa un httpx.Client en HTTP/2 (varias
+    requests concurrentes sobre una misma conexión); si no, requests + urllib3
+    en HTTP/1.1 keep-alive. Los errores de red de httpx se traducen a las
+    excepciones de requests para que quien llama las maneje igual.
+
+    Args:
+        pool_conexiones: Hosts distintos que mantienen su propio pool
+        pool_maximo: Conexiones abiertas por host (debe cubrir los hilos concurrentes)
+        timeout_conexion: Timeout por defecto para conectar
+        timeout_lectura: Timeout por defecto para leer la respuesta
+        http2: Intentar HTTP/2
+    """
+
+    def __init__(self, pool_conexiones: int = 4, pool_maximo: int = 16,
+                 timeout_conexion: float = 5.0, timeout_lectura: float = 60.0,
+                 http2: bool = False):
+        self.pool_conexiones = pool_conexiones
+        self.pool_maximo = pool_maximo
+        self.timeout = (timeout_conexion, timeout_lectura)
+        self.http2 = http2 and _httpx_http2_disponible()
+
+        if http2 and not self.http2:
+            print("   ⚠️  HTTP/2 pedido pero httpx[http2] no está instalado; usando HTTP/1.1")
+
+        if self.http2:
+            import httpx
+            self._cliente = httpx.Client(
+                http2=True,
+                limits=httpx.Limits(
+                    max_connections=pool_conexiones * pool_maximo,
+                    max_keepalive_connections=pool_maximo
+                )
+            )
+        else:
+            self._cliente = requests.Session()
+            adaptador = HTTPAdapter(pool_connections=pool_conexiones, pool_maxsize=pool_maximo)
+            self._cliente.mount("https://", adaptador)
+            self._cliente.mount("http://", adaptador)
+
+    def _timeout(self, timeout: Optional[Timeout]) -> Tuple[float, float]:
+        if timeout is None:
+            return self.timeout
+        if isinstance(timeout, tuple):
+            return timeout
+        return (min(self.timeout[0], timeout), timeout)
+
+    def post(self, url: str, headers: Optional[Dict] = None, json=None,
+             timeout: Optional[Timeout] = None):
+        """
+        POST con la sesión compartida.
+
+        Args:
+            timeout: Segundos de lectura o tupla (conexión, lectura); por defecto los configurados
+
+        Returns:
+            Respuesta con status_code, headers, text y json()
+
+        Raises:
+            requests.exceptions.Timeout / ConnectionError: Errores de red
+        """
+        conexion, lectura = self._timeout(timeout)
+
+        if not self.http2:
+            return self._cliente.post(url, headers=headers, json=json, timeout=(conexion, lectura))
+
+        import httpx
+        try:
+            return self._cliente.post(
+                url, headers=headers, json=json,
+                timeout=httpx.Timeout(lectura, connect=conexion)
+            )
+        except httpx.TimeoutException as e:
+            raise requests.exceptions.Timeout(str(e))
+        except httpx.TransportError as e:
+            raise requests.exceptions.ConnectionError(str(e))
+
+    def cerrar(self):
+        self._cliente.close()
+
+
+# =============================================================================
+# INSTANCIA COMPARTIDA
+# =============================================================================
+
+_cliente: Optional[ClienteHTTP] = None
+_lock = threading.Lock()
+
+
+def obtener_cliente() -> ClienteHTTP:
+    """Cliente HTTP del proceso, creado la primera vez con la configuración del entorno"""
+    global _cliente
+
+    if _cliente is None:
+        with _lock:
+            if _cliente is None:
+                _cliente = ClienteHTTP(
+                    pool_conexiones=int(os.environ.get("EVERLAST_HTTP_POOLS", 4)),
+                    pool_maximo=int(os.environ.get("EVERLAST_HTTP_POOL_MAXIMO", 16)),
+                    timeout_conexion=float(os.environ.get("EVERLAST_HTTP_TIMEOUT_CONEXION", 5)),
+                    timeout_lectura=float(os.environ.get("EVERLAST_HTTP_TIMEOUT_LECTURA", 60)),
+                    http2=os.environ.get("EVERLAST_HTTP2", "0") == "1"
+                )
+    return _cliente
+
+
+# =============================================================================
+# CLIENTE ASYNC (aiohttp)
+# =============================================================================
+
+class RespuestaHTTP:
+    """Respuesta ya leída de una llamada async (misma interfaz que requests.Response)"""
+
+    def __init__(self, status_code: int, headers: Dict, text: str):
+        self.status_code = status_code
+        self.headers = headers
+        self.text = text
+
+    def json(self):
+        return _json.loads(self.text)
+
+
+class ErrorHTTP(Exception):
+    """Respuesta no-200 de una llamada en streaming (el cuerpo ya fue leído)"""
+
+    def __init__(self, status_code: int, text: str):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.text = text
+
+
+class ClienteHTTPAsync:
+    """
+    Sesión aiohttp con pool de conexiones, ligada al event loop que la crea.
+
+    Args:
+        limite: Conexiones abiertas en total
+        limite_por_host: Conexiones abiertas por host
+        timeout_conexion: Timeout por defecto para conectar
+        timeout_lectura: Timeout por defecto entre lecturas de la respuesta
+    """
+
+    def __init__(self, limite: int = 100, limite_por_host: int = 16,
+                 timeout_conexion: float = 5.0, timeout_lectura: float = 60.0):
+        self.limite = limite
+        self.limite_por_host = limite_por_host
+        self.timeout = (timeout_conexion, timeout_lectura)
+        self._sesion = None
+
+    def _timeouts(self, timeout: Optional[Timeout]) -> Tuple[float, float]:
+        if timeout is None:
+            return self.timeout
+        if isinstance(timeout, tuple):
+            return timeout
+        return (min(self.timeout[0], timeout), timeout)
+
+    def _obtener_sesion(self):
+        import aiohttp
+
+        if self._sesion is None or self._sesion.closed:
+            self._sesion = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.limite, limit_per_host=self.limite_por_host)
+            )
+        return self._sesion
+
+    async def post(self, url: str, headers: Optional[Dict] = None, json=None,
+                   timeout: Optional[Timeout] = None) -> RespuestaHTTP:
+        """
+        POST async; lee el cuerpo completo antes de devolver.
+
+        Raises:
+            requests.exceptions.Timeout / ConnectionError: Errores de red
+        """
+        import aiohttp
+
+        conexion, lectura = self._timeouts(timeout)
+
+        try:
+            async with self._obtener_sesion().post(
+                url, headers=headers, json=json,
+                timeout=aiohttp.ClientTimeout(sock_connect=conexion, sock_read=lectura)
+            ) as response:
+                texto = await response.text()
+                return RespuestaHTTP(response.status, dict(response.headers), texto)
+        except asyncio.TimeoutError as e:
+            raise requests.exceptions.Timeout(str(e) or "Timeout")
+        except aiohttp.ClientConnectionError as e:
+            raise requests.exceptions.ConnectionError(str(e))
+
+    async def stream_sse(self, url: str, headers: Optional[Dict] = None, json=None,
+                         timeout: Optional[Timeout] = None) -> AsyncIterator[str]:
+        """
+        POST que recibe Server-Sent Events: entrega el contenido de cada línea
+        'data: ...' a medida que llega, hasta '[DONE]'. El timeout de lectura
+        aplica entre eventos, no al total.
+
+        Raises:
+            ErrorHTTP: Si la respuesta no es 200
+            requests.exceptions.Timeout / ConnectionError: Errores de red
+        """
+        import aiohttp
+
+        conexion, lectura = self._timeouts(timeout)
+
+        try:
+            async with self._obtener_sesion().post(
+                url, headers=headers, json=json,
+                timeout=aiohttp.ClientTimeout(sock_connect=conexion, sock_read=lectura)
+            ) as response:
+                if response.status != 200:
+                    raise ErrorHTTP(response.status, await response.text())
+
+                async for linea in response.content:
+                    linea = linea.decode("utf-8").strip()
+                    if not linea.startswith("data:"):
+                        continue
+                    datos = linea[5:].strip()
+                    if datos == "[DONE]":
+                        break
+                    yield datos
+        except asyncio.TimeoutError as e:
+            raise requests.exceptions.Timeout(str(e) or "Timeout")
+        except aiohttp.ClientConnectionError as e:
+            raise requests.exceptions.ConnectionError(str(e))
+
+    async def cerrar(self):
+        if self._sesion is not None:
+            await self._sesion.close()
+
+
+_clientes_async: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, ClienteHTTPAsync]" = \
+    weakref.WeakKeyDictionary()
+
+
+def obtener_cliente_async() -> ClienteHTTPAsync:
+    """
+    Cliente async del event loop actual (una sesión aiohttp por loop).
+
+    Debe llamarse desde una corrutina.
+    """
+    loop = asyncio.get_running_loop()
+    cliente = _clientes_async.get(loop)
+    if cliente is None:
+        cliente = ClienteHTTPAsync(
+            limite=int(os.environ.get("EVERLAST_HTTP_LIMITE_ASYNC", 100)),
+            limite_por_host=int(os.environ.get("EVERLAST_HTTP_POOL_MAXIMO", 16)),
+            timeout_conexion=float(os.environ.get("EVERLAST_HTTP_TIMEOUT_CONEXION", 5)),
+            timeout_lectura=float(os.environ.get("EVERLAST_HTTP_TIMEOUT_LECTURA", 60))
+        )
+        _clientes_async[loop] = cliente
+    return cliente
+
+
+# =============================================================================
+# LOOP DE FONDO PARA CÓDIGO SYNC
+# =============================================================================
+
+_loop_fondo: Optional[asyncio.AbstractEventLoop] = None
+
+
+def ejecutar_sync(corrutina: Coroutine):
+    """
+    Ejecuta una corrutina en el event loop de fondo del proceso y espera su resultado.
+
+    Todas las llamadas sync comparten ese loop (y su sesión aiohttp), así varios
+    hilos (p. ej. sesiones de Streamlit) avanzan sus conversaciones a la vez.
+    No llamar desde una corrutina que ya corre en ese loop: usar await directamente.
+    """
+    global _loop_fondo
+
+    if _loop_fondo is None:
+        with _lock:
+            if _loop_fondo is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="everlast-asyncio", daemon=True).start()
+                _loop_fondo = loop
+                atexit.register(_cerrar_loop_fondo)
+    return asyncio.run_coroutine_threadsafe(corrutina, _loop_fondo).result()
+
+
+def _cerrar_loop_fondo():
+    """Cierra la sesión aiohttp del loop de fondo al salir del proceso"""
+    cliente = _clientes_async.get(_loop_fondo)
+    if cliente is not None:
+        try:
+            asyncio.run_coroutine_threadsafe(cliente.cerrar(), _loop_fondo).result(timeout=2)
+        except Exception:
+            pass
+
+
+_FIN = object()
+
+
+def iterar_sync(generador_async: AsyncIterator) -> Iterator:
+    """
+    Recorre un generador async desde código sync: lo consume en el loop de
+    fondo y entrega cada elemento apenas se produce (p. ej. tokens en streaming).
+    Las excepciones del generador se relanzan en el hilo que itera.
+    """
+    cola: "queue.Queue" = queue.Queue()
+
+    async def consumir():
+        try:
+            async for elemento in generador_async:
+                cola.put(elemento)
+        except BaseException as e:
+            cola.put(e)
+        finally:
+            cola.put(_FIN)
+
+    # Arranca el loop si hace falta y programa el consumidor sin esperarlo
+    ejecutar_sync(asyncio.sleep(0))
+    asyncio.run_coroutine_threadsafe(consumir(), _loop_fondo)
+
+    while True:
+        elemento = cola.get()
+        if elemento is _FIN:
+            return
+        if isinstance(elemento, BaseException):
+            raise elemento
+        yield elemento
@@ -7,196 +7,617 @@ VERSIÓN ULTRA-COMPATIBLE - Soluciona problema de proxies
 EJECUTAR UNA SOLA VEZ (o cuando cambien los documentos):
     python codigo/create_vectorstore.py
 
+Para re-indexar solo lo que cambió (reutiliza vectores existentes):
+    python codigo/create_vectorstore.py --incremental
+
+Para elegir otro tipo de índice (flat, ivf, hnsw, ivfpq, sq8):
+    python codigo/create_vectorstore.py --indice hnsw --ef-search 128
+
+Para corpus grandes, build en pipeline con memoria acotada por lote:
+    python codigo/create_vectorstore.py --streaming --lote 256
+
+Para embeber sin red (ver proveedores_embeddings.py):
+    python codigo/create_vectorstore.py --embeddings hashing
+
+Para un índice más chico, con re-ranking en precisión completa (ver cuantizacion_vectores.py):
+    python codigo/create_vectorstore.py --precision int8 --dimension-reducida 512
+
+Cada ejecución publica una versión nueva en datos/vectorstore_faiss/versiones/
+(ver versiones_vectorstore.py); los agentes en ejecución la cargan sin reiniciar.
+
 Autor: Evaluación 2 - Everlast Chile
 """
 
 import os
 import sys
 import pickle
+import hashlib
+import queue
+import threading
 from pathlib import Path
 from dotenv import load_dotenv
-from typing import List
+from typing import Dict, List, Optional
 import warnings
 
 # Suprimir warnings
 warnings.filterwarnings('ignore')
 
-# Importaciones de LangChain
-from langchain_community.document_loaders import DirectoryLoader, TextLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain.schema import Document
-
 # Importar numpy para FAISS
 import numpy as np
 
-# Importar requests para llamadas HTTP directas
-import requests
 import json
 
+from almacen_chunks import FORMATO_VERSION, EscritorAlmacenChunks, escribir_almacen, leer_registros
+from bm25_everlast import IndiceBM25
+from cargador_markdown import (
+    DIVISOR_VERSION, MAX_CARACTERES, Fragmento, dividir_markdown, hash_archivo, listar_markdown
+)
+from catalogo_productos import CatalogoProductos
+from cuantizacion_vectores import (
+    FACTOR_RERANK, PRECISIONES, EscritorVectores, VectoresCompletos, bytes_por_vector,
+    escribir_vectores, indice_con_perdida
+)
+from indice_faiss import aplicar_parametros_busqueda
+from proveedores_embeddings import ProveedorEmbeddings, crear_proveedor, identidad_guardada
+from versiones_vectorstore import (
+    carpeta_actual, descartar_staging, podar_versiones, preparar_version, publicar_version
+)
+
+
+MANIFEST_VERSION = 1
+
+# Lotes de embeddings ya terminados de un build en curso (se borra al guardar)
+CHECKPOINT_DIRNAME = ".checkpoint_embeddings"
 
-def obtener_embeddings_http(textos: List[str], api_key: str, base_url: str) -> np.ndarray:
+
+def generar_embeddings(textos: List[str], proveedor: ProveedorEmbeddings,
+                       checkpoint_dir: Optional[Path] = None, verboso: bool = True) -> np.ndarray:
     """
-    Genera embeddings usando requests HTTP directamente (sin cliente OpenAI).
-    Esto evita problemas de incompatibilidad con proxies.
+    Genera los embeddings de los chunks con el proveedor configurado.
+    
+    Con el proveedor HTTP los lotes se arman por tokens y se envían en paralelo
+    con reintentos (ver lotes_embeddings.py), sin cliente OpenAI para evitar
+    problemas con proxies. Hilos configurables con EVERLAST_EMBEDDINGS_HILOS.
     
     Args:
         textos: Lista de textos para generar embeddings
-        api_key: GitHub token
-        base_url: URL base para embeddings
+        proveedor: Proveedor de embeddings (ver proveedores_embeddings.py)
+        checkpoint_dir: Carpeta de checkpoints para retomar un build caído
     
     Returns:
         np.ndarray: Matriz de embeddings
     """
-    print(f"   Generando embeddings para {len(textos)} chunks...")
-    
-    # Construir URL completa
-    url = f"{base_url.rstrip('/')}/embeddings"
-    
-    # Headers
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
+    if verboso:
+        print(f"   Generando embeddings para {len(textos)} chunks...")
     
     try:
-        batch_size = 100
-        all_embeddings = []
-        
-        for i in range(0, len(textos), batch_size):
-            batch = textos[i:i+batch_size]
-            print(f"   Procesando batch {i//batch_size + 1}/{(len(textos)-1)//batch_size + 1}...")
-            
-            # Payload
-            payload = {
-                "model": "text-embedding-3-small",
-                "input": batch
-            }
-            
-            # Hacer request HTTP POST
-            response = requests.post(
-                url,
-                headers=headers,
-                json=payload,
-                timeout=60
-            )
-            
-            # Verificar respuesta
-            if response.status_code != 200:
-                raise Exception(
-                    f"Error HTTP {response.status_code}: {response.text}"
-                )
-            
-            # Parsear respuesta
-            data = response.json()
-            batch_embeddings = [item['embedding'] for item in data['data']]
-            all_embeddings.extend(batch_embeddings)
+        return proveedor.embeber_documentos(textos, checkpoint_dir=checkpoint_dir, verboso=verboso)
         
-        return np.array(all_embeddings, dtype=np.float32)
-        
-    except requests.exceptions.RequestException as e:
-        raise Exception(f"Error de conexión: {e}")
     except KeyError as e:
         raise Exception(f"Respuesta inválida de la API: {e}")
     except Exception as e:
         raise Exception(f"Error al generar embeddings: {e}")
 
 
-def crear_faiss_index(embeddings: np.ndarray):
+# =============================================================================
+# TIPOS DE ÍNDICE FAISS
+# =============================================================================
+
+TIPOS_INDICE = ("flat", "ivf", "hnsw", "ivfpq", "sq8")
+
+
+def configurar_indice(tipo: str, num_vectores: int, dimension: int,
+                      nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+                      precision: str = "f32", dimension_reducida: Optional[int] = None) -> Dict:
+    """
+    Elige la cadena de index_factory y los parámetros de entrenamiento/búsqueda.
+    
+    - flat:  búsqueda exacta (fuerza bruta). Recall 1.0, memoria d*4 bytes/vector
+    - ivf:   k-means en nlist listas; se revisan nprobe listas por consulta
+    - hnsw:  grafo navegable; efSearch controla recall vs latencia. Sin borrado
+    - ivfpq: IVF + product quantization (m sub-vectores de 8 bits): mínima memoria
+    - sq8:   escalar cuantizado a 8 bits (1 byte por dimensión), búsqueda exhaustiva
+    
+    flat, ivf y hnsw aceptan además `precision` (f32, f16 o int8) y
+    `dimension_reducida` (Matryoshka). Si el índice resultante pierde
+    precisión, las búsquedas re-rankean k × FACTOR_RERANK candidatos contra
+    los vectores completos (ver cuantizacion_vectores.py).
+    
+    Si hay muy pocos vectores para entrenar el tipo pedido, se cae a uno más simple.
+    Todos usan producto interno sobre vectores normalizados (= similitud coseno).
+    
+    Returns:
+        Dict con 'tipo', 'factory', 'metrica', 'parametros_busqueda',
+        'dimension_embeddings', 'precision', 'dimension_reducida', 'rerank'
+        y opcionales de construcción
+    """
+    if tipo not in TIPOS_INDICE:
+        raise ValueError(f"Tipo de índice desconocido: {tipo} (opciones: {', '.join(TIPOS_INDICE)})")
+    if precision not in PRECISIONES:
+        raise ValueError(f"Precisión desconocida: {precision} (opciones: {', '.join(PRECISIONES)})")
+    if dimension_reducida and not 0 < dimension_reducida < dimension:
+        raise ValueError(f"La dimensión reducida debe estar entre 1 y {dimension - 1}")
+    
+    config = _configurar_tipo(tipo, num_vectores, dimension_reducida or dimension, nprobe, ef_search)
+    
+    # Precisión de los vectores guardados (sq8 e ivfpq ya son cuantizados)
+    if config['tipo'] in ("sq8", "ivfpq"):
+        precision = "f32"
+    elif precision != "f32":
+        codificacion = PRECISIONES[precision][0]
+        config['factory'] = {
+            'flat': codificacion,
+            'ivf': config['factory'].replace(",Flat", f",{codificacion}"),
+            'hnsw': f"{config['factory']},{codificacion}"
+        }[config['tipo']]
+    
+    config['dimension_embeddings'] = dimension
+    config['precision'] = precision
+    config['dimension_reducida'] = dimension_reducida
+    config['rerank'] = FACTOR_RERANK if indice_con_perdida(config) else 0
+    return config
+
+
+def _configurar_tipo(tipo: str, num_vectores: int, dimension: int,
+                     nprobe: Optional[int], ef_search: Optional[int]) -> Dict:
+    """Factory y parámetros de búsqueda de cada tipo, en precisión completa"""
+    # k-means de FAISS pide ~39 puntos por centroide
+    nlist = min(int(4 * np.sqrt(num_vectores)), num_vectores // 39)
+    
+    if tipo in ("ivf", "ivfpq") and nlist < 2:
+        print(f"   ⚠️  {num_vectores} vectores no alcanzan para entrenar '{tipo}': se usa 'flat'")
+        tipo = "flat"
+    
+    if tipo == "ivfpq":
+        nbits = min(8, int(np.log2(max(1, num_vectores // 39))))
+        m = max(d for d in range(1, 65) if dimension % d == 0)
+        if nbits < 4:
+            print(f"   ⚠️  {num_vectores} vectores no alcanzan para entrenar PQ: se usa 'ivf'")
+            tipo = "ivf"
+    
+    if tipo == "flat":
+        return {'tipo': 'flat', 'factory': 'Flat', 'metrica': 'ip', 'parametros_busqueda': {}}
+    
+    if tipo == "ivf":
+        return {
+            'tipo': 'ivf',
+            'factory': f"IVF{nlist},Flat",
+            'metrica': 'ip',
+            'parametros_busqueda': {'nprobe': nprobe or max(1, nlist // 8)}
+        }
+    
+    if tipo == "ivfpq":
+        return {
+            'tipo': 'ivfpq',
+            'factory': f"IVF{nlist},PQ{m}x{nbits}",
+            'metrica': 'ip',
+            'parametros_busqueda': {'nprobe': nprobe or max(1, nlist // 8)}
+        }
+    
+    if tipo == "hnsw":
+        return {
+            'tipo': 'hnsw',
+            'factory': "HNSW32",
+            'metrica': 'ip',
+            'ef_construction': 200,
+            'parametros_busqueda': {'efSearch': ef_search or 64}
+        }
+    
+    return {'tipo': 'sq8', 'factory': 'SQ8', 'metrica': 'ip', 'parametros_busqueda': {}}
+
+
+def preparar_vectores(embeddings: np.ndarray, config_indice: Dict) -> np.ndarray:
+    """
+    Vectores tal como entran al índice: truncados si hay dimensión reducida
+    (Matryoshka) y normalizados a norma 1 (copia) si el índice usa producto interno
+    """
+    import faiss
+    
+    if config_indice.get('dimension_reducida'):
+        embeddings = embeddings[:, :config_indice['dimension_reducida']]
+    vectores = np.array(embeddings, dtype=np.float32, copy=True)
+    if config_indice.get('metrica') == 'ip':
+        faiss.normalize_L2(vectores)
+    return vectores
+
+
+def nuevo_indice_faiss(dimension: int, config_indice: Dict):
+    """Índice vacío (sin entrenar) del tipo configurado, envuelto en IndexIDMap2"""
+    import faiss
+    
+    metrica = faiss.METRIC_INNER_PRODUCT if config_indice.get('metrica') == 'ip' else faiss.METRIC_L2
+    base = faiss.index_factory(dimension, config_indice['factory'], metrica)
+    
+    if 'ef_construction' in config_indice:
+        faiss.downcast_index(base).hnsw.efConstruction = config_indice['ef_construction']
+    
+    return faiss.IndexIDMap2(base)
+
+
+def crear_faiss_index(embeddings: np.ndarray, ids: Optional[np.ndarray] = None,
+                      config_indice: Optional[Dict] = None):
     """
     Crea un índice FAISS a partir de embeddings.
     
+    El índice va envuelto en IndexIDMap2 para que cada vector conserve el ID
+    estable de su chunk (permite borrar/agregar en builds incrementales).
+    
     Args:
         embeddings: Matriz de embeddings
+        ids: IDs de los chunks (por defecto 0..n-1)
+        config_indice: Resultado de configurar_indice (por defecto: flat)
     
     Returns:
         FAISS index
     """
-    import faiss
+    if ids is None:
+        ids = np.arange(embeddings.shape[0], dtype=np.int64)
+    if config_indice is None:
+        config_indice = configurar_indice("flat", embeddings.shape[0], embeddings.shape[1])
+    
+    embeddings = preparar_vectores(embeddings, config_indice)
+    index = nuevo_indice_faiss(embeddings.shape[1], config_indice)
+    
+    if not index.is_trained:
+        index.train(embeddings)
     
-    dimension = embeddings.shape[1]
-    index = faiss.IndexFlatL2(dimension)
-    index.add(embeddings)
+    index.add_with_ids(embeddings, np.asarray(ids, dtype=np.int64))
+    aplicar_parametros_busqueda(index, config_indice)
     
     return index
 
 
-def main():
-    """Función principal para crear el vector store"""
+class MedidorRecall:
+    """
+    Recall@k del índice frente a la búsqueda exacta (flat) en dimensión completa.
     
-    print("=" * 80)
-    print("CREACIÓN DE VECTOR STORE FAISS - EVERLAST CHILE")
-    print("=" * 80)
+    Los vecinos exactos se arman lote a lote (faiss.ResultHeap), así el build
+    streaming mide sin tener todos los vectores juntos. Las consultas son
+    chunks del primer lote con un poco de ruido gaussiano, para que no sea
+    trivial encontrar el vector idéntico. Si config_indice pide re-ranking,
+    se mide igual que en tools_everlast: k × factor candidatos del índice
+    reordenados con los vectores completos.
     
-    # -------------------------------------------------------------------------
-    # 1. CONFIGURACIÓN INICIAL
-    # -------------------------------------------------------------------------
-    print("\n[1/7] Cargando configuración...")
+    Args:
+        config_indice: Configuración del índice a medir
+        total: Total de vectores que se van a agregar
+        k: Vecinos por consulta
+        muestras: Máximo de consultas
+    """
     
-    load_dotenv()
+    def __init__(self, config_indice: Dict, total: int, k: int = 3, muestras: int = 200):
+        self.config_indice = config_indice
+        self.completo = dict(config_indice, dimension_reducida=None)
+        self.k = min(k, total)
+        self.muestras = muestras
+        self.consultas = None
+        self._exactos = None
+    
+    def agregar(self, embeddings: np.ndarray, ids: np.ndarray):
+        """Suma un lote (embeddings sin preparar, ids int64) a la búsqueda exacta"""
+        import faiss
+        
+        embeddings = preparar_vectores(embeddings, self.completo)
+        n, dimension = embeddings.shape
+        metrica_ip = self.config_indice.get('metrica') == 'ip'
+        
+        if self.consultas is None:
+            rng = np.random.default_rng(0)
+            seleccion = rng.choice(n, size=min(self.muestras, n), replace=False)
+            escala = np.linalg.norm(embeddings[seleccion], axis=1, keepdims=True) / np.sqrt(dimension)
+            ruido = rng.normal(0, 0.3, (len(seleccion), dimension)).astype(np.float32) * escala
+            self.consultas = preparar_vectores(embeddings[seleccion] + ruido, self.completo)
+            self._exactos = faiss.ResultHeap(len(seleccion), self.k, keep_max=metrica_ip)
+        
+        exacto = faiss.IndexFlatIP(dimension) if metrica_ip else faiss.IndexFlatL2(dimension)
+        exacto.add(embeddings)
+        distancias, posiciones = exacto.search(self.consultas, min(self.k, n))
+        self._exactos.add_result(distancias, np.asarray(ids, dtype=np.int64)[posiciones])
     
-    github_token = os.getenv("GITHUB_TOKEN")
-    embeddings_url = os.getenv("OPENAI_EMBEDDINGS_URL")
+    def resultado(self, index, vectores: Optional[VectoresCompletos] = None) -> float:
+        """
+        Returns:
+            float: Fracción promedio de los k vecinos exactos que el índice recupera
+        """
+        self._exactos.finalize()
+        esperados = self._exactos.I
+        
+        factor = self.config_indice.get('rerank', 0)
+        _, obtenidos = index.search(preparar_vectores(self.consultas, self.config_indice),
+                                    self.k * max(1, factor))
+        if factor:
+            _, obtenidos = vectores.reordenar(self.consultas, obtenidos, self.k)
+        
+        aciertos = sum(len(set(e) & set(o)) for e, o in zip(esperados, obtenidos))
+        return aciertos / (len(self.consultas) * self.k)
+
+
+def medir_recall(index, embeddings: np.ndarray, ids: np.ndarray, config_indice: Dict,
+                 k: int = 3, muestras: int = 200) -> float:
+    """
+    Recall@k del índice con todos los embeddings en memoria (ver MedidorRecall).
     
-    if not github_token:
-        print("❌ ERROR: GITHUB_TOKEN no encontrado en .env")
-        sys.exit(1)
+    Returns:
+        float: Fracción promedio de los k vecinos exactos que el índice recupera
+    """
+    medidor = MedidorRecall(config_indice, len(embeddings), k, muestras)
+    medidor.agregar(embeddings, ids)
     
-    if not embeddings_url:
-        print("❌ ERROR: OPENAI_EMBEDDINGS_URL no encontrado en .env")
-        sys.exit(1)
+    vectores = None
+    if config_indice.get('rerank'):
+        orden = np.argsort(ids, kind="stable")
+        completos = preparar_vectores(embeddings, medidor.completo)
+        vectores = VectoresCompletos(completos[orden], ids[orden])
+    return medidor.resultado(index, vectores)
+
+
+# =============================================================================
+# CHUNKING Y MANIFEST (BUILD INCREMENTAL)
+# =============================================================================
+
+def hash_contenido(texto: str) -> str:
+    """SHA-256 hexadecimal de un texto"""
+    return hashlib.sha256(texto.encode('utf-8')).hexdigest()
+
+
+def ruta_relativa(ruta, datos_folder: Path) -> str:
+    """Ruta del archivo relativa a datos/, en formato POSIX (clave del manifest)"""
+    return Path(ruta).resolve().relative_to(datos_folder).as_posix()
+
+
+def hashes_de_chunks(chunks: List[Fragmento], fuente: str) -> List[str]:
+    """
+    Hash estable por chunk: archivo + contenido.
+    Los chunks repetidos dentro del mismo archivo se distinguen por su nº de aparición.
+    """
+    vistos = {}
+    return [hash_chunk(chunk.page_content, fuente, vistos) for chunk in chunks]
+
+
+def hash_chunk(texto: str, fuente: str, vistos: Dict[str, int]) -> str:
+    """Hash de un chunk; `vistos` cuenta las apariciones previas dentro del archivo"""
+    base = hash_contenido(f"{fuente}\x00{texto}")
+    repeticion = vistos.get(base, 0)
+    vistos[base] = repeticion + 1
+    return base if repeticion == 0 else hash_contenido(f"{base}\x00{repeticion}")
+
+
+def indexar_chunks(archivos: List[Path], datos_folder: Path):
+    """
+    Divide los archivos en chunks y les asigna IDs secuenciales (build completo).
     
-    print(f"   ✅ Variables de entorno cargadas")
-    print(f"   • GITHUB_TOKEN: ...{github_token[-8:]}")
-    print(f"   • EMBEDDINGS_URL: {embeddings_url}")
+    Returns:
+        tuple: (chunks, ids, manifest)
+    """
+    chunks = []
+    ids = []
+    manifest = {'version': MANIFEST_VERSION, 'divisor': DIVISOR_VERSION,
+                'siguiente_id': 0, 'archivos': {}}
     
-    # -------------------------------------------------------------------------
-    # 2. CONFIGURAR RUTAS
-    # -------------------------------------------------------------------------
-    print("\n[2/7] Configurando rutas...")
+    for ruta in archivos:
+        fuente = ruta_relativa(ruta, datos_folder)
+        partes = list(dividir_markdown(ruta))
+        hashes = hashes_de_chunks(partes, fuente)
+        ids_archivo = list(range(manifest['siguiente_id'], manifest['siguiente_id'] + len(partes)))
+        manifest['siguiente_id'] += len(partes)
+        
+        manifest['archivos'][fuente] = {
+            'hash': hash_archivo(ruta),
+            'chunks': hashes,
+            'ids': ids_archivo
+        }
+        chunks.extend(partes)
+        ids.extend(ids_archivo)
     
-    if Path.cwd().name == "codigo":
-        datos_folder = Path("../datos")
-        vectorstore_path = Path("../datos/vectorstore_faiss")
-    else:
-        datos_folder = Path("datos")
-        vectorstore_path = Path("datos/vectorstore_faiss")
+    return chunks, np.array(ids, dtype=np.int64), manifest
+
+
+def cargar_manifest(vectorstore_path: Path) -> Optional[Dict]:
+    """Lee manifest.json del vector store (None si no existe o es de otra versión)"""
+    manifest_file = vectorstore_path / "manifest.json"
+    if not manifest_file.exists():
+        return None
     
-    datos_folder = datos_folder.resolve()
-    vectorstore_path = vectorstore_path.resolve()
+    with open(manifest_file, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
     
-    print(f"   ✅ Carpeta de datos: {datos_folder}")
-    print(f"   ✅ Destino vector store: {vectorstore_path}")
+    if manifest.get('version') != MANIFEST_VERSION:
+        return None
+    return manifest
+
+
+def construir_incremental(datos_folder: Path, vectorstore_path: Path, proveedor: ProveedorEmbeddings):
+    """
+    Arma una versión nueva a partir de la vigente embebiendo solo los chunks
+    nuevos o modificados (la vigente no se toca: se sigue sirviendo).
     
-    if not datos_folder.exists():
-        print(f"\n❌ ERROR: La carpeta de datos no existe: {datos_folder}")
-        sys.exit(1)
+    Los archivos cuyo hash no cambió ni se vuelven a dividir; de los que cambiaron
+    se reutilizan los chunks con hash conocido y sus vectores se quedan en el índice.
+    Los chunks que desaparecen se eliminan del índice por ID.
+    
+    Si el índice re-rankea, los vectores completos de la versión vigente se
+    copian sin los eliminados y con los nuevos.
+    
+    Returns:
+        tuple: (faiss_index, chunks_por_id, manifest, config_indice, num_cambios,
+        vectores_completos o None) o None si no hay un vector store previo compatible (hay que hacer build completo),
+        incluido el caso en que cambió el proveedor o el modelo de embeddings
+    """
+    import faiss
+    
+    raiz = vectorstore_path
+    vectorstore_path = carpeta_actual(raiz)
+    
+    manifest = cargar_manifest(vectorstore_path)
+    if manifest is None or not (vectorstore_path / "index.faiss").exists():
+        print("   ⚠️  No hay manifest previo: se hará un build completo")
+        return None
+    
+    index = faiss.read_index(str(vectorstore_path / "index.faiss"))
+    if not hasattr(index, "id_map"):
+        print("   ⚠️  Vector store en formato antiguo: se hará un build completo")
+        return None
+    
+    # Vector stores sin 'indice' en config.pkl son flat L2 (anteriores a la métrica coseno)
+    config = {}
+    if (vectorstore_path / "config.pkl").exists():
+        with open(vectorstore_path / "config.pkl", 'rb') as f:
+            config = pickle.load(f)
+    config_indice = config.get(
+        'indice', {'tipo': 'flat', 'factory': 'Flat', 'metrica': 'l2', 'parametros_busqueda': {}}
+    )
+    
+    # Vectores de otro modelo no se pueden mezclar con los nuevos
+    guardada = identidad_guardada(config)
+    if (guardada['proveedor'], guardada['modelo']) != (proveedor.tipo, proveedor.modelo):
+        print(f"   ⚠️  El vector store usa {guardada['proveedor']}:{guardada['modelo']}: "
+              f"se hará un build completo")
+        return None
+    
+    vectores = None
+    if config_indice.get('rerank'):
+        vectores = VectoresCompletos.abrir(vectorstore_path)
+        if vectores is None:
+            print("   ⚠️  La versión vigente no tiene vectores completos: se desactiva el re-ranking")
+            config_indice = dict(config_indice, rerank=0)
+    
+    # La versión vigente se está sirviendo: se lee (incluso un chunks.pkl antiguo) sin modificarla
+    chunks = {
+        id_chunk: Fragmento(page_content=texto, metadata=metadata)
+        for id_chunk, texto, metadata in leer_registros(vectorstore_path)
+    }
+    
+    archivos_actuales = {
+        ruta_relativa(ruta, datos_folder): ruta
+        for ruta in listar_markdown(datos_folder)
+    }
+    # Si cambió la forma de dividir, un archivo igual también se vuelve a dividir
+    # (los chunks que queden idénticos conservan su vector)
+    mismo_divisor = manifest.get('divisor') == DIVISOR_VERSION
+    manifest['divisor'] = DIVISOR_VERSION
+    
+    ids_eliminados = []
+    nuevos_ids = []
+    archivos = {}
+    
+    # Archivos borrados
+    for fuente, info in manifest['archivos'].items():
+        if fuente not in archivos_actuales:
+            print(f"      - {fuente} (eliminado, {len(info['ids'])} chunks)")
+            ids_eliminados.extend(info['ids'])
+    
+    # Archivos nuevos o modificados
+    for fuente, ruta in archivos_actuales.items():
+        hash_actual = hash_archivo(ruta)
+        previo = manifest['archivos'].get(fuente)
+        
+        if previo and previo['hash'] == hash_actual and mismo_divisor:
+            archivos[fuente] = previo
+            continue
+        
+        partes = list(dividir_markdown(ruta))
+        hashes = hashes_de_chunks(partes, fuente)
+        ids_previos = dict(zip(previo['chunks'], previo['ids'])) if previo else {}
+        
+        ids_archivo = []
+        for chunk, hash_chunk in zip(partes, hashes):
+            id_chunk = ids_previos.pop(hash_chunk, None)
+            if id_chunk is None:
+                id_chunk = manifest['siguiente_id']
+                manifest['siguiente_id'] += 1
+                nuevos_ids.append(id_chunk)
+            chunks[id_chunk] = chunk
+            ids_archivo.append(id_chunk)
+        
+        ids_eliminados.extend(ids_previos.values())
+        archivos[fuente] = {'hash': hash_actual, 'chunks': hashes, 'ids': ids_archivo}
+        print(f"      ~ {fuente} ({len(partes)} chunks)")
+    
+    manifest['archivos'] = archivos
+    cambios = len(ids_eliminados) + len(nuevos_ids)
+    
+    print(f"   ✅ Chunks nuevos/modificados: {len(nuevos_ids)}")
+    print(f"   ✅ Chunks eliminados: {len(ids_eliminados)}")
+    
+    if ids_eliminados:
+        try:
+            index.remove_ids(np.array(ids_eliminados, dtype=np.int64))
+        except RuntimeError:
+            # HNSW no soporta borrado: se reconstruye con los vectores que quedan
+            print(f"   ♻️  El índice '{config_indice['tipo']}' no permite borrar: reconstruyendo...")
+            index = reconstruir_sin_ids(index, set(ids_eliminados), config_indice, vectores)
+        for id_chunk in ids_eliminados:
+            chunks.pop(id_chunk, None)
+        if vectores is not None:
+            conservar = ~np.isin(vectores.ids, np.array(ids_eliminados, dtype=np.int64))
+            vectores = VectoresCompletos(vectores.matriz[conservar], vectores.ids[conservar])
     
+    if nuevos_ids:
+        textos = [chunks[id_chunk].page_content for id_chunk in nuevos_ids]
+        embeddings_matrix = generar_embeddings(
+            textos, proveedor, checkpoint_dir=raiz / CHECKPOINT_DIRNAME
+        )
+        index.add_with_ids(
+            preparar_vectores(embeddings_matrix, config_indice),
+            np.array(nuevos_ids, dtype=np.int64)
+        )
+        if vectores is not None:
+            vectores = VectoresCompletos(
+                np.vstack([vectores.matriz, embeddings_matrix]),
+                np.concatenate([vectores.ids, np.array(nuevos_ids, dtype=np.int64)])
+            )
+    
+    print(f"   ✅ Índice FAISS actualizado ({index.ntotal} vectores)")
+    
+    return index, chunks, manifest, config_indice, cambios, vectores
+
+
+def reconstruir_sin_ids(index, ids_eliminar: set, config_indice: Dict,
+                        completos: Optional[VectoresCompletos] = None):
+    """
+    Crea un índice nuevo del mismo tipo con todos los vectores salvo ids_eliminar
+    (desde los vectores completos si los hay: reconstruct() de un índice
+    cuantizado devuelve la versión aproximada)
+    """
+    import faiss
+    
+    ids = faiss.vector_to_array(index.id_map)
+    conservar = np.array([i for i in ids if int(i) not in ids_eliminar], dtype=np.int64)
+    if completos is not None:
+        vectores = completos.obtener(conservar)
+    else:
+        vectores = np.vstack([index.reconstruct(int(i)) for i in conservar]).astype(np.float32)
+    return crear_faiss_index(vectores, conservar, config_indice)
+
+
+def construir_completo(datos_folder: Path, vectorstore_path: Path,
+                       proveedor: ProveedorEmbeddings, tipo_indice: str = "flat",
+                       nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+                       precision: str = "f32", dimension_reducida: Optional[int] = None):
+    """
+    Build completo: carga, divide y embebe todos los documentos.
+    
+    Returns:
+        tuple: (faiss_index, chunks_por_id, manifest, config_indice,
+        vectores_completos o None si el índice no re-rankea)
+    """
     # -------------------------------------------------------------------------
     # 3. CARGAR DOCUMENTOS
     # -------------------------------------------------------------------------
-    print("\n[3/7] Cargando documentos .md...")
+    print("\n[3/7] Buscando documentos .md...")
     
     try:
-        loader = DirectoryLoader(
-            str(datos_folder),
-            glob="**/*.md",
-            loader_cls=TextLoader,
-            loader_kwargs={'encoding': 'utf-8'},
-            show_progress=True
-        )
-        
-        documentos = loader.load()
+        # Solo se listan: cada archivo se lee línea a línea al dividirlo
+        archivos = listar_markdown(datos_folder)
         
-        if not documentos:
+        if not archivos:
             print(f"\n❌ ERROR: No se encontraron archivos .md en {datos_folder}")
             sys.exit(1)
         
-        print(f"   ✅ {len(documentos)} documentos cargados")
+        print(f"   ✅ {len(archivos)} documentos encontrados")
         
-        for i, doc in enumerate(documentos, 1):
-            source = doc.metadata.get('source', 'unknown')
-            filename = Path(source).name
-            print(f"      {i}. {filename} ({len(doc.page_content)} caracteres)")
+        for i, ruta in enumerate(archivos, 1):
+            print(f"      {i}. {ruta.name} ({ruta.stat().st_size} bytes)")
     
     except Exception as e:
         print(f"\n❌ ERROR al cargar documentos: {e}")
@@ -208,25 +629,11 @@ def main():
     print("\n[4/7] Dividiendo documentos en chunks...")
     
     try:
-        text_splitter = RecursiveCharacterTextSplitter(
-    chunk_size=2000,  # Un tamaño máximo grande
-    chunk_overlap=200,
-    length_function=len,
-    # Define los separadores en orden de prioridad
-    separators=[
-        "\n\n## ",  # Separar por títulos de Nivel 2 (SACOS, GUANTES, etc.)
-        "\n\n### ", # Separar por títulos de Nivel 3 (Producto individual)
-        "\n\n",     # Párrafos
-        "\n",       # Líneas
-        " "         # Palabras
-    ]
-)
-        
-        chunks = text_splitter.split_documents(documentos)
+        chunks, ids, manifest = indexar_chunks(archivos, datos_folder)
         
         print(f"   ✅ {len(chunks)} chunks creados")
-        print(f"   • Tamaño de chunk: 1000 caracteres")
-        print(f"   • Solapamiento: 200 caracteres")
+        print(f"   • Corte por títulos #, ## y ### (un producto por chunk)")
+        print(f"   • Secciones de más de {MAX_CARACTERES} caracteres se parten por párrafos")
     
     except Exception as e:
         print(f"\n❌ ERROR al dividir documentos: {e}")
@@ -235,16 +642,20 @@ def main():
     # -------------------------------------------------------------------------
     # 5. GENERAR EMBEDDINGS
     # -------------------------------------------------------------------------
-    print("\n[5/7] Generando embeddings con HTTP directo...")
-    print("   ⏳ Esto puede tomar 30-60 segundos...")
-    print("   💡 Usando requests HTTP (evita problemas de proxies)")
+    print(f"\n[5/7] Generando embeddings ({proveedor.tipo}: {proveedor.modelo})...")
+    if proveedor.tipo == "http":
+        print("   ⏳ Esto puede tomar 30-60 segundos...")
+        print("   💡 Usando requests HTTP (evita problemas de proxies)")
+        print("   💡 Si se interrumpe, al re-ejecutar se retoma desde el último lote listo")
     
     try:
         # Extraer textos de los chunks
         textos = [chunk.page_content for chunk in chunks]
         
-        # Generar embeddings usando HTTP directo
-        embeddings_matrix = obtener_embeddings_http(textos, github_token, embeddings_url)
+        # Con HTTP: lotes en paralelo, con checkpoint
+        embeddings_matrix = generar_embeddings(
+            textos, proveedor, checkpoint_dir=vectorstore_path / CHECKPOINT_DIRNAME
+        )
         
         print(f"   ✅ Embeddings generados: {embeddings_matrix.shape}")
     
@@ -252,11 +663,13 @@ def main():
         print(f"\n❌ ERROR al generar embeddings: {e}")
         print("\nDetalles del error:")
         print(f"   {str(e)}")
-        print("\nPosibles causas:")
-        print("  • Token de GitHub inválido o expirado")
-        print("  • Problema de conexión a internet")
-        print("  • URL de embeddings incorrecta")
-        print("\n💡 Verifica tu token en: https://github.com/settings/tokens")
+        if proveedor.tipo == "http":
+            print("\nPosibles causas:")
+            print("  • Token de GitHub inválido o expirado")
+            print("  • Problema de conexión a internet")
+            print("  • URL de embeddings incorrecta")
+            print("\n💡 Verifica tu token en: https://github.com/settings/tokens")
+            print("💡 Sin conexión: --embeddings hashing")
         sys.exit(1)
     
     # -------------------------------------------------------------------------
@@ -265,13 +678,405 @@ def main():
     print("\n[6/7] Creando índice FAISS...")
     
     try:
-        faiss_index = crear_faiss_index(embeddings_matrix)
+        config_indice = configurar_indice(
+            tipo_indice, embeddings_matrix.shape[0], embeddings_matrix.shape[1],
+            nprobe=nprobe, ef_search=ef_search,
+            precision=precision, dimension_reducida=dimension_reducida
+        )
+        faiss_index = crear_faiss_index(embeddings_matrix, ids, config_indice)
         print(f"   ✅ Índice FAISS creado ({faiss_index.ntotal} vectores)")
+        print(f"   • Tipo: {config_indice['tipo']} ({config_indice['factory']}, "
+              f"métrica {config_indice['metrica']})")
+        if config_indice['rerank']:
+            print(f"   • {bytes_por_vector(config_indice, faiss_index.d):.0f} bytes por vector, "
+                  f"re-ranking de k × {config_indice['rerank']} en precisión completa")
+        
+        if config_indice['tipo'] != 'flat' or config_indice['rerank']:
+            recall = medir_recall(faiss_index, embeddings_matrix, ids, config_indice, k=3)
+            config_indice['recall_at_3'] = recall
+            print(f"   • Recall@3 vs flat: {recall:.3f} "
+                  f"(parámetros: {config_indice['parametros_busqueda']})")
     
     except Exception as e:
         print(f"\n❌ ERROR al crear índice FAISS: {e}")
         sys.exit(1)
     
+    vectores = VectoresCompletos(embeddings_matrix, ids) if config_indice['rerank'] else None
+    return faiss_index, dict(zip(ids.tolist(), chunks)), manifest, config_indice, vectores
+
+
+# =============================================================================
+# BUILD STREAMING (MEMORIA ACOTADA POR LOTE)
+# =============================================================================
+
+TAMANO_LOTE_STREAMING = 256
+
+# Lotes en espera entre etapas: dividir → embeber → indexar
+LOTES_EN_COLA = 2
+
+# Vectores retenidos para entrenar ivf / ivfpq / sq8 antes de empezar a agregar
+MIN_MUESTRAS_ENTRENAMIENTO = 10000
+
+_FIN = object()
+
+
+def _poner(cola: queue.Queue, item, detener: threading.Event) -> bool:
+    """put() que se rinde si otra etapa falló (no queda bloqueado con la cola llena)"""
+    while not detener.is_set():
+        try:
+            cola.put(item, timeout=0.2)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _sacar(cola: queue.Queue, detener: threading.Event):
+    """get() que devuelve _FIN si otra etapa falló"""
+    while not detener.is_set():
+        try:
+            return cola.get(timeout=0.2)
+        except queue.Empty:
+            continue
+    return _FIN
+
+
+def contar_chunks(archivos: List[Path]) -> int:
+    """Cuenta los chunks sin guardarlos (el tipo de índice depende del total)"""
+    return sum(1 for ruta in archivos for _ in dividir_markdown(ruta))
+
+
+def lotes_de_chunks(archivos: List[Path], datos_folder: Path, manifest: Dict, tamano_lote: int):
+    """
+    Divide archivo por archivo y agrupa los chunks en lotes con IDs secuenciales.
+    Va llenando el manifest a medida que avanza.
+
+    Yields:
+        tuple: (ids, fragmentos) de a lo más tamano_lote chunks
+    """
+    ids, partes = [], []
+    for ruta in archivos:
+        fuente = ruta_relativa(ruta, datos_folder)
+        info = {'hash': hash_archivo(ruta), 'chunks': [], 'ids': []}
+        manifest['archivos'][fuente] = info
+        vistos = {}
+
+        for fragmento in dividir_markdown(ruta):
+            id_chunk = manifest['siguiente_id']
+            manifest['siguiente_id'] += 1
+            info['chunks'].append(hash_chunk(fragmento.page_content, fuente, vistos))
+            info['ids'].append(id_chunk)
+            ids.append(id_chunk)
+            partes.append(fragmento)
+
+            if len(partes) >= tamano_lote:
+                yield ids, partes
+                ids, partes = [], []
+
+    if partes:
+        yield ids, partes
+
+
+def construir_streaming(datos_folder: Path, destino: Path, proveedor: ProveedorEmbeddings,
+                        tipo_indice: str = "flat", nprobe: Optional[int] = None,
+                        ef_search: Optional[int] = None,
+                        tamano_lote: int = TAMANO_LOTE_STREAMING,
+                        checkpoint_dir: Optional[Path] = None,
+                        precision: str = "f32", dimension_reducida: Optional[int] = None):
+    """
+    Build completo en pipeline con colas acotadas:
+
+        dividir (hilo) → embeber (hilo) → indexar + escribir chunks (este hilo)
+
+    Cada etapa trabaja sobre un lote mientras la siguiente procesa el anterior.
+    En memoria hay a lo más LOTES_EN_COLA lotes por cola: ni los documentos,
+    ni la lista de chunks, ni la matriz de embeddings completa. Los chunks se
+    escriben directo en el almacén de `destino` y el BM25 se arma chunk a chunk.
+    Lo único que crece con el corpus es el índice FAISS (lo mismo que se sirve),
+    el BM25 y el manifest; ivf/ivfpq/sq8 retienen además una muestra para entrenar.
+    Si el índice re-rankea, los vectores completos también se escriben lote a
+    lote en `destino` (memmap). Si el índice no es flat exacto, el recall@3
+    contra flat se mide lote a lote (MedidorRecall) antes de publicar.
+
+    Returns:
+        tuple: (faiss_index, bm25, manifest, config_indice)
+    """
+    archivos = listar_markdown(datos_folder)
+    if not archivos:
+        raise Exception(f"No se encontraron archivos .md en {datos_folder}")
+
+    # Primera pasada solo para contar (no guarda nada): el tipo de índice
+    # y el tamaño de la muestra de entrenamiento dependen del total
+    total = contar_chunks(archivos)
+    print(f"   • {len(archivos)} documentos, {total} chunks, lotes de {tamano_lote}")
+
+    manifest = {'version': MANIFEST_VERSION, 'divisor': DIVISOR_VERSION,
+                'siguiente_id': 0, 'archivos': {}}
+
+    cola_chunks = queue.Queue(maxsize=LOTES_EN_COLA)
+    cola_vectores = queue.Queue(maxsize=LOTES_EN_COLA)
+    detener = threading.Event()
+    errores = []
+
+    def dividir():
+        try:
+            for lote in lotes_de_chunks(archivos, datos_folder, manifest, tamano_lote):
+                if not _poner(cola_chunks, lote, detener):
+                    return
+        except Exception as e:
+            errores.append(e)
+            detener.set()
+        finally:
+            _poner(cola_chunks, _FIN, detener)
+
+    def embeber():
+        try:
+            while True:
+                lote = _sacar(cola_chunks, detener)
+                if lote is _FIN:
+                    break
+                ids, partes = lote
+                vectores = generar_embeddings(
+                    [parte.page_content for parte in partes], proveedor,
+                    checkpoint_dir=checkpoint_dir, verboso=False
+                )
+                if not _poner(cola_vectores, (ids, partes, vectores), detener):
+                    return
+        except Exception as e:
+            errores.append(e)
+            detener.set()
+        finally:
+            _poner(cola_vectores, _FIN, detener)
+
+    etapas = [
+        threading.Thread(target=dividir, name="build-dividir", daemon=True),
+        threading.Thread(target=embeber, name="build-embeber", daemon=True)
+    ]
+    for etapa in etapas:
+        etapa.start()
+
+    index = None
+    config_indice = None
+    completos = None
+    medidor = None
+    bm25 = IndiceBM25()
+    muestra_ids, muestra_vectores = [], []
+    procesados = 0
+
+    try:
+        with EscritorAlmacenChunks(destino) as escritor:
+            while True:
+                item = _sacar(cola_vectores, detener)
+                if item is _FIN:
+                    break
+                ids, partes, vectores = item
+
+                for id_chunk, parte in zip(ids, partes):
+                    escritor.agregar(id_chunk, parte.page_content, parte.metadata)
+                    bm25.agregar(id_chunk, parte.page_content)
+
+                if index is None:
+                    config_indice = configurar_indice(
+                        tipo_indice, total, vectores.shape[1], nprobe=nprobe, ef_search=ef_search,
+                        precision=precision, dimension_reducida=dimension_reducida
+                    )
+                    index = nuevo_indice_faiss(dimension_reducida or vectores.shape[1], config_indice)
+                    if config_indice['rerank']:
+                        completos = EscritorVectores(destino, total, vectores.shape[1])
+                    if config_indice['tipo'] != 'flat' or config_indice['rerank']:
+                        medidor = MedidorRecall(config_indice, total, k=3)
+                    nlist = min(int(4 * np.sqrt(total)), total // 39)
+                    muestras = min(total, max(MIN_MUESTRAS_ENTRENAMIENTO, 40 * nlist))
+
+                ids = np.array(ids, dtype=np.int64)
+                if completos is not None:
+                    completos.agregar(ids, vectores)
+                if medidor is not None:
+                    medidor.agregar(vectores, ids)
+                vectores = preparar_vectores(vectores, config_indice)
+
+                if index.is_trained:
+                    index.add_with_ids(vectores, ids)
+                else:
+                    # Se retiene la muestra hasta tener suficientes vectores para entrenar
+                    muestra_ids.append(ids)
+                    muestra_vectores.append(vectores)
+                    if sum(len(v) for v in muestra_vectores) >= muestras:
+                        _entrenar_con_muestra(index, muestra_ids, muestra_vectores)
+
+                procesados += len(ids)
+                print(f"   Lote listo: {procesados}/{total} chunks indexados")
+
+            if errores:
+                raise errores[0]
+            if index is None:
+                raise Exception("No se generó ningún chunk")
+            if not index.is_trained:
+                _entrenar_con_muestra(index, muestra_ids, muestra_vectores)
+            if completos is not None:
+                completos.cerrar()
+
+    except BaseException:
+        detener.set()
+        if completos is not None:
+            completos.descartar()
+        raise
+    finally:
+        for etapa in etapas:
+            etapa.join(timeout=5)
+
+    aplicar_parametros_busqueda(index, config_indice)
+    if medidor is not None:
+        recall = medidor.resultado(index, VectoresCompletos.abrir(destino) if completos else None)
+        config_indice['recall_at_3'] = recall
+        print(f"   • Recall@3 vs flat: {recall:.3f} "
+              f"(parámetros: {config_indice['parametros_busqueda']})")
+    return index, bm25, manifest, config_indice
+
+
+def _entrenar_con_muestra(index, muestra_ids: List[np.ndarray], muestra_vectores: List[np.ndarray]):
+    """Entrena el índice con los vectores retenidos, los agrega y vacía la muestra"""
+    vectores = np.vstack(muestra_vectores)
+    ids = np.concatenate(muestra_ids)
+    print(f"   🎯 Entrenando índice con {len(vectores)} vectores...")
+    index.train(vectores)
+    index.add_with_ids(vectores, ids)
+    muestra_ids.clear()
+    muestra_vectores.clear()
+
+
+def main(incremental: bool = False, tipo_indice: str = "flat",
+         nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+         streaming: bool = False, tamano_lote: int = TAMANO_LOTE_STREAMING,
+         embeddings: Optional[str] = None, precision: str = "f32",
+         dimension_reducida: Optional[int] = None):
+    """
+    Función principal para crear el vector store
+    
+    Args:
+        incremental: Reutiliza los vectores de los chunks que no cambiaron
+        tipo_indice: flat, ivf, hnsw, ivfpq o sq8 (solo en build completo)
+        nprobe: Listas IVF a revisar por consulta (por defecto nlist/8)
+        ef_search: Tamaño de la lista de candidatos HNSW (por defecto 64)
+        streaming: Build completo en pipeline (memoria acotada por tamano_lote)
+        tamano_lote: Chunks por lote en modo streaming
+        embeddings: Proveedor "http[:modelo]", "local[:modelo]" o "hashing[:dimension]"
+            (por defecto EVERLAST_EMBEDDINGS, o http)
+        precision: f32, f16 o int8 para los vectores del índice (solo en build completo)
+        dimension_reducida: Dimensiones Matryoshka que usa el índice (None = todas)
+    """
+    
+    print("=" * 80)
+    print("CREACIÓN DE VECTOR STORE FAISS - EVERLAST CHILE")
+    print("=" * 80)
+    
+    # -------------------------------------------------------------------------
+    # 1. CONFIGURACIÓN INICIAL
+    # -------------------------------------------------------------------------
+    print("\n[1/7] Cargando configuración...")
+    
+    load_dotenv()
+    
+    try:
+        proveedor = crear_proveedor(embeddings)
+    except (ValueError, ImportError) as e:
+        print(f"❌ ERROR: {e}")
+        sys.exit(1)
+    
+    print(f"   ✅ Variables de entorno cargadas")
+    print(f"   • Embeddings: {proveedor.tipo} ({proveedor.modelo})")
+    
+    # Solo el proveedor HTTP necesita credenciales
+    if proveedor.tipo == "http":
+        github_token = os.getenv("GITHUB_TOKEN")
+        embeddings_url = os.getenv("OPENAI_EMBEDDINGS_URL")
+        
+        if not github_token:
+            print("❌ ERROR: GITHUB_TOKEN no encontrado en .env")
+            sys.exit(1)
+        
+        if not embeddings_url:
+            print("❌ ERROR: OPENAI_EMBEDDINGS_URL no encontrado en .env")
+            sys.exit(1)
+        
+        print(f"   • GITHUB_TOKEN: ...{github_token[-8:]}")
+        print(f"   • EMBEDDINGS_URL: {embeddings_url}")
+    
+    # -------------------------------------------------------------------------
+    # 2. CONFIGURAR RUTAS
+    # -------------------------------------------------------------------------
+    print("\n[2/7] Configurando rutas...")
+    
+    if Path.cwd().name == "codigo":
+        datos_folder = Path("../datos")
+        vectorstore_path = Path("../datos/vectorstore_faiss")
+    else:
+        datos_folder = Path("datos")
+        vectorstore_path = Path("datos/vectorstore_faiss")
+    
+    datos_folder = datos_folder.resolve()
+    vectorstore_path = vectorstore_path.resolve()
+    
+    print(f"   ✅ Carpeta de datos: {datos_folder}")
+    print(f"   ✅ Destino vector store: {vectorstore_path}")
+    
+    if not datos_folder.exists():
+        print(f"\n❌ ERROR: La carpeta de datos no existe: {datos_folder}")
+        sys.exit(1)
+    
+    # -------------------------------------------------------------------------
+    # 3-6. CARGAR, DIVIDIR, EMBEBER E INDEXAR
+    # -------------------------------------------------------------------------
+    # Todo se escribe en una carpeta de versión nueva; los procesos que están
+    # sirviendo la vigente no ven nada hasta que se publica al final
+    raiz = vectorstore_path
+    staging = None
+    bm25 = None
+    vectores = None
+    
+    resultado = None
+    if incremental:
+        print("\n[3-6/7] Build incremental (solo chunks nuevos o modificados)...")
+        try:
+            resultado = construir_incremental(
+                datos_folder, vectorstore_path, proveedor
+            )
+        except Exception as e:
+            print(f"\n❌ ERROR en build incremental: {e}")
+            sys.exit(1)
+    
+    if resultado is not None:
+        faiss_index, chunks, manifest, config_indice, cambios, vectores = resultado
+        if cambios == 0:
+            print("\n✅ Sin cambios: el vector store ya está al día")
+            return
+    elif streaming:
+        print(f"\n[3-6/7] Build streaming (dividir → embeber → indexar, lotes de {tamano_lote})...")
+        try:
+            # Los chunks se escriben directo en la carpeta de la versión nueva
+            raiz.mkdir(parents=True, exist_ok=True)
+            version, staging = preparar_version(raiz)
+            faiss_index, bm25, manifest, config_indice = construir_streaming(
+                datos_folder, staging, proveedor,
+                tipo_indice=tipo_indice, nprobe=nprobe, ef_search=ef_search,
+                tamano_lote=tamano_lote, checkpoint_dir=raiz / CHECKPOINT_DIRNAME,
+                precision=precision, dimension_reducida=dimension_reducida
+            )
+            chunks = None
+            print(f"   ✅ Índice FAISS creado ({faiss_index.ntotal} vectores, "
+                  f"tipo {config_indice['tipo']})")
+        except Exception as e:
+            print(f"\n❌ ERROR en build streaming: {e}")
+            if staging is not None:
+                descartar_staging(staging)
+            sys.exit(1)
+    else:
+        faiss_index, chunks, manifest, config_indice, vectores = construir_completo(
+            datos_folder, vectorstore_path, proveedor,
+            tipo_indice=tipo_indice, nprobe=nprobe, ef_search=ef_search,
+            precision=precision, dimension_reducida=dimension_reducida
+        )
+    
     # -------------------------------------------------------------------------
     # 7. GUARDAR EN DISCO
     # -------------------------------------------------------------------------
@@ -279,7 +1084,10 @@ def main():
     
     try:
         # Crear carpeta si no existe
-        vectorstore_path.mkdir(parents=True, exist_ok=True)
+        raiz.mkdir(parents=True, exist_ok=True)
+        if staging is None:
+            version, staging = preparar_version(raiz)
+        vectorstore_path = staging
         
         # Verificar que la carpeta existe y tiene permisos
         if not vectorstore_path.exists():
@@ -307,20 +1115,53 @@ def main():
         
         print(f"   ✅ Índice FAISS guardado")
         
-        # Guardar chunks (metadatos)
-        with open(vectorstore_path / "chunks.pkl", 'wb') as f:
-            pickle.dump(chunks, f)
+        # Guardar chunks en el almacén columnar (memory-mapped al cargar);
+        # en modo streaming ya quedaron escritos durante el pipeline
+        if chunks is not None:
+            escribir_almacen(
+                vectorstore_path,
+                ((id_chunk, doc.page_content, doc.metadata) for id_chunk, doc in chunks.items())
+            )
+            bm25 = IndiceBM25.construir(
+                (id_chunk, doc.page_content) for id_chunk, doc in chunks.items()
+            )
+        (vectorstore_path / "chunks.pkl").unlink(missing_ok=True)
+        
+        # Vectores completos para re-rankear (en streaming ya están escritos)
+        if vectores is not None:
+            escribir_vectores(vectorstore_path, vectores.ids, vectores.matriz)
+            print(f"   ✅ Vectores completos para re-ranking ({len(vectores.ids)})")
+        
+        # Índice léxico BM25 (SKUs, medidas) junto al índice FAISS
+        bm25.guardar(vectorstore_path)
+        
+        # Catálogo estructurado (SKU, precios por variante, colores) desde productos.md
+        productos_md = Path(datos_folder) / "productos.md"
+        if productos_md.exists():
+            catalogo = CatalogoProductos.desde_markdown(productos_md)
+            catalogo.guardar(vectorstore_path)
+            print(f"   ✅ Catálogo de productos: {len(catalogo)} productos")
         
         # Guardar configuración
+        # La identidad del proveedor se valida al cargar (tools_everlast.py);
+        # con dimensión reducida el índice es más angosto que los embeddings
+        dimension = config_indice.get('dimension_embeddings', faiss_index.d)
         config = {
-            'model': 'text-embedding-3-small',
-            'dimension': embeddings_matrix.shape[1],
-            'num_chunks': len(chunks)
+            'model': proveedor.modelo,
+            'embeddings': proveedor.identidad(dimension),
+            'dimension': dimension,
+            'num_chunks': faiss_index.ntotal,
+            'formato_chunks': FORMATO_VERSION,
+            'indice': config_indice
         }
         with open(vectorstore_path / "config.pkl", 'wb') as f:
             pickle.dump(config, f)
         
-        print(f"   ✅ Vector store guardado en: {vectorstore_path}")
+        # Guardar manifest (hashes de archivos y chunks → IDs del índice)
+        manifest['modelo'] = config['model']
+        manifest['dimension'] = config['dimension']
+        with open(vectorstore_path / "manifest.json", 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=1)
         
         # Verificar archivos creados
         files = list(vectorstore_path.glob("*"))
@@ -328,9 +1169,27 @@ def main():
         for file in files:
             size_kb = file.stat().st_size / 1024
             print(f"      - {file.name} ({size_kb:.1f} KB)")
+        
+        # Publicar: rename atómico de la carpeta + reemplazo atómico de ACTUAL.
+        # Los agentes en ejecución detectan la versión nueva y la cargan solos.
+        vectorstore_path = publicar_version(raiz, version, staging)
+        staging = None
+        print(f"   ✅ Vector store guardado en: {vectorstore_path}")
+        print(f"   ✅ Versión vigente: {version}")
+        
+        # El build quedó completo: los checkpoints de lotes ya no hacen falta
+        import shutil
+        shutil.rmtree(raiz / CHECKPOINT_DIRNAME, ignore_errors=True)
+        
+        # Versiones viejas (se conservan las más recientes para volver atrás)
+        borradas = podar_versiones(raiz, conservar=int(os.getenv("EVERLAST_VERSIONES_CONSERVAR", 3)))
+        if borradas:
+            print(f"   🧹 Versiones antiguas borradas: {', '.join(borradas)}")
     
     except Exception as e:
         print(f"\n❌ ERROR al guardar: {e}")
+        if staging is not None:
+            descartar_staging(staging)
         sys.exit(1)
     
     # -------------------------------------------------------------------------
@@ -349,8 +1208,53 @@ def main():
 
 
 if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Crea el vector store FAISS de Everlast")
+    parser.add_argument(
+        "--incremental", action="store_true",
+        help="Solo embebe los chunks nuevos o modificados (usa manifest.json)"
+    )
+    parser.add_argument(
+        "--indice", choices=TIPOS_INDICE, default="flat",
+        help="Tipo de índice FAISS (build completo). Por defecto: flat"
+    )
+    parser.add_argument("--nprobe", type=int, help="Listas a revisar por consulta (ivf, ivfpq)")
+    parser.add_argument("--ef-search", type=int, help="Candidatos por consulta (hnsw)")
+    parser.add_argument(
+        "--streaming", action="store_true",
+        help="Build completo en pipeline con memoria acotada (para corpus grandes)"
+    )
+    parser.add_argument(
+        "--embeddings", metavar="PROVEEDOR",
+        help="http[:modelo], local[:modelo] o hashing[:dimension]. Por defecto: EVERLAST_EMBEDDINGS o http"
+    )
+    parser.add_argument(
+        "--precision", choices=list(PRECISIONES), default="f32",
+        help="Bytes por componente en el índice: f32 (4), f16 (2) o int8 (1). Por defecto: f32"
+    )
+    parser.add_argument(
+        "--dimension-reducida", type=int, metavar="N",
+        help="El índice usa solo las primeras N dimensiones (Matryoshka, p. ej. 512 o 256)"
+    )
+    parser.add_argument(
+        "--lote", type=int, default=TAMANO_LOTE_STREAMING,
+        help=f"Chunks por lote en modo streaming. Por defecto: {TAMANO_LOTE_STREAMING}"
+    )
+    args = parser.parse_args()
+    
     try:
-        main()
+        main(
+            incremental=args.incremental,
+            tipo_indice=args.indice,
+            nprobe=args.nprobe,
+            ef_search=args.ef_search,
+            streaming=args.streaming,
+            tamano_lote=args.lote,
+            embeddings=args.embeddings,
+            precision=args.precision,
+            dimension_reducida=args.dimension_reducida
+        )
     except KeyboardInterrupt:
         print("\n\n⚠️  Proceso interrumpido por el usuario")
         sys.exit(1)
@@ -0,0 +1,286 @@
+"""
+cuantizacion_vectores.py
+========================
+Vectores del índice en menos memoria, con re-ranking en precisión completa.
+
+Opciones de build (`create_vectorstore.py --precision f16 --dimension-reducida 512`):
+
+    --precision f32|f16|int8   Cómo guarda FAISS cada componente (4, 2 o 1 byte)
+    --dimension-reducida N     Matryoshka: el índice usa solo las primeras N
+                               dimensiones (renormalizadas). text-embedding-3
+                               está entrenado para que ese prefijo conserve la
+                               mayor parte de la información
+
+Cuando el índice pierde precisión (f16, int8, dimensión reducida, sq8 o ivfpq),
+el build guarda además los vectores completos en vectores_f32.npy. Al buscar,
+el índice comprimido devuelve k × factor candidatos y se reordenan con el
+producto interno exacto contra esos vectores. El .npy se abre memory-mapped:
+solo se leen del disco las filas de los candidatos, y el page cache lo
+comparten todos los workers.
+
+Medir recall vs memoria (vectores sintéticos, o los del vector store actual):
+    python codigo/cuantizacion_vectores.py
+    python codigo/cuantizacion_vectores.py --vector-store
+
+Autor: Evaluación 2 - Everlast Chile
+"""
+
+import os
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+
+PRECISIONES = {
+    # precisión: (codificación en index_factory, bytes por componente)
+    'f32': ("Flat", 4),
+    'f16': ("SQfp16", 2),
+    'int8': ("SQ8", 1)
+}
+
+# Candidatos por resultado que se re-rankean (k × factor)
+FACTOR_RERANK = 4
+
+ARCHIVO_VECTORES = "vectores_f32.npy"
+ARCHIVO_VECTORES_IDS = "vectores_ids.npy"
+
+
+def normalizar(matriz: np.ndarray) -> np.ndarray:
+    """Copia float32 con filas de norma 1"""
+    matriz = np.array(matriz, dtype=np.float32, copy=True)
+    matriz /= np.maximum(np.linalg.norm(matriz, axis=1, keepdims=True), 1e-12)
+    return matriz
+
+
+def reducir_dimension(matriz: np.ndarray, dimension_reducida: Optional[int]) -> np.ndarray:
+    """Matryoshka: primeras `dimension_reducida` columnas, renormalizadas (sin cambio si es None)"""
+    if not dimension_reducida or dimension_reducida >= matriz.shape[1]:
+        return matriz
+    return normalizar(matriz[:, :dimension_reducida])
+
+
+def indice_con_perdida(config_indice: Dict) -> bool:
+    """True si el índice no guarda los vectores exactos (conviene re-rankear)"""
+    return (config_indice.get('precision', 'f32') != 'f32'
+            or bool(config_indice.get('dimension_reducida'))
+            or config_indice.get('tipo') in ('sq8', 'ivfpq'))
+
+
+def bytes_por_vector(config_indice: Dict, dimension: int) -> float:
+    """Bytes que ocupa un vector dentro del índice (sin IDs ni estructuras de búsqueda)"""
+    dimension = config_indice.get('dimension_reducida') or dimension
+    tipo = config_indice.get('tipo', 'flat')
+    if tipo == 'ivfpq':
+        m, nbits = config_indice['factory'].split("PQ")[1].split("x")
+        return int(m) * int(nbits) / 8
+    if tipo == 'sq8':
+        return dimension
+    return dimension * PRECISIONES[config_indice.get('precision', 'f32')][1]
+
+
+# =============================================================================
+# VECTORES COMPLETOS (RE-RANKING)
+# =============================================================================
+
+class EscritorVectores:
+    """
+    Escribe vectores_f32.npy fila a fila (sirve para el build streaming: no
+    necesita la matriz completa en memoria). Los IDs deben llegar en orden
+    creciente; los archivos se publican con os.replace() al cerrar.
+    """
+
+    def __init__(self, carpeta: Path, total: int, dimension: int):
+        self.carpeta = Path(carpeta)
+        self.total = total
+        self._sufijo = f".tmp{os.getpid()}.npy"
+        self._matriz = np.lib.format.open_memmap(
+            self._tmp(ARCHIVO_VECTORES), mode='w+', dtype=np.float32, shape=(total, dimension)
+        )
+        self._ids = np.lib.format.open_memmap(
+            self._tmp(ARCHIVO_VECTORES_IDS), mode='w+', dtype=np.int64, shape=(total,)
+        )
+        self._n = 0
+
+    def _tmp(self, nombre: str) -> Path:
+        return self.carpeta / (nombre + self._sufijo)
+
+    def agregar(self, ids: np.ndarray, matriz: np.ndarray):
+        """Agrega filas (se normalizan); ids en orden creciente"""
+        fin = self._n + len(ids)
+        if fin > self.total:
+            raise ValueError(f"Más vectores que los {self.total} declarados")
+        if len(ids) and self._n and ids[0] <= self._ids[self._n - 1]:
+            raise ValueError("IDs fuera de orden")
+        self._matriz[self._n:fin] = normalizar(matriz)
+        self._ids[self._n:fin] = ids
+        self._n = fin
+
+    def cerrar(self):
+        if self._n != self.total:
+            raise ValueError(f"Se escribieron {self._n} de {self.total} vectores")
+        self._matriz.flush()
+        self._ids.flush()
+        del self._matriz, self._ids
+        for nombre in (ARCHIVO_VECTORES_IDS, ARCHIVO_VECTORES):
+            os.replace(self._tmp(nombre), self.carpeta / nombre)
+
+    def descartar(self):
+        for nombre in (ARCHIVO_VECTORES, ARCHIVO_VECTORES_IDS):
+            self._tmp(nombre).unlink(missing_ok=True)
+
+
+def escribir_vectores(carpeta: Path, ids: np.ndarray, matriz: np.ndarray):
+    """Escribe los vectores completos ordenados por ID"""
+    orden = np.argsort(ids, kind="stable")
+    escritor = EscritorVectores(carpeta, len(ids), matriz.shape[1])
+    try:
+        for inicio in range(0, len(orden), 4096):
+            filas = orden[inicio:inicio + 4096]
+            escritor.agregar(np.asarray(ids)[filas], matriz[filas])
+        escritor.cerrar()
+    except Exception:
+        escritor.descartar()
+        raise
+
+
+class VectoresCompletos:
+    """
+    Vectores float32 normalizados, ordenados por ID, para re-rankear los
+    candidatos de un índice comprimido.
+
+    Args:
+        matriz: (n, dimension), normalmente un memmap de vectores_f32.npy
+        ids: IDs de cada fila, ordenados
+    """
+
+    def __init__(self, matriz: np.ndarray, ids: np.ndarray):
+        self.matriz = matriz
+        self.ids = ids
+
+    @classmethod
+    def abrir(cls, carpeta: Path) -> Optional["VectoresCompletos"]:
+        """Memory-mapped y de solo lectura (None si la versión no los tiene)"""
+        carpeta = Path(carpeta)
+        if not (carpeta / ARCHIVO_VECTORES).exists():
+            return None
+        return cls(np.load(carpeta / ARCHIVO_VECTORES, mmap_mode='r'),
+                   np.load(carpeta / ARCHIVO_VECTORES_IDS, mmap_mode='r'))
+
+    @property
+    def dimension(self) -> int:
+        return self.matriz.shape[1]
+
+    def filas(self, ids: np.ndarray) -> np.ndarray:
+        """Fila de cada ID (-1 si no está)"""
+        ids = np.asarray(ids, dtype=np.int64)
+        if len(self.ids) == 0:
+            return np.full(ids.shape, -1, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(self.ids, ids), len(self.ids) - 1)
+        return np.where(self.ids[pos] == ids, pos, -1)
+
+    def obtener(self, ids: np.ndarray) -> np.ndarray:
+        """Vectores de los IDs pedidos (todos deben existir)"""
+        filas = self.filas(ids)
+        if (filas < 0).any():
+            raise KeyError("IDs sin vector completo")
+        return np.asarray(self.matriz[filas])
+
+    def reordenar(self, consultas: np.ndarray, candidatos: np.ndarray,
+                  k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Re-rankea los candidatos del índice con el producto interno exacto.
+
+        Args:
+            consultas: (nq, dimension) normalizadas, en dimensión completa
+            candidatos: (nq, k × factor) IDs devueltos por FAISS (-1 = vacío)
+
+        Returns:
+            (similitudes, ids), ambos (nq, k); -1 / -inf donde no hay resultado
+        """
+        filas = self.filas(candidatos)
+        validas = (candidatos >= 0) & (filas >= 0)
+        similitudes = np.full(candidatos.shape, -np.inf, dtype=np.float32)
+
+        if validas.any():
+            # Solo se leen del disco las filas de los candidatos
+            seguras = np.where(validas, filas, filas[validas][0])
+            vectores = np.asarray(self.matriz[seguras.ravel()]).reshape(*candidatos.shape, -1)
+            exactas = np.einsum("qcd,qd->qc", vectores, consultas[:, :self.dimension])
+            similitudes[validas] = exactas[validas]
+
+        orden = np.argsort(-similitudes, axis=1, kind="stable")[:, :k]
+        similitudes = np.take_along_axis(similitudes, orden, axis=1)
+        ids = np.where(np.isfinite(similitudes), np.take_along_axis(candidatos, orden, axis=1), -1)
+        return similitudes, ids
+
+
+# =============================================================================
+# MEDICIÓN RECALL VS MEMORIA
+# =============================================================================
+
+# (tipo, precisión, dimensión reducida)
+COMBINACIONES = [
+    ("flat", "f32", None), ("flat", "f16", None), ("flat", "int8", None),
+    ("flat", "f32", 512), ("flat", "f32", 256), ("flat", "int8", 512), ("flat", "int8", 256),
+    ("ivfpq", "f32", None)
+]
+
+
+def vectores_sinteticos(n: int, dimension: int, clusters: int = 50, semilla: int = 0) -> np.ndarray:
+    """
+    Clusters gaussianos cuya varianza decae con el índice de la dimensión, de
+    modo que el prefijo concentra la información como en un embedding
+    Matryoshka (con ruido isotrópico el truncado sería mucho peor que en la realidad).
+    """
+    rng = np.random.default_rng(semilla)
+    escala = (np.arange(dimension) + 1.0) ** -0.5
+    centros = rng.normal(0, 1, (clusters, dimension)) * escala
+    asignacion = rng.integers(0, clusters, n)
+    return (centros[asignacion] + rng.normal(0, 0.6, (n, dimension)) * escala).astype(np.float32)
+
+
+def comparar(embeddings: np.ndarray, k: int = 3, muestras: int = 300):
+    """Imprime memoria del índice y recall@k (sin y con re-ranking) por combinación"""
+    from create_vectorstore import configurar_indice, crear_faiss_index, medir_recall
+
+    n, dimension = embeddings.shape
+    print(f"{'Configuración':<26}{'B/vector':>10}{'Índice MB':>11}{'Recall@3':>10}{'+rerank':>9}")
+    for tipo, precision, reducida in COMBINACIONES:
+        if reducida and reducida >= dimension:
+            continue
+        config = configurar_indice(tipo, n, dimension, precision=precision,
+                                   dimension_reducida=reducida)
+        index = crear_faiss_index(embeddings, np.arange(n, dtype=np.int64), config)
+        ids = np.arange(n, dtype=np.int64)
+        sin = medir_recall(index, embeddings, ids, dict(config, rerank=0), k=k, muestras=muestras)
+        con = medir_recall(index, embeddings, ids, config, k=k, muestras=muestras)
+        nombre = f"{config['tipo']} {config.get('precision', 'f32')}" + (f" d={reducida}" if reducida else "")
+        por_vector = bytes_por_vector(config, dimension)
+        print(f"{nombre:<26}{por_vector:>10.0f}{por_vector * n / 2**20:>11.1f}"
+              f"{sin:>10.3f}{(con if config.get('rerank') else sin):>9.3f}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Recall vs memoria de las opciones de almacenamiento")
+    parser.add_argument("--vector-store", action="store_true",
+                        help="Usa los vectores completos del vector store actual")
+    parser.add_argument("-n", type=int, default=20000)
+    parser.add_argument("-d", type=int, default=1536)
+    args = parser.parse_args()
+
+    if args.vector_store:
+        from tools_everlast import _raiz_vector_store
+        from versiones_vectorstore import carpeta_actual
+
+        completos = VectoresCompletos.abrir(carpeta_actual(_raiz_vector_store()))
+        if completos is None:
+            raise SystemExit("La versión vigente no tiene vectores_f32.npy (constrúyela con --precision)")
+        datos = np.asarray(completos.matriz)
+    else:
+        datos = vectores_sinteticos(args.n, args.d)
+
+    print(f"{len(datos)} vectores de {datos.shape[1]} dimensiones\n")
+    comparar(datos)
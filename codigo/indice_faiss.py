@@ -0,0 +1,81 @@
+"""
+indice_faiss.py
+===============
+Parámetros del índice FAISS compartidos por el build (create_vectorstore.py)
+y la carga (tools_everlast.py), para que ambos los apliquen igual, y lectura
+memory-mapped de index.faiss.
+
+Autor: Evaluación 2 - Everlast Chile
+"""
+
+import os
+from typing import Dict, Optional
+
+
+def aplicar_parametros_busqueda(index, config_indice: Dict):
+    """Aplica nprobe / efSearch guardados en la configuración del índice (config.pkl)"""
+    import faiss
+
+    espacio = faiss.ParameterSpace()
+    for nombre, valor in config_indice.get('parametros_busqueda', {}).items():
+        espacio.set_index_parameter(index, nombre, valor)
+
+
+def indice_mapeado(index) -> bool:
+    """
+    True si los vectores del índice quedaron memory-mapped (no copiados a RAM):
+    listas invertidas en disco (ivf, ivfpq) o códigos sin copia propia (flat,
+    sq8, storage de hnsw).
+    """
+    import faiss
+
+    base = faiss.downcast_index(index.index if hasattr(index, "id_map") else index)
+    if hasattr(base, "invlists"):
+        return isinstance(faiss.downcast_InvertedLists(base.invlists), faiss.OnDiskInvertedLists)
+    if hasattr(base, "storage"):
+        base = faiss.downcast_index(base.storage)
+    # FAISS < 1.11 guarda los códigos en un std::vector (siempre en RAM)
+    codigos = getattr(base, "codes", None)
+    return hasattr(codigos, "is_owned") and not codigos.is_owned
+
+
+def leer_indice_faiss(ruta: str, tipo: Optional[str] = None):
+    """
+    Lee index.faiss memory-mapped y de solo lectura: los vectores quedan en
+    el page cache del sistema operativo y N workers que abren el mismo
+    archivo comparten una sola copia en RAM.
+
+    ivf / ivfpq se mapean con IO_FLAG_MMAP (listas invertidas en disco); el
+    resto con IO_FLAG_MMAP_IFC (códigos de IndexFlat / SQ / storage HNSW),
+    que existe desde FAISS 1.11. Las dos banderas juntas fallan en IVF.
+    Si no se puede mapear (o EVERLAST_FAISS_MMAP=0) se lee completo a
+    memoria, avisando.
+
+    Args:
+        ruta: Archivo index.faiss
+        tipo: 'tipo' de config_indice (None = vector store antiguo, flat)
+    """
+    import faiss
+
+    if os.environ.get("EVERLAST_FAISS_MMAP", "1") != "1":
+        return faiss.read_index(ruta)
+
+    if tipo in ("ivf", "ivfpq"):
+        bandera = faiss.IO_FLAG_MMAP
+    else:
+        bandera = getattr(faiss, "IO_FLAG_MMAP_IFC", None)
+    if bandera is None:
+        print(f"   ⚠️  FAISS {faiss.__version__} no mapea índices '{tipo or 'flat'}' "
+              f"(requiere >= 1.11): el índice se carga completo en RAM")
+        return faiss.read_index(ruta)
+
+    try:
+        index = faiss.read_index(ruta, bandera | faiss.IO_FLAG_READ_ONLY)
+    except Exception as e:
+        print(f"   ⚠️  Índice sin mmap ({e}); cargando a memoria")
+        return faiss.read_index(ruta)
+
+    if not indice_mapeado(index):
+        print(f"   ⚠️  index.faiss ('{tipo or 'flat'}') no quedó memory-mapped: "
+              f"cada worker tiene su propia copia en RAM")
+    return index
@@ -0,0 +1,247 @@
+"""
+lotes_embeddings.py
+===================
+Generación de embeddings por lotes para construir el índice.
+
+- Varios lotes en paralelo (hilos) sobre el cliente HTTP compartido (pool keep-alive)
+- Lotes dimensionados por número de tokens, no por número de textos
+- Reintentos con backoff exponencial + jitter ante 429 / 5xx / errores de red
+- Checkpoint por lote en disco: un build que se cae retoma donde quedó
+
+Autor: Evaluación 2 - Everlast Chile
+"""
+
+import hashlib
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+import requests
+
+from cliente_http import ClienteHTTP, obtener_cliente
+from presupuesto_tokens import contar_tokens as contar_tokens_codificacion
+
+
+MODELO_POR_DEFECTO = "text-embedding-3-small"
+
+# Límite de la API: 8191 tokens por texto; por lote usamos un margen holgado
+MAX_TOKENS_LOTE = 8000
+MAX_TEXTOS_LOTE = 100
+
+CODIGOS_REINTENTABLES = {429, 500, 502, 503, 504}
+
+
+# =============================================================================
+# CONTEO DE TOKENS
+# =============================================================================
+
+def contar_tokens(texto: str) -> int:
+    """Tokens de un texto con la codificación del modelo de embeddings (cl100k_base)"""
+    return contar_tokens_codificacion(texto, "cl100k_base")
+
+
+def dividir_en_lotes(textos: List[str], max_tokens: int = MAX_TOKENS_LOTE,
+                     max_textos: int = MAX_TEXTOS_LOTE) -> List[List[int]]:
+    """
+    Agrupa índices de textos consecutivos en lotes que no superan max_tokens
+    ni max_textos. Un texto que por sí solo supera el límite va en su propio lote.
+    """
+    lotes = []
+    actual = []
+    tokens_actual = 0
+
+    for i, texto in enumerate(textos):
+        tokens = contar_tokens(texto)
+        if actual and (tokens_actual + tokens > max_tokens or len(actual) >= max_textos):
+            lotes.append(actual)
+            actual = []
+            tokens_actual = 0
+        actual.append(i)
+        tokens_actual += tokens
+
+    if actual:
+        lotes.append(actual)
+    return lotes
+
+
+# =============================================================================
+# CLIENTE DE EMBEDDINGS POR LOTES
+# =============================================================================
+
+class EmbeddingsPorLotes:
+    """
+    Pipeline concurrente de embeddings con reintentos y checkpoints.
+
+    Args:
+        api_key: GitHub token
+        base_url: URL base para embeddings
+        modelo: Modelo de embeddings
+        hilos: Lotes simultáneos en vuelo
+        max_reintentos: Reintentos por lote ante errores transitorios
+        checkpoint_dir: Carpeta donde guardar cada lote terminado (None = sin checkpoint)
+        cliente: Cliente HTTP (por defecto el compartido del proceso)
+        verboso: Imprime el progreso por lote (el build streaming lo imprime por su cuenta)
+    """
+
+    def __init__(self, api_key: str, base_url: str, modelo: str = MODELO_POR_DEFECTO,
+                 hilos: int = 4, max_reintentos: int = 6,
+                 max_tokens_lote: int = MAX_TOKENS_LOTE,
+                 checkpoint_dir: Optional[Path] = None,
+                 cliente: Optional[ClienteHTTP] = None,
+                 verboso: bool = True):
+        self.url = f"{base_url.rstrip('/')}/embeddings"
+        self.headers = {
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json"
+        }
+        self.modelo = modelo
+        self.hilos = max(1, hilos)
+        self.max_reintentos = max_reintentos
+        self.max_tokens_lote = max_tokens_lote
+        self.checkpoint_dir = Path(checkpoint_dir) if checkpoint_dir else None
+        self.verboso = verboso
+
+        self.cliente = cliente or obtener_cliente()
+        if self.hilos > self.cliente.pool_maximo:
+            print(f"   ⚠️  {self.hilos} hilos con un pool de {self.cliente.pool_maximo} conexiones "
+                  f"(sube EVERLAST_HTTP_POOL_MAXIMO)")
+
+        self._lock_progreso = threading.Lock()
+
+    # -------------------------------------------------------------------------
+    # Checkpoints
+    # -------------------------------------------------------------------------
+
+    def _clave_lote(self, textos: List[str]) -> str:
+        """Hash del modelo + textos del lote: identifica el lote entre ejecuciones"""
+        h = hashlib.sha256(self.modelo.encode("utf-8"))
+        for texto in textos:
+            h.update(b"\x00")
+            h.update(texto.encode("utf-8"))
+        return h.hexdigest()
+
+    def _leer_checkpoint(self, clave: str) -> Optional[np.ndarray]:
+        if self.checkpoint_dir is None:
+            return None
+        archivo = self.checkpoint_dir / f"{clave}.npy"
+        if not archivo.exists():
+            return None
+        try:
+            return np.load(archivo)
+        except Exception:
+            return None
+
+    def _escribir_checkpoint(self, clave: str, vectores: np.ndarray):
+        if self.checkpoint_dir is None:
+            return
+        self.checkpoint_dir.mkdir(parents=True, exist_ok=True)
+        tmp = self.checkpoint_dir / f"{clave}.{threading.get_ident()}.tmp.npy"
+        np.save(tmp, vectores)
+        os.replace(tmp, self.checkpoint_dir / f"{clave}.npy")
+
+    # -------------------------------------------------------------------------
+    # HTTP con reintentos
+    # -------------------------------------------------------------------------
+
+    def _espera(self, intento: int, response=None) -> float:
+        """Backoff exponencial con jitter; respeta Retry-After si el servidor lo envía"""
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after:
+                try:
+                    return float(retry_after) + random.uniform(0, 1)
+                except ValueError:
+                    pass
+        base = min(30.0, 0.5 * (2 ** intento))
+        return base / 2 + random.uniform(0, base / 2)
+
+    def _solicitar(self, textos: List[str]) -> np.ndarray:
+        payload = {"model": self.modelo, "input": textos}
+
+        for intento in range(self.max_reintentos + 1):
+            try:
+                response = self.cliente.post(self.url, headers=self.headers, json=payload)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if intento >= self.max_reintentos:
+                    raise Exception(f"Error de conexión: {e}")
+                espera = self._espera(intento)
+                print(f"      ⚠️  {type(e).__name__}, reintentando en {espera:.1f}s...")
+                time.sleep(espera)
+                continue
+
+            if response.status_code == 200:
+                data = response.json()
+                items = sorted(data['data'], key=lambda item: item.get('index', 0))
+                return np.array([item['embedding'] for item in items], dtype=np.float32)
+
+            if response.status_code in CODIGOS_REINTENTABLES and intento < self.max_reintentos:
+                espera = self._espera(intento, response)
+                print(f"      ⚠️  HTTP {response.status_code}, reintentando en {espera:.1f}s...")
+                time.sleep(espera)
+                continue
+
+            raise Exception(f"Error HTTP {response.status_code}: {response.text}")
+
+        raise Exception("Se agotaron los reintentos")
+
+    # -------------------------------------------------------------------------
+    # API
+    # -------------------------------------------------------------------------
+
+    def generar(self, textos: List[str]) -> np.ndarray:
+        """
+        Genera los embeddings de todos los textos, en el mismo orden.
+
+        Returns:
+            np.ndarray: Matriz (len(textos), dimension) float32
+        """
+        if not textos:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        lotes = dividir_en_lotes(textos, max_tokens=self.max_tokens_lote)
+        resultados: List[Optional[np.ndarray]] = [None] * len(lotes)
+        pendientes = []
+
+        for n, indices in enumerate(lotes):
+            clave = self._clave_lote([textos[i] for i in indices])
+            vectores = self._leer_checkpoint(clave)
+            if vectores is not None and len(vectores) == len(indices):
+                resultados[n] = vectores
+            else:
+                pendientes.append((n, indices, clave))
+
+        reanudados = len(lotes) - len(pendientes)
+        if reanudados and self.verboso:
+            print(f"   ♻️  {reanudados}/{len(lotes)} lotes recuperados del checkpoint")
+        if self.verboso:
+            print(f"   Procesando {len(pendientes)} lotes con {self.hilos} hilos...")
+
+        completados = 0
+
+        def procesar(n, indices, clave):
+            vectores = self._solicitar([textos[i] for i in indices])
+            self._escribir_checkpoint(clave, vectores)
+            return n, vectores
+
+        with ThreadPoolExecutor(max_workers=self.hilos) as pool:
+            futuros = [pool.submit(procesar, n, indices, clave) for n, indices, clave in pendientes]
+            for futuro in as_completed(futuros):
+                try:
+                    n, vectores = futuro.result()
+                except Exception:
+                    # Los lotes ya terminados quedan en el checkpoint
+                    for pendiente in futuros:
+                        pendiente.cancel()
+                    raise
+                resultados[n] = vectores
+                with self._lock_progreso:
+                    completados += 1
+                    if self.verboso:
+                        print(f"   Batch {completados}/{len(pendientes)} listo ({len(vectores)} textos)")
+
+        return np.vstack(resultados).astype(np.float32, copy=False)
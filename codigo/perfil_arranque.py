@@ -0,0 +1,140 @@
+"""
+perfil_arranque.py
+==================
+Mide cuánto tarda en importarse cada punto de entrada (arranque en frío de
+la CLI o de un worker) con `python -X importtime` y guarda el resumen por
+versión en perfil_arranque.json, para comparar entre releases. Ese archivo
+es local (depende de la máquina y del Python) y no se versiona: los números
+de cada release van en la tabla "Arranque en frío" del README.
+
+Ejecutar:
+    python codigo/perfil_arranque.py                  # imprime el resumen
+    python codigo/perfil_arranque.py --guardar v2.1   # además lo agrega al historial
+
+Autor: Evaluación 2 - Everlast Chile
+"""
+
+import json
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+
+CARPETA_CODIGO = Path(__file__).resolve().parent
+ARCHIVO_HISTORIAL = CARPETA_CODIGO.parent / "perfil_arranque.json"
+
+# app_streamlit no se importa aquí: al importarlo ejecuta la app
+MODULOS = ["agente_principal", "tools_everlast", "create_vectorstore"]
+
+# Paquetes pesados que no deberían aparecer al arrancar
+PESADOS = ["langchain", "langchain_core", "langchain_community", "faiss", "tiktoken", "aiohttp"]
+
+PATRON_LINEA = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def medir_modulo(modulo: str) -> Dict:
+    """
+    Importa el módulo en un proceso nuevo con -X importtime.
+
+    Returns:
+        dict con total_ms, los módulos más caros (acumulado) y los pesados cargados
+    """
+    resultado = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {modulo}"],
+        cwd=CARPETA_CODIGO, capture_output=True, text=True
+    )
+    if resultado.returncode != 0:
+        raise RuntimeError(f"No se pudo importar {modulo}: {resultado.stderr.strip().splitlines()[-1]}")
+
+    filas = []
+    for linea in resultado.stderr.splitlines():
+        coincidencia = PATRON_LINEA.match(linea)
+        if coincidencia:
+            propio, acumulado, sangria, nombre = coincidencia.groups()
+            filas.append((nombre, int(propio), int(acumulado), len(sangria)))
+
+    # importtime lista cada módulo después de sus imports, con más sangría:
+    # lo que el módulo medido arrastra son las filas anteriores más indentadas
+    # (lo de antes es el arranque del intérprete: site, encodings...)
+    posicion = next(i for i, fila in enumerate(filas) if fila[0] == modulo)
+    nivel, total = filas[posicion][3], filas[posicion][2]
+    inicio = posicion
+    while inicio > 0 and filas[inicio - 1][3] > nivel:
+        inicio -= 1
+    arrastrados = filas[inicio:posicion]
+
+    hijos = [f for f in arrastrados if f[3] == nivel + 2]
+    mas_caros = sorted(hijos, key=lambda f: f[2], reverse=True)[:8]
+    cargados = {nombre.split(".")[0] for nombre, _, _, _ in arrastrados}
+
+    return {
+        'total_ms': round(total / 1000, 1),
+        'mas_caros': [{'modulo': n, 'acumulado_ms': round(a / 1000, 1)} for n, _, a, _ in mas_caros],
+        'pesados': sorted(cargados & set(PESADOS))
+    }
+
+
+def perfilar(modulos: List[str], repeticiones: int = 3) -> Dict[str, Dict]:
+    """Mediana de varias corridas (la primera también calienta el caché de bytecode)"""
+    perfil = {}
+    for modulo in modulos:
+        corridas = [medir_modulo(modulo) for _ in range(repeticiones)]
+        mediana = statistics.median(c['total_ms'] for c in corridas)
+        perfil[modulo] = min(corridas, key=lambda c: abs(c['total_ms'] - mediana))
+    return perfil
+
+
+def imprimir(perfil: Dict[str, Dict]):
+    print("=" * 80)
+    print("PERFIL DE ARRANQUE (python -X importtime)")
+    print("=" * 80)
+    for modulo, datos in perfil.items():
+        print(f"\n📦 {modulo}: {datos['total_ms']:.0f} ms")
+        for fila in datos['mas_caros']:
+            print(f"   {fila['acumulado_ms']:8.1f} ms  {fila['modulo']}")
+        if datos['pesados']:
+            print(f"   ⚠️  Carga al importar: {', '.join(datos['pesados'])}")
+
+
+def guardar(perfil: Dict[str, Dict], version: str):
+    """Agrega (o reemplaza) la entrada de esta versión en perfil_arranque.json"""
+    historial = []
+    if ARCHIVO_HISTORIAL.exists():
+        historial = json.loads(ARCHIVO_HISTORIAL.read_text(encoding="utf-8"))
+    historial = [e for e in historial if e['version'] != version]
+    historial.append({
+        'version': version,
+        'fecha': time.strftime("%Y-%m-%d"),
+        'python': platform.python_version(),
+        'modulos': {m: {'total_ms': d['total_ms'], 'pesados': d['pesados']} for m, d in perfil.items()}
+    })
+    ARCHIVO_HISTORIAL.write_text(json.dumps(historial, ensure_ascii=False, indent=1), encoding="utf-8")
+    print(f"\n✅ Guardado en {ARCHIVO_HISTORIAL.name} (versión {version})")
+
+    if len(historial) > 1:
+        anterior = historial[-2]
+        print(f"\n📈 Comparado con {anterior['version']}:")
+        for modulo, datos in perfil.items():
+            previo = anterior['modulos'].get(modulo)
+            if previo:
+                print(f"   {modulo}: {previo['total_ms']:.0f} → {datos['total_ms']:.0f} ms")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Perfil de arranque de los puntos de entrada")
+    parser.add_argument("--guardar", metavar="VERSION", help="Agrega el resultado al historial")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("modulos", nargs="*", default=MODULOS)
+    args = parser.parse_args()
+
+    resultado = perfilar(args.modulos, args.repeticiones)
+    imprimir(resultado)
+    if args.guardar:
+        guardar(resultado, args.guardar)
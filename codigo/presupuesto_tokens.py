@@ -0,0 +1,201 @@
+"""
+presupuesto_tokens.py
+=====================
+Conteo de tokens y reparto del contexto del LLM.
+
+Reemplaza los recortes por caracteres (1500 por mensaje, 2000 por resultado
+de herramienta, 4 chars = 1 token) por un presupuesto en tokens reales:
+
+    total = system prompt + reserva de respuesta + turno actual + historial
+
+Lo que no cabe se descarta o se comprime empezando por lo de menor valor:
+primero los mensajes más antiguos del historial, después los fragmentos
+recuperados peor rankeados y recién al final se recorta texto.
+
+El tokenizer es tiktoken (o200k_base, el de gpt-4o-mini). Si no está
+instalado o no puede descargar la codificación, se estima ~4 chars/token.
+
+Autor: Evaluación 2 - Everlast Chile
+"""
+
+import json
+import os
+import threading
+from typing import Dict, List, Optional
+
+
+CODIFICACION_LLM = "o200k_base"
+
+# Tokens fijos que agrega el formato de chat por cada mensaje
+TOKENS_POR_MENSAJE = 4
+
+SEPARADOR_FRAGMENTOS = "--- FRAGMENTO ---"
+MARCA_RECORTE = "... [truncado]"
+
+
+# =============================================================================
+# TOKENIZER
+# =============================================================================
+
+_codificadores: Dict[str, Optional[object]] = {}
+_lock = threading.Lock()
+
+
+def _codificador(nombre: str):
+    """Codificación de tiktoken (None si no está disponible); se carga una sola vez"""
+    if nombre not in _codificadores:
+        with _lock:
+            if nombre not in _codificadores:
+                try:
+                    import tiktoken
+                    _codificadores[nombre] = tiktoken.get_encoding(nombre)
+                except Exception:
+                    _codificadores[nombre] = None
+    return _codificadores[nombre]
+
+
+def contar_tokens(texto: str, codificacion: str = CODIFICACION_LLM) -> int:
+    """Tokens de un texto; sin tiktoken, ~4 chars/token"""
+    if not texto:
+        return 0
+    codificador = _codificador(codificacion)
+    if codificador is not None:
+        return len(codificador.encode(texto, disallowed_special=()))
+    return len(texto) // 4 + 1
+
+
+def recortar_a_tokens(texto: str, max_tokens: int, codificacion: str = CODIFICACION_LLM) -> str:
+    """Deja el texto en a lo más max_tokens (marca el recorte al final)"""
+    if contar_tokens(texto, codificacion) <= max_tokens:
+        return texto
+
+    margen = max(0, max_tokens - contar_tokens(MARCA_RECORTE, codificacion))
+    codificador = _codificador(codificacion)
+    if codificador is not None:
+        recorte = codificador.decode(codificador.encode(texto, disallowed_special=())[:margen])
+    else:
+        recorte = texto[:margen * 4]
+    return recorte + MARCA_RECORTE
+
+
+def recortar_fragmentos(texto: str, max_tokens: int) -> str:
+    """
+    Ajusta un resultado de búsqueda al presupuesto quitando primero los
+    fragmentos del final (los de menor ranking) y recortando texto solo si
+    el primero por sí solo no cabe.
+    """
+    if contar_tokens(texto) <= max_tokens:
+        return texto
+
+    partes = texto.split(SEPARADOR_FRAGMENTOS)
+    cabecera, fragmentos = partes[0], partes[1:]
+    while len(fragmentos) > 1:
+        fragmentos.pop()
+        candidato = SEPARADOR_FRAGMENTOS.join([cabecera] + fragmentos)
+        if contar_tokens(candidato) <= max_tokens:
+            return candidato
+    return recortar_a_tokens(SEPARADOR_FRAGMENTOS.join([cabecera] + fragmentos), max_tokens)
+
+
+def tokens_mensaje(mensaje: Dict) -> int:
+    """Tokens que ocupa un mensaje de chat (contenido + tool_calls + overhead)"""
+    total = TOKENS_POR_MENSAJE + contar_tokens(mensaje.get("content") or "")
+    if mensaje.get("tool_calls"):
+        total += contar_tokens(json.dumps(mensaje["tool_calls"], ensure_ascii=False))
+    return total
+
+
+# =============================================================================
+# PRESUPUESTO
+# =============================================================================
+
+class PresupuestoTokens:
+    """
+    Reparte una ventana fija de tokens entre las partes del prompt.
+
+    Args:
+        total: Tokens de entrada + salida permitidos por request
+        reserva_respuesta: Tokens reservados para la respuesta (max_tokens del payload)
+        max_tokens_herramienta: Máximo por resultado de herramienta
+        max_tokens_mensaje_historial: Máximo por mensaje guardado en el historial
+    """
+
+    def __init__(self, total: int = 8000, reserva_respuesta: int = 800,
+                 max_tokens_herramienta: int = 1500, max_tokens_mensaje_historial: int = 400):
+        self.total = total
+        self.reserva_respuesta = reserva_respuesta
+        self.max_tokens_herramienta = max_tokens_herramienta
+        self.max_tokens_mensaje_historial = max_tokens_mensaje_historial
+
+    @classmethod
+    def desde_entorno(cls) -> "PresupuestoTokens":
+        return cls(
+            total=int(os.environ.get("EVERLAST_PRESUPUESTO_TOKENS", 8000)),
+            reserva_respuesta=int(os.environ.get("EVERLAST_TOKENS_RESPUESTA", 800)),
+            max_tokens_herramienta=int(os.environ.get("EVERLAST_TOKENS_HERRAMIENTA", 1500)),
+            max_tokens_mensaje_historial=int(os.environ.get("EVERLAST_TOKENS_MENSAJE", 400))
+        )
+
+    def ajustar(self, mensajes: List[Dict], tokens_extra: int = 0) -> List[Dict]:
+        """
+        Devuelve los mensajes que caben en el presupuesto, en el mismo orden.
+
+        mensajes[0] es el system prompt. Los mensajes marcados con
+        '_historial': True son de turnos anteriores (descartables, de los más
+        viejos a los más nuevos); el resto es el turno actual (pregunta y
+        observaciones), que solo se comprime si no queda otra.
+
+        Args:
+            tokens_extra: Tokens fijos fuera de los mensajes (p. ej. esquemas de tools)
+        """
+        if not mensajes:
+            return []
+
+        system, resto = mensajes[0], mensajes[1:]
+        disponible = self.total - self.reserva_respuesta - tokens_extra - tokens_mensaje(system)
+
+        historial = [m for m in resto if m.get("_historial")]
+        turno = [dict(m) for m in resto if not m.get("_historial")]
+
+        # 1. El turno actual tiene prioridad; si no cabe, se comprimen sus observaciones
+        usados = sum(tokens_mensaje(m) for m in turno)
+        if usados > disponible:
+            turno = self._comprimir_turno(turno, disponible)
+            usados = sum(tokens_mensaje(m) for m in turno)
+
+        # 2. Historial: del más reciente al más antiguo mientras quepa
+        restante = disponible - usados
+        conservados = set()
+        for i in range(len(historial) - 1, -1, -1):
+            costo = tokens_mensaje(historial[i])
+            if costo > restante:
+                break
+            restante -= costo
+            conservados.add(i)
+
+        return [system] + [m for i, m in enumerate(historial) if i in conservados] + turno
+
+    def _comprimir_turno(self, turno: List[Dict], disponible: int) -> List[Dict]:
+        """
+        Recorta las observaciones del turno (resultados de herramientas) de la
+        más grande a la más chica hasta que el turno quepa. La pregunta del
+        usuario (primer mensaje) se recorta solo como último recurso.
+        """
+        observaciones = [i for i, m in enumerate(turno) if i > 0 and m.get("content")]
+
+        for _ in range(len(observaciones) * 4):
+            exceso = sum(tokens_mensaje(m) for m in turno) - disponible
+            if exceso <= 0 or not observaciones:
+                return turno
+            mayor = max(observaciones, key=lambda i: tokens_mensaje(turno[i]))
+            actual = contar_tokens(turno[mayor]["content"])
+            objetivo = max(16, actual - exceso)
+            if objetivo >= actual:
+                break
+            turno[mayor]["content"] = recortar_fragmentos(turno[mayor]["content"], objetivo)
+
+        exceso = sum(tokens_mensaje(m) for m in turno) - disponible
+        if exceso > 0 and turno and turno[0].get("content"):
+            objetivo = max(16, contar_tokens(turno[0]["content"]) - exceso)
+            turno[0]["content"] = recortar_a_tokens(turno[0]["content"], objetivo)
+        return turno
@@ -0,0 +1,321 @@
+"""
+proveedores_embeddings.py
+=========================
+Proveedores de embeddings intercambiables, para el build y para las consultas.
+
+Proveedores (EVERLAST_EMBEDDINGS o `create_vectorstore.py --embeddings`):
+    http                    API /embeddings (text-embedding-3-small), por defecto
+    http:<modelo>           Otro modelo de la misma API
+    local[:<modelo>]        sentence-transformers en CPU (requiere
+                            `pip install sentence-transformers`); por defecto
+                            paraphrase-multilingual-MiniLM-L12-v2 (384 dims)
+    hashing[:<dimension>]   Vectorizador por hashing sin modelo ni red
+                            (1024 dims por defecto). Captura coincidencias de
+                            palabras, no sinónimos: sirve sin conexión o como
+                            respaldo
+
+El build guarda la identidad del proveedor (tipo, modelo y dimensión) en
+config.pkl. Al cargar un vector store, la identidad del proveedor configurado
+se compara con la guardada: si no coinciden, los vectores de las consultas no
+serían comparables con los del índice y la carga se rechaza.
+
+Autor: Evaluación 2 - Everlast Chile
+"""
+
+import asyncio
+import importlib.util
+import os
+import zlib
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+MODELO_HTTP = "text-embedding-3-small"
+MODELO_LOCAL = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+DIMENSION_HASHING = 1024
+
+# Máximo de textos por request de embeddings (límite de la API)
+MAX_INPUTS_POR_REQUEST = 2048
+
+
+def _normalizar_filas(matriz: np.ndarray) -> np.ndarray:
+    matriz /= np.maximum(np.linalg.norm(matriz, axis=1, keepdims=True), 1e-12)
+    return matriz
+
+
+# =============================================================================
+# INTERFAZ
+# =============================================================================
+
+class ProveedorEmbeddings(ABC):
+    """
+    Interfaz de un proveedor de embeddings.
+
+    Atributos:
+        tipo: "http", "local" o "hashing"
+        modelo: Nombre del modelo (clave de la caché de embeddings)
+        dimension: Largo de los vectores (None si se conoce recién al primer request)
+        usa_cache: Si conviene guardar los vectores de consultas en CacheEmbeddings
+    """
+
+    tipo = ""
+    usa_cache = True
+
+    def __init__(self, modelo: str, dimension: Optional[int] = None):
+        self.modelo = modelo
+        self.dimension = dimension
+
+    def identidad(self, dimension: Optional[int] = None) -> Dict:
+        """Lo que se guarda en config.pkl para validar al cargar"""
+        return {'proveedor': self.tipo, 'modelo': self.modelo,
+                'dimension': dimension or self.dimension}
+
+    @abstractmethod
+    def embeber(self, textos: List[str]) -> np.ndarray:
+        """Matriz float32 (len(textos), dimension), en el mismo orden"""
+
+    async def embeber_async(self, textos: List[str]) -> np.ndarray:
+        """Por defecto corre embeber() en un hilo para no bloquear el loop"""
+        return await asyncio.to_thread(self.embeber, textos)
+
+    def embeber_documentos(self, textos: List[str], checkpoint_dir: Optional[Path] = None,
+                           verboso: bool = True) -> np.ndarray:
+        """Embeddings para el build (los locales no necesitan checkpoints)"""
+        if not textos:
+            return np.zeros((0, 0), dtype=np.float32)
+        return self.embeber(textos)
+
+
+# =============================================================================
+# PROVEEDORES
+# =============================================================================
+
+class ProveedorHTTP(ProveedorEmbeddings):
+    """
+    API /embeddings compatible con OpenAI (GitHub Models).
+
+    Args:
+        api_key: Token (por defecto GITHUB_TOKEN)
+        base_url: URL base (por defecto OPENAI_EMBEDDINGS_URL)
+    """
+
+    tipo = "http"
+
+    def __init__(self, modelo: str = MODELO_HTTP, api_key: Optional[str] = None,
+                 base_url: Optional[str] = None):
+        super().__init__(modelo)
+        self.api_key = api_key
+        self.base_url = base_url
+
+    def _credenciales(self):
+        """(api_key, base_url); las variables de entorno se leen recién al usarlas"""
+        api_key = self.api_key or os.environ.get("GITHUB_TOKEN")
+        base_url = self.base_url or os.environ.get("OPENAI_EMBEDDINGS_URL")
+        if not api_key or not base_url:
+            raise ValueError("Variables de entorno GITHUB_TOKEN y OPENAI_EMBEDDINGS_URL requeridas")
+        return api_key, base_url
+
+    def _request(self):
+        """URL y headers del request"""
+        api_key, base_url = self._credenciales()
+        url = f"{base_url.rstrip('/')}/embeddings"
+        headers = {
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json"
+        }
+        return url, headers
+
+    @staticmethod
+    def _vectores_de_respuesta(response) -> List[List[float]]:
+        if response.status_code != 200:
+            raise Exception(f"Error al generar embedding: {response.status_code}")
+        data = sorted(response.json()['data'], key=lambda item: item.get('index', 0))
+        return [item['embedding'] for item in data]
+
+    def embeber(self, textos: List[str]) -> np.ndarray:
+        """Un solo request HTTP (o los mínimos si superan MAX_INPUTS_POR_REQUEST)"""
+        from cliente_http import obtener_cliente
+
+        url, headers = self._request()
+        vectores = []
+        for i in range(0, len(textos), MAX_INPUTS_POR_REQUEST):
+            payload = {"model": self.modelo, "input": textos[i:i + MAX_INPUTS_POR_REQUEST]}
+            response = obtener_cliente().post(url, headers=headers, json=payload, timeout=30)
+            vectores.extend(self._vectores_de_respuesta(response))
+        return np.array(vectores, dtype=np.float32)
+
+    async def embeber_async(self, textos: List[str]) -> np.ndarray:
+        """Con el cliente aiohttp del loop actual"""
+        from cliente_http import obtener_cliente_async
+
+        url, headers = self._request()
+        vectores = []
+        for i in range(0, len(textos), MAX_INPUTS_POR_REQUEST):
+            payload = {"model": self.modelo, "input": textos[i:i + MAX_INPUTS_POR_REQUEST]}
+            response = await obtener_cliente_async().post(url, headers=headers, json=payload, timeout=30)
+            vectores.extend(self._vectores_de_respuesta(response))
+        return np.array(vectores, dtype=np.float32)
+
+    def embeber_documentos(self, textos: List[str], checkpoint_dir: Optional[Path] = None,
+                           verboso: bool = True) -> np.ndarray:
+        """Lotes por tokens en paralelo, con reintentos y checkpoints (lotes_embeddings.py)"""
+        from lotes_embeddings import EmbeddingsPorLotes
+
+        api_key, base_url = self._credenciales()
+        generador = EmbeddingsPorLotes(
+            api_key,
+            base_url,
+            modelo=self.modelo,
+            hilos=int(os.getenv("EVERLAST_EMBEDDINGS_HILOS", 4)),
+            checkpoint_dir=checkpoint_dir,
+            verboso=verboso
+        )
+        return generador.generar(textos)
+
+
+class ProveedorLocal(ProveedorEmbeddings):
+    """
+    Modelo sentence-transformers en CPU, sin red: una consulta toma unos pocos
+    milisegundos. El modelo se carga al primer uso.
+    """
+
+    tipo = "local"
+
+    def __init__(self, modelo: str = MODELO_LOCAL, dispositivo: str = "cpu"):
+        # Solo se verifica que esté instalado: importarlo toma segundos
+        if importlib.util.find_spec("sentence_transformers") is None:
+            raise ImportError("El proveedor local requiere: pip install sentence-transformers")
+        super().__init__(modelo)
+        self.dispositivo = dispositivo
+        self._modelo = None
+
+    def _cargar(self):
+        if self._modelo is None:
+            from sentence_transformers import SentenceTransformer
+            self._modelo = SentenceTransformer(self.modelo, device=self.dispositivo)
+            self.dimension = self._modelo.get_sentence_embedding_dimension()
+        return self._modelo
+
+    def identidad(self, dimension: Optional[int] = None) -> Dict:
+        self._cargar()
+        return super().identidad(dimension)
+
+    def embeber(self, textos: List[str]) -> np.ndarray:
+        vectores = self._cargar().encode(
+            textos, batch_size=64, normalize_embeddings=True, show_progress_bar=False
+        )
+        return np.asarray(vectores, dtype=np.float32)
+
+    def embeber_documentos(self, textos: List[str], checkpoint_dir: Optional[Path] = None,
+                           verboso: bool = True) -> np.ndarray:
+        if verboso:
+            print(f"   Embebiendo {len(textos)} textos en CPU ({self.modelo})...")
+        return super().embeber_documentos(textos, checkpoint_dir, verboso)
+
+
+class ProveedorHashing(ProveedorEmbeddings):
+    """
+    Vectorizador por hashing: palabras (tokenizador del BM25, sin tildes ni
+    stopwords) y trigramas de caracteres de cada palabra, para que "guante" y
+    "guantes" se parezcan. Cada rasgo va a una de `dimension` posiciones con
+    signo (CRC32), con peso 1 + log(frecuencia), y el vector se normaliza.
+
+    No necesita modelo ni red y una consulta toma microsegundos. Es determinista,
+    así que los vectores del build y de las consultas siempre coinciden.
+    """
+
+    tipo = "hashing"
+    usa_cache = False  # calcularlo es más rápido que buscarlo en SQLite
+
+    def __init__(self, dimension: int = DIMENSION_HASHING):
+        super().__init__(f"hashing-palabras-trigramas-{dimension}", dimension)
+
+    def _rasgos(self, texto: str) -> List[str]:
+        from bm25_everlast import tokenizar
+
+        rasgos = []
+        for palabra in tokenizar(texto):
+            rasgos.append(palabra)
+            marcada = f"<{palabra}>"
+            rasgos.extend("#" + marcada[i:i + 3] for i in range(len(marcada) - 2))
+        return rasgos
+
+    def embeber(self, textos: List[str]) -> np.ndarray:
+        matriz = np.zeros((len(textos), self.dimension), dtype=np.float32)
+        for fila, texto in enumerate(textos):
+            conteo: Dict[int, float] = {}
+            for rasgo in self._rasgos(texto):
+                h = zlib.crc32(rasgo.encode("utf-8"))
+                posicion = h % self.dimension
+                signo = 1.0 if (h >> 31) & 1 else -1.0
+                conteo[posicion] = conteo.get(posicion, 0.0) + signo
+            for posicion, valor in conteo.items():
+                matriz[fila, posicion] = np.sign(valor) * (1.0 + np.log(abs(valor))) if valor else 0.0
+        return _normalizar_filas(matriz)
+
+    async def embeber_async(self, textos: List[str]) -> np.ndarray:
+        return self.embeber(textos)
+
+
+# =============================================================================
+# FÁBRICA Y VALIDACIÓN
+# =============================================================================
+
+def crear_proveedor(especificacion: Optional[str] = None, api_key: Optional[str] = None,
+                    base_url: Optional[str] = None) -> ProveedorEmbeddings:
+    """
+    Crea el proveedor a partir de EVERLAST_EMBEDDINGS.
+
+    Args:
+        especificacion: "http[:modelo]", "local[:modelo]" o "hashing[:dimension]"
+            (por defecto la variable de entorno, o "http")
+    """
+    especificacion = (especificacion or os.environ.get("EVERLAST_EMBEDDINGS") or "http").strip()
+    tipo, _, parametro = especificacion.partition(":")
+
+    if tipo == "http":
+        return ProveedorHTTP(parametro or MODELO_HTTP, api_key=api_key, base_url=base_url)
+    if tipo == "local":
+        return ProveedorLocal(parametro or MODELO_LOCAL)
+    if tipo == "hashing":
+        return ProveedorHashing(int(parametro) if parametro else DIMENSION_HASHING)
+    raise ValueError(f"Proveedor de embeddings desconocido: {especificacion}")
+
+
+def identidad_guardada(config: Dict) -> Dict:
+    """
+    Identidad del proveedor con que se construyó un vector store. Los
+    config.pkl anteriores solo tienen 'model' y 'dimension' (siempre HTTP).
+    """
+    if 'embeddings' in config:
+        return config['embeddings']
+    return {'proveedor': 'http', 'modelo': config.get('model', MODELO_HTTP),
+            'dimension': config.get('dimension')}
+
+
+def validar_proveedor(config: Dict, proveedor: ProveedorEmbeddings, dimension_indice: int):
+    """
+    Rechaza un vector store que no se puede consultar con este proveedor.
+
+    Raises:
+        ValueError: Si cambian el proveedor, el modelo o la dimensión
+    """
+    guardada = identidad_guardada(config)
+    actual = proveedor.identidad()
+
+    if (guardada['proveedor'], guardada['modelo']) != (actual['proveedor'], actual['modelo']):
+        raise ValueError(
+            f"El vector store se construyó con {guardada['proveedor']}:{guardada['modelo']} "
+            f"y las consultas usan {actual['proveedor']}:{actual['modelo']} "
+            f"(ajusta EVERLAST_EMBEDDINGS o reconstruye con --embeddings)"
+        )
+
+    dimensiones = {guardada.get('dimension'), actual.get('dimension'), dimension_indice} - {None}
+    if len(dimensiones) > 1:
+        raise ValueError(
+            f"Dimensión incompatible: vector store {guardada.get('dimension')}, "
+            f"índice {dimension_indice}, proveedor {actual.get('dimension')}"
+        )
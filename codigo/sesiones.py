@@ -0,0 +1,265 @@
+"""
+sesiones.py
+===========
+Almacén de sesiones de conversación (estado de MemoriaSimple).
+
+Con el estado fuera del proceso, cualquier worker detrás de un balanceador
+puede atender cualquier turno y un reinicio no borra las conversaciones:
+el agente carga la sesión al empezar el turno y la guarda al terminar.
+
+Backends (EVERLAST_SESIONES):
+    memoria              Diccionario del proceso (por defecto; no sobrevive reinicios)
+    sqlite[:ruta]        Archivo SQLite compartido por los workers de una máquina
+    redis://host:6379/0  Redis (requiere `pip install redis`)
+
+El estado se serializa a JSON. Las sesiones vencen tras `ttl` segundos sin
+uso; compactar() borra las vencidas (Redis las expira solo).
+
+Autor: Evaluación 2 - Everlast Chile
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Dict, Optional
+
+
+def serializar(estado: Dict) -> str:
+    return json.dumps(estado, ensure_ascii=False, separators=(",", ":"))
+
+
+def deserializar(texto) -> Optional[Dict]:
+    if texto is None:
+        return None
+    if isinstance(texto, bytes):
+        texto = texto.decode("utf-8")
+    try:
+        return json.loads(texto)
+    except json.JSONDecodeError:
+        return None
+
+
+# =============================================================================
+# INTERFAZ
+# =============================================================================
+
+class AlmacenSesiones(ABC):
+    """
+    Interfaz de un almacén de sesiones. Un backend al que le falte un método
+    falla al instanciarse, no a mitad de un turno.
+
+    Args:
+        ttl: Segundos sin uso tras los cuales una sesión vence
+    """
+
+    def __init__(self, ttl: float = 86400):
+        self.ttl = ttl
+
+    @abstractmethod
+    def cargar(self, id_sesion: str) -> Optional[Dict]:
+        """Estado guardado de la sesión, o None si no existe o venció"""
+
+    @abstractmethod
+    def guardar(self, id_sesion: str, estado: Dict):
+        """Guarda (reemplaza) el estado y renueva el TTL"""
+
+    @abstractmethod
+    def eliminar(self, id_sesion: str):
+        """Borra la sesión (sin error si no existe)"""
+
+    def compactar(self) -> int:
+        """Borra las sesiones vencidas; devuelve cuántas"""
+        return 0
+
+    @abstractmethod
+    def contar(self) -> int:
+        """Sesiones vigentes"""
+
+
+# =============================================================================
+# BACKENDS
+# =============================================================================
+
+class AlmacenMemoria(AlmacenSesiones):
+    """Sesiones en un diccionario del proceso (un solo worker, sin persistencia)"""
+
+    def __init__(self, ttl: float = 86400):
+        super().__init__(ttl)
+        self._sesiones: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def cargar(self, id_sesion: str) -> Optional[Dict]:
+        with self._lock:
+            guardada = self._sesiones.get(id_sesion)
+            if guardada is None:
+                return None
+            texto, actualizada = guardada
+            if time.time() - actualizada > self.ttl:
+                del self._sesiones[id_sesion]
+                return None
+        return deserializar(texto)
+
+    def guardar(self, id_sesion: str, estado: Dict):
+        texto = serializar(estado)
+        with self._lock:
+            self._sesiones[id_sesion] = (texto, time.time())
+
+    def eliminar(self, id_sesion: str):
+        with self._lock:
+            self._sesiones.pop(id_sesion, None)
+
+    def compactar(self) -> int:
+        limite = time.time() - self.ttl
+        with self._lock:
+            vencidas = [i for i, (_, actualizada) in self._sesiones.items() if actualizada < limite]
+            for id_sesion in vencidas:
+                del self._sesiones[id_sesion]
+        return len(vencidas)
+
+    def contar(self) -> int:
+        limite = time.time() - self.ttl
+        with self._lock:
+            return sum(1 for _, actualizada in self._sesiones.values() if actualizada >= limite)
+
+
+class AlmacenSQLite(AlmacenSesiones):
+    """
+    Sesiones en un archivo SQLite (modo WAL: varios procesos leen y escriben
+    el mismo archivo). Cada `compactar_cada` escrituras se borran las vencidas.
+
+    Args:
+        ruta: Archivo SQLite
+        compactar_cada: Escrituras entre compactaciones automáticas (0 = nunca)
+    """
+
+    def __init__(self, ruta: Path, ttl: float = 86400, compactar_cada: int = 500):
+        super().__init__(ttl)
+        self.ruta = Path(ruta)
+        self.compactar_cada = compactar_cada
+        self._escrituras = 0
+        self._lock = threading.Lock()
+
+        self.ruta.parent.mkdir(parents=True, exist_ok=True)
+        self._conexion = sqlite3.connect(str(self.ruta), check_same_thread=False, timeout=10)
+        self._conexion.execute("PRAGMA auto_vacuum=INCREMENTAL")  # solo aplica al crear el archivo
+        self._conexion.execute("PRAGMA journal_mode=WAL")
+        self._conexion.execute(
+            "CREATE TABLE IF NOT EXISTS sesiones ("
+            " id TEXT PRIMARY KEY,"
+            " estado TEXT NOT NULL,"
+            " actualizada REAL NOT NULL)"
+        )
+        self._conexion.execute(
+            "CREATE INDEX IF NOT EXISTS idx_actualizada ON sesiones(actualizada)"
+        )
+        self._conexion.commit()
+
+    def cargar(self, id_sesion: str) -> Optional[Dict]:
+        with self._lock:
+            fila = self._conexion.execute(
+                "SELECT estado FROM sesiones WHERE id = ? AND actualizada >= ?",
+                (id_sesion, time.time() - self.ttl)
+            ).fetchone()
+        return deserializar(fila[0]) if fila else None
+
+    def guardar(self, id_sesion: str, estado: Dict):
+        texto = serializar(estado)
+        with self._lock:
+            self._conexion.execute(
+                "INSERT OR REPLACE INTO sesiones (id, estado, actualizada) VALUES (?, ?, ?)",
+                (id_sesion, texto, time.time())
+            )
+            self._conexion.commit()
+            self._escrituras += 1
+            compactar = self.compactar_cada and self._escrituras % self.compactar_cada == 0
+        if compactar:
+            self.compactar()
+
+    def eliminar(self, id_sesion: str):
+        with self._lock:
+            self._conexion.execute("DELETE FROM sesiones WHERE id = ?", (id_sesion,))
+            self._conexion.commit()
+
+    def compactar(self) -> int:
+        """Borra las sesiones vencidas y devuelve el espacio libre al sistema"""
+        with self._lock:
+            borradas = self._conexion.execute(
+                "DELETE FROM sesiones WHERE actualizada < ?", (time.time() - self.ttl,)
+            ).rowcount
+            self._conexion.commit()
+            if borradas:
+                self._conexion.execute("PRAGMA incremental_vacuum")
+                self._conexion.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return borradas
+
+    def contar(self) -> int:
+        with self._lock:
+            return self._conexion.execute(
+                "SELECT COUNT(*) FROM sesiones WHERE actualizada >= ?", (time.time() - self.ttl,)
+            ).fetchone()[0]
+
+
+class AlmacenRedis(AlmacenSesiones):
+    """
+    Sesiones en Redis, compartidas por workers de distintas máquinas.
+
+    El TTL lo maneja Redis (SETEX), así que compactar() no tiene nada que
+    hacer. Acepta cualquier cliente con get/setex/delete/scan_iter (p. ej.
+    fakeredis para probar en local).
+
+    Args:
+        url: URL de Redis (si no se pasa cliente)
+        cliente: Cliente ya creado
+        prefijo: Prefijo de las claves
+    """
+
+    def __init__(self, url: str = "redis://localhost:6379/0", ttl: float = 86400,
+                 cliente=None, prefijo: str = "everlast:sesion:"):
+        super().__init__(ttl)
+        if cliente is None:
+            try:
+                import redis
+            except ImportError:
+                raise ImportError("El backend redis requiere: pip install redis")
+            cliente = redis.Redis.from_url(url)
+        self.cliente = cliente
+        self.prefijo = prefijo
+
+    def cargar(self, id_sesion: str) -> Optional[Dict]:
+        return deserializar(self.cliente.get(self.prefijo + id_sesion))
+
+    def guardar(self, id_sesion: str, estado: Dict):
+        self.cliente.setex(self.prefijo + id_sesion, int(self.ttl), serializar(estado))
+
+    def eliminar(self, id_sesion: str):
+        self.cliente.delete(self.prefijo + id_sesion)
+
+    def contar(self) -> int:
+        return sum(1 for _ in self.cliente.scan_iter(match=self.prefijo + "*"))
+
+
+# =============================================================================
+# FÁBRICA
+# =============================================================================
+
+def crear_almacen(especificacion: str, ruta_sqlite: Path, ttl: float = 86400) -> AlmacenSesiones:
+    """
+    Crea el backend a partir de EVERLAST_SESIONES.
+
+    Args:
+        especificacion: "memoria", "sqlite", "sqlite:/ruta/archivo.sqlite" o "redis://..."
+        ruta_sqlite: Archivo por defecto del backend sqlite
+    """
+    especificacion = (especificacion or "memoria").strip()
+
+    if especificacion.startswith(("redis://", "rediss://", "unix://")):
+        return AlmacenRedis(especificacion, ttl=ttl)
+    if especificacion.startswith("sqlite"):
+        _, _, ruta = especificacion.partition(":")
+        return AlmacenSQLite(Path(ruta) if ruta else ruta_sqlite, ttl=ttl)
+    if especificacion == "memoria":
+        return AlmacenMemoria(ttl=ttl)
+    raise ValueError(f"Backend de sesiones desconocido: {especificacion}")
@@ -9,54 +9,313 @@ IMPORTANTE: Ejecutar primero: python codigo/create_vectorstore.py
 Autor: Evaluación 2 - Everlast Chile
 """
 
+from __future__ import annotations
+
+import asyncio
 import os
 import pickle
+import threading
+import time
+from dataclasses import dataclass
 from pathlib import Path
-from typing import List
-import numpy as np
-import requests
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+from bm25_everlast import IndiceBM25, fusion_rrf, terminos_exactos
+from catalogo_productos import CatalogoProductos
+from indice_faiss import aplicar_parametros_busqueda, leer_indice_faiss
+from presupuesto_tokens import SEPARADOR_FRAGMENTOS
+from sesiones import AlmacenSesiones, crear_almacen
+from versiones_vectorstore import carpeta_version, version_actual
+
+# Los módulos que usan numpy se importan al cargar el vector store o crear
+# las cachés, no al importar este módulo: así el arranque no paga numpy
+if TYPE_CHECKING:
+    import numpy as np
+    from almacen_chunks import AlmacenChunks
+    from cache_embeddings import CacheEmbeddings
+    from cache_respuestas import CacheRespuestas
+    from cuantizacion_vectores import VectoresCompletos
+    from proveedores_embeddings import ProveedorEmbeddings
+
 
-from langchain_core.tools import Tool
+# Similitud coseno mínima para que un chunk se considere relevante
+UMBRAL_SIMILITUD = float(os.environ.get("EVERLAST_UMBRAL_SIMILITUD", 0.25))
 
 
 # =============================================================================
 # CACHÉ EN MEMORIA
 # =============================================================================
 
-_vector_store_cache = None
-_chunks_cache = None
+@dataclass(frozen=True)
+class VectorStoreCargado:
+    """
+    Una versión del vector store cargada. Es inmutable: una recarga arma otra
+    y reemplaza la referencia global (RCU). Cada búsqueda toma la referencia
+    una vez y usa índice, chunks y BM25 de la misma versión aunque a la mitad
+    se publique otra; la vieja se libera cuando la suelta la última búsqueda.
+    """
+    version: str
+    carpeta: Path
+    index: object
+    chunks: AlmacenChunks
+    config_indice: Dict
+    bm25: Optional[IndiceBM25]
+    catalogo: Optional[CatalogoProductos]
+    # Vectores float32 para re-rankear si el índice está cuantizado o reducido
+    vectores: Optional[VectoresCompletos] = None
+
+
+_vector_store: Optional[VectorStoreCargado] = None
+_ultima_revision = 0.0
+_cache_embeddings = None
+_catalogo_cache = None
+_cache_respuestas = None
+_almacen_sesiones = None
+_proveedor_embeddings = None
+
+# Carga perezosa con doble chequeo: el primer request concurrente carga,
+# los demás esperan el lock y reutilizan lo cargado
+_lock_vector_store = threading.Lock()
+_lock_recarga = threading.Lock()
+_lock_singletons = threading.Lock()
+
+# Cada cuántos segundos se mira si create_vectorstore.py publicó otra versión
+SEGUNDOS_REVISION = float(os.environ.get("EVERLAST_RECARGA_SEGUNDOS", 5))
+
+
+def _carpeta_datos() -> Path:
+    """Ruta absoluta a la carpeta datos/ (ejecutando desde raíz o desde codigo/)"""
+    if Path.cwd().name == "codigo":
+        return Path("../datos").resolve()
+    return Path("datos").resolve()
+
+
+def obtener_cache_embeddings() -> CacheEmbeddings:
+    """
+    Caché de embeddings de consultas compartida por el proceso.
+    
+    Tamaños configurables con EVERLAST_CACHE_MEMORIA y EVERLAST_CACHE_DISCO.
+    """
+    from cache_embeddings import CacheEmbeddings
+    
+    global _cache_embeddings
+    
+    if _cache_embeddings is None:
+        with _lock_singletons:
+            if _cache_embeddings is None:
+                _cache_embeddings = CacheEmbeddings(
+                    ruta=_carpeta_datos() / "cache_embeddings.sqlite",
+                    max_memoria=int(os.environ.get("EVERLAST_CACHE_MEMORIA", 1024)),
+                    max_disco=int(os.environ.get("EVERLAST_CACHE_DISCO", 50000))
+                )
+    return _cache_embeddings
+
+
+def obtener_cache_respuestas() -> CacheRespuestas:
+    """
+    Caché semántica de respuestas compartida por todas las conversaciones.
+    
+    Configurable con EVERLAST_CACHE_RESPUESTAS_UMBRAL, _TTL (segundos) y _MAX.
+    """
+    from cache_respuestas import CacheRespuestas
+    
+    global _cache_respuestas
+    
+    if _cache_respuestas is None:
+        with _lock_singletons:
+            if _cache_respuestas is None:
+                _cache_respuestas = CacheRespuestas(
+                    umbral=float(os.environ.get("EVERLAST_CACHE_RESPUESTAS_UMBRAL", 0.92)),
+                    ttl=float(os.environ.get("EVERLAST_CACHE_RESPUESTAS_TTL", 3600)),
+                    max_entradas=int(os.environ.get("EVERLAST_CACHE_RESPUESTAS_MAX", 1000))
+                )
+    return _cache_respuestas
+
+
+def obtener_almacen_sesiones() -> AlmacenSesiones:
+    """
+    Almacén de sesiones de conversación compartido por el proceso.
+    
+    Backend según EVERLAST_SESIONES ("memoria", "sqlite[:ruta]" o "redis://...");
+    vencimiento con EVERLAST_SESIONES_TTL (segundos).
+    """
+    global _almacen_sesiones
+    
+    if _almacen_sesiones is None:
+        with _lock_singletons:
+            if _almacen_sesiones is None:
+                _almacen_sesiones = crear_almacen(
+                    os.environ.get("EVERLAST_SESIONES", "memoria"),
+                    ruta_sqlite=_carpeta_datos() / "sesiones.sqlite",
+                    ttl=float(os.environ.get("EVERLAST_SESIONES_TTL", 86400))
+                )
+    return _almacen_sesiones
+
+
+def obtener_proveedor_embeddings() -> ProveedorEmbeddings:
+    """
+    Proveedor de embeddings de las consultas (EVERLAST_EMBEDDINGS: "http",
+    "local[:modelo]" o "hashing[:dimension]"). Debe ser el mismo con que se
+    construyó el vector store: la carga lo valida contra config.pkl.
+    """
+    from proveedores_embeddings import crear_proveedor
+    
+    global _proveedor_embeddings
+    
+    if _proveedor_embeddings is None:
+        with _lock_singletons:
+            if _proveedor_embeddings is None:
+                _proveedor_embeddings = crear_proveedor(os.environ.get("EVERLAST_EMBEDDINGS"))
+    return _proveedor_embeddings
+
+
+def _raiz_vector_store() -> Path:
+    return _carpeta_datos() / "vectorstore_faiss"
+
+
+def _version_en_disco() -> str:
+    """
+    Versión publicada en disco: el nombre en ACTUAL o, en un vector store sin
+    versiones, fecha y tamaño de index.faiss y config.pkl.
+    """
+    raiz = _raiz_vector_store()
+    version = version_actual(raiz)
+    if version is not None:
+        return version
+    
+    partes = []
+    for nombre in ("index.faiss", "config.pkl"):
+        try:
+            info = (raiz / nombre).stat()
+            partes.append(f"{info.st_mtime_ns:x}-{info.st_size:x}")
+        except FileNotFoundError:
+            partes.append("0")
+    return ".".join(partes)
+
+
+def version_vector_store() -> str:
+    """
+    Versión del vector store que se está sirviendo (la de disco si aún no se
+    cargó). La caché de respuestas se vacía cuando cambia, así que nunca
+    mezcla respuestas de dos versiones.
+    """
+    vs = _vector_store
+    if vs is None:
+        return _version_en_disco()
+    _revisar_version()
+    return _vector_store.version
 
 
 # =============================================================================
 # FUNCIONES DE CARGA
 # =============================================================================
 
+def vector_store_actual() -> VectorStoreCargado:
+    """
+    Versión vigente del vector store (la carga la primera vez).
+    
+    Thread-safe: una sola carga por proceso aunque lleguen varias consultas a
+    la vez (sesiones de Streamlit, conversaciones async). El índice y los
+    chunks quedan memory-mapped y de solo lectura, compartidos entre workers.
+    
+    Cada EVERLAST_RECARGA_SEGUNDOS se revisa si hay una versión nueva; si la
+    hay, se carga en un hilo aparte mientras las consultas siguen con la
+    anterior, y se cambia la referencia de una vez (sin pausa ni reinicio).
+    
+    Raises:
+        FileNotFoundError: Si el vector store no existe
+    """
+    global _vector_store, _ultima_revision
+    
+    # Retornar desde caché si existe (sin lock: la referencia ya está publicada)
+    vs = _vector_store
+    if vs is not None:
+        _revisar_version()
+        return _vector_store
+    
+    with _lock_vector_store:
+        if _vector_store is None:
+            _vector_store = _cargar_vector_store(_version_en_disco())
+            _ultima_revision = time.monotonic()
+        return _vector_store
+
+
 def obtener_vector_store():
     """
     Carga el vector store FAISS desde disco (versión compatible Windows).
     
     Returns:
-        tuple: (faiss_index, chunks)
+        tuple: (faiss_index, AlmacenChunks) de la versión vigente
     
     Raises:
         FileNotFoundError: Si el vector store no existe
     """
-    global _vector_store_cache, _chunks_cache
+    vs = vector_store_actual()
+    return vs.index, vs.chunks
+
+
+def precalentar():
+    """
+    Carga el vector store (y con él faiss y el catálogo) en un hilo de fondo.
     
-    # Retornar desde caché si existe
-    if _vector_store_cache is not None and _chunks_cache is not None:
-        print(">> Reutilizando Vector Store desde caché...")
-        return _vector_store_cache, _chunks_cache
+    La CLI y Streamlit lo llaman al arrancar: la interfaz queda lista de
+    inmediato y la primera consulta ya no paga la carga desde disco.
+    """
+    def _cargar():
+        try:
+            vector_store_actual()
+        except Exception as e:
+            print(f"   ⚠️  Precarga del vector store falló: {e}")
     
-    print(">> Cargando Vector Store desde disco...")
+    threading.Thread(target=_cargar, daemon=True, name="precarga-vector-store").start()
+
+
+def _revisar_version():
+    """
+    Si pasó el intervalo, compara la versión de disco con la servida y lanza
+    la recarga en segundo plano. Nunca bloquea: si otro hilo ya está
+    revisando o recargando, sigue de largo.
+    """
+    global _ultima_revision
     
-    # Detectar ruta
-    if Path.cwd().name == "codigo":
-        vectorstore_path = Path("../datos/vectorstore_faiss")
-    else:
-        vectorstore_path = Path("datos/vectorstore_faiss")
+    if time.monotonic() - _ultima_revision < SEGUNDOS_REVISION:
+        return
+    if not _lock_recarga.acquire(blocking=False):
+        return
+    
+    _ultima_revision = time.monotonic()
+    version = _version_en_disco()
+    if _vector_store is None or version == _vector_store.version:
+        _lock_recarga.release()
+        return
+    
+    threading.Thread(target=_recargar, args=(version,), daemon=True,
+                     name="recarga-vector-store").start()
+
+
+def _recargar(version: str):
+    """Carga la versión nueva sin tocar la vigente y luego cambia la referencia (RCU)"""
+    global _vector_store
+    
+    try:
+        print(f">> Nueva versión del vector store ({version}): cargando en segundo plano...")
+        nuevo = _cargar_vector_store(version)
+        _vector_store = nuevo
+        print(f"   ✅ Vector store {version} en servicio")
+    except Exception as e:
+        # Se sigue sirviendo la versión anterior; se reintenta en la próxima revisión
+        print(f"   ⚠️  No se pudo cargar la versión {version}: {e}")
+    finally:
+        _lock_recarga.release()
+
+
+def _cargar_vector_store(version: str) -> VectorStoreCargado:
+    """Carga una versión desde disco (no publica nada: eso lo hace quien llama)"""
+    print(">> Cargando Vector Store desde disco...")
     
-    vectorstore_path = vectorstore_path.resolve()
+    # Carpeta de la versión pedida (o la raíz si el vector store no está versionado);
+    # no se relee ACTUAL, así los archivos corresponden a la etiqueta `version`
+    vectorstore_path = carpeta_version(_raiz_vector_store(), version)
     
     # Verificar que existe
     if not vectorstore_path.exists():
@@ -67,6 +326,9 @@ def obtener_vector_store():
     
     try:
         import faiss
+        from almacen_chunks import abrir_almacen
+        from cuantizacion_vectores import VectoresCompletos
+        from proveedores_embeddings import validar_proveedor
         
         # Intentar cargar FAISS (compatible Windows)
         faiss_file = str(vectorstore_path / "index.faiss")
@@ -75,9 +337,17 @@ def obtener_vector_store():
         if not Path(faiss_file).exists():
             raise FileNotFoundError(f"Archivo no encontrado: {faiss_file}")
         
-        # Cargar índice FAISS
+        # Parámetros de búsqueda del tipo de índice (nprobe, efSearch) y métrica;
+        # el tipo decide también cómo se mapea index.faiss
+        config = {}
+        if (vectorstore_path / "config.pkl").exists():
+            with open(vectorstore_path / "config.pkl", 'rb') as f:
+                config = pickle.load(f)
+        config_indice = config.get('indice', {'metrica': 'l2'})
+        
+        # Cargar índice FAISS (memory-mapped si se puede)
         try:
-            index = faiss.read_index(faiss_file)
+            index = leer_indice_faiss(faiss_file, config_indice.get('tipo'))
         except Exception as e1:
             # Método alternativo para Windows
             print(f"   Intento 1 falló, probando método alternativo...")
@@ -89,78 +359,340 @@ def obtener_vector_store():
             index = faiss.read_index(tmp_path)
             os.unlink(tmp_path)
         
-        # Cargar chunks
-        with open(vectorstore_path / "chunks.pkl", 'rb') as f:
-            chunks = pickle.load(f)
+        # Abrir chunks (memory-mapped, solo lectura; un chunks.pkl antiguo se migra offline)
+        chunks = abrir_almacen(vectorstore_path)
+        
+        aplicar_parametros_busqueda(index, config_indice)
         
-        print(f"   ✅ Vector Store cargado ({index.ntotal} vectores)")
+        # Las consultas tienen que embeberse con el mismo modelo que el índice
+        # (con dimensión reducida el índice es más angosto que los embeddings)
+        validar_proveedor(config, obtener_proveedor_embeddings(),
+                          config_indice.get('dimension_embeddings', index.d))
         
-        # Guardar en caché
-        _vector_store_cache = index
-        _chunks_cache = chunks
+        # Vectores completos para re-rankear (memory-mapped; solo si el índice pierde precisión)
+        vectores = None
+        if config_indice.get('rerank'):
+            vectores = VectoresCompletos.abrir(vectorstore_path)
+            if vectores is None:
+                print("   ⚠️  Sin vectores_f32.npy: búsquedas sin re-ranking")
+        
+        # Índice léxico BM25 (opcional: vector stores antiguos no lo tienen)
+        try:
+            bm25 = IndiceBM25.cargar(vectorstore_path)
+        except (FileNotFoundError, ValueError) as e:
+            print(f"   ⚠️  Sin índice BM25 ({e}); solo búsqueda vectorial")
+            bm25 = None
+        
+        print(f"   ✅ Vector Store cargado ({index.ntotal} vectores, "
+              f"índice {config_indice.get('tipo', 'flat')})")
+        
+        # Catálogo estructurado de la misma versión
+        try:
+            catalogo = CatalogoProductos.cargar(vectorstore_path)
+        except (FileNotFoundError, ValueError):
+            catalogo = None
         
-        return index, chunks
+        return VectorStoreCargado(version, vectorstore_path, index, chunks,
+                                  config_indice, bm25, catalogo, vectores)
         
     except Exception as e:
         raise Exception(f"❌ ERROR al cargar vector store: {e}")
 
 
-def buscar_similares(query: str, k: int = 3) -> List[str]:
+def obtener_catalogo() -> CatalogoProductos:
     """
-    Busca los k chunks más similares a la query usando HTTP directo.
+    Catálogo estructurado de productos (catalogo.json del vector store).
+    
+    Si el vector store es anterior al catálogo, lo parsea directo desde
+    datos/productos.md.
+    
+    Raises:
+        FileNotFoundError: Si no hay ni catalogo.json ni productos.md
+    """
+    global _catalogo_cache
+    
+    # El de la versión vigente del vector store (se actualiza con la recarga)
+    try:
+        catalogo = vector_store_actual().catalogo
+    except Exception:
+        catalogo = None
+    if catalogo is not None:
+        return catalogo
+    
+    if _catalogo_cache is None:
+        with _lock_singletons:
+            if _catalogo_cache is None:
+                _catalogo_cache = CatalogoProductos.desde_markdown(_carpeta_datos() / "productos.md")
+    return _catalogo_cache
+
+
+def _cachear_embeddings(modelo: str, queries: List[str], vectores: List, nuevos: Dict) -> np.ndarray:
+    """Guarda los embeddings nuevos en la caché y arma la matriz en el orden de queries"""
+    import numpy as np
+    
+    cache = obtener_cache_embeddings()
+    for query, vector in nuevos.items():
+        cache.guardar(modelo, query, vector)
+    vectores = [v if v is not None else nuevos[q] for q, v in zip(queries, vectores)]
+    return np.vstack(vectores).astype(np.float32)
+
+
+def obtener_embeddings_consultas(queries: List[str]) -> np.ndarray:
+    """
+    Embeddings de varias consultas: las que están en caché no tocan la red y
+    todas las demás (sin repetidos) van juntas en un único request.
+    Los proveedores locales sin caché (hashing) se calculan directo.
+    
+    Args:
+        queries: Textos de búsqueda
+    
+    Returns:
+        np.ndarray: Matriz float32 (len(queries), dimension)
+    """
+    proveedor = obtener_proveedor_embeddings()
+    if not proveedor.usa_cache:
+        return proveedor.embeber(queries)
+    
+    cache = obtener_cache_embeddings()
+    vectores = [cache.obtener(proveedor.modelo, query) for query in queries]
+    
+    faltantes = list(dict.fromkeys(q for q, v in zip(queries, vectores) if v is None))
+    nuevos = dict(zip(faltantes, proveedor.embeber(faltantes))) if faltantes else {}
+    return _cachear_embeddings(proveedor.modelo, queries, vectores, nuevos)
+
+
+async def obtener_embeddings_consultas_async(queries: List[str]) -> np.ndarray:
+    """Versión async de obtener_embeddings_consultas: solo el request HTTP cede el loop"""
+    proveedor = obtener_proveedor_embeddings()
+    if not proveedor.usa_cache:
+        return await proveedor.embeber_async(queries)
+    
+    cache = obtener_cache_embeddings()
+    vectores = [cache.obtener(proveedor.modelo, query) for query in queries]
+    
+    faltantes = list(dict.fromkeys(q for q, v in zip(queries, vectores) if v is None))
+    nuevos = dict(zip(faltantes, await proveedor.embeber_async(faltantes))) if faltantes else {}
+    return _cachear_embeddings(proveedor.modelo, queries, vectores, nuevos)
+
+
+def obtener_embedding_consulta(query: str) -> np.ndarray:
+    """
+    Embedding de una consulta, usando la caché antes de ir a la red.
     
     Args:
         query: Texto de búsqueda
-        k: Número de resultados
     
     Returns:
-        List[str]: Lista de textos relevantes
+        np.ndarray: Vector float32 de forma (1, dimension)
+    """
+    return obtener_embeddings_consultas([query])
+
+
+def _a_similitud(puntajes: np.ndarray, metrica: str) -> np.ndarray:
+    """
+    Convierte lo que devuelve FAISS en similitud coseno.
+    
+    Con producto interno sobre vectores normalizados ya es el coseno. En índices
+    L2 antiguos se usa ||a-b||² = 2 - 2·cos (los embeddings de OpenAI tienen norma 1).
+    """
+    if metrica == 'ip':
+        return puntajes
+    return 1.0 - puntajes / 2.0
+
+
+def _buscar_ids_matriz(vs: VectorStoreCargado, matriz: np.ndarray, k: int,
+                       umbral: float) -> List[List[Tuple[int, float]]]:
     """
-    # Cargar vector store
-    index, chunks = obtener_vector_store()
+    Una búsqueda FAISS para todas las filas: (id, similitud) sobre el umbral.
     
-    # Generar embedding de la query usando HTTP
-    github_token = os.environ.get("GITHUB_TOKEN")
-    embeddings_url = os.environ.get("OPENAI_EMBEDDINGS_URL")
+    Si el índice está cuantizado o usa dimensión reducida, pide k × factor
+    candidatos y los reordena con el coseno exacto de los vectores completos
+    (EVERLAST_FACTOR_RERANK cambia el factor; 0 lo desactiva).
+    """
+    import numpy as np
+    from cuantizacion_vectores import reducir_dimension
+    
+    # Normalizados para coseno
+    matriz /= np.maximum(np.linalg.norm(matriz, axis=1, keepdims=True), 1e-12)
     
-    if not github_token or not embeddings_url:
-        raise ValueError("Variables de entorno GITHUB_TOKEN y OPENAI_EMBEDDINGS_URL requeridas")
+    factor = int(os.environ.get("EVERLAST_FACTOR_RERANK", vs.config_indice.get('rerank', 0)))
+    consultas = reducir_dimension(matriz, vs.config_indice.get('dimension_reducida'))
     
-    # Hacer request HTTP
-    url = f"{embeddings_url.rstrip('/')}/embeddings"
-    headers = {
-        "Authorization": f"Bearer {github_token}",
-        "Content-Type": "application/json"
-    }
-    payload = {
-        "model": "text-embedding-3-small",
-        "input": [query]
-    }
+    if factor > 0 and vs.vectores is not None:
+        _, candidatos = vs.index.search(consultas, k * factor)
+        similitudes, indices = vs.vectores.reordenar(matriz, candidatos, k)
+    else:
+        puntajes, indices = vs.index.search(consultas, k)
+        similitudes = _a_similitud(puntajes, vs.config_indice.get('metrica', 'l2'))
+    
+    # -1 = sin resultado
+    return [
+        [(int(idx), float(similitud)) for idx, similitud in zip(fila_ids, fila_sim)
+         if idx >= 0 and similitud >= umbral]
+        for fila_ids, fila_sim in zip(indices, similitudes)
+    ]
+
+
+def _buscar_ids_batch(vs: VectorStoreCargado, queries: List[str], k: int,
+                      umbral: float) -> List[List[Tuple[int, float]]]:
+    """Búsqueda vectorial en lote: para cada consulta, (id, similitud) sobre el umbral"""
+    return _buscar_ids_matriz(vs, obtener_embeddings_consultas(queries), k, umbral)
+
+
+async def _buscar_ids_batch_async(vs: VectorStoreCargado, queries: List[str], k: int,
+                                  umbral: float) -> List[List[Tuple[int, float]]]:
+    """Versión async de _buscar_ids_batch"""
+    return _buscar_ids_matriz(vs, await obtener_embeddings_consultas_async(queries), k, umbral)
+
+
+def buscar_similares_batch(queries: List[str], k: int = 3,
+                           umbral: Optional[float] = None) -> List[List[Tuple[str, float]]]:
+    """
+    Recupera para muchas consultas a la vez: un request de embeddings para
+    todas las que no estén en caché y una sola búsqueda FAISS vectorizada.
     
-    response = requests.post(url, headers=headers, json=payload, timeout=30)
+    Pensado para evaluaciones offline, warm-up y consultas múltiples del agente.
     
-    if response.status_code != 200:
-        raise Exception(f"Error al generar embedding: {response.status_code}")
+    Args:
+        queries: Textos de búsqueda
+        k: Número máximo de resultados por consulta
+        umbral: Similitud coseno mínima (por defecto UMBRAL_SIMILITUD)
     
-    data = response.json()
-    query_embedding = np.array([data['data'][0]['embedding']], dtype=np.float32)
+    Returns:
+        List[List[Tuple[str, float]]]: Para cada consulta, (texto, similitud)
+        de mayor a menor similitud
+    """
+    if not queries:
+        return []
+    if umbral is None:
+        umbral = UMBRAL_SIMILITUD
     
-    # Buscar en FAISS
-    distances, indices = index.search(query_embedding, k)
+    vs = vector_store_actual()
     
-    # Obtener chunks correspondientes
     resultados = []
-    for idx in indices[0]:
-        if idx < len(chunks):
-            resultados.append(chunks[idx].page_content)
+    for hits in _buscar_ids_batch(vs, queries, k, umbral):
+        textos = [(vs.chunks.texto(idx), similitud) for idx, similitud in hits]
+        resultados.append([(texto, similitud) for texto, similitud in textos if texto is not None])
+    
+    return resultados
+
+
+def buscar_similares(query: str, k: int = 3, umbral: Optional[float] = None) -> List[Tuple[str, float]]:
+    """
+    Busca los k chunks más similares a la query usando HTTP directo.
+    
+    Las consultas repetidas reutilizan el embedding cacheado y no tocan la red.
+    
+    Args:
+        query: Texto de búsqueda
+        k: Número máximo de resultados
+        umbral: Similitud coseno mínima (por defecto UMBRAL_SIMILITUD)
     
+    Returns:
+        List[Tuple[str, float]]: (texto, similitud) de mayor a menor similitud;
+        puede traer menos de k si el resto no supera el umbral
+    """
+    return buscar_similares_batch([query], k=k, umbral=umbral)[0]
+
+
+def _hits_lexicos(bm25: IndiceBM25, query: str, k: int):
+    """
+    Parte léxica de la búsqueda híbrida.
+    
+    Returns:
+        (lexicos, hits): ranking BM25 y, si la consulta se resuelve por la ruta
+        exacta, los hits finales (None si hace falta la parte vectorial)
+    """
+    lexicos = bm25.buscar(query, k=k * 4)
+    exactos = terminos_exactos(query)
+    
+    # Ruta exacta: 100% local
+    if exactos and lexicos and bm25.contiene_exactos(lexicos[0][0], exactos):
+        print(f"   ⚡ Coincidencia exacta {sorted(exactos)}: sin embeddings")
+        return lexicos, [(idx, puntaje) for idx, puntaje in lexicos
+                         if bm25.contiene_exactos(idx, exactos)][:k]
+    return lexicos, None
+
+
+def _textos_de_hits(vs: VectorStoreCargado, hits) -> List[Tuple[str, float]]:
+    resultados = []
+    for idx, puntaje in hits:
+        texto = vs.chunks.texto(idx)
+        if texto is not None:
+            resultados.append((texto, float(puntaje)))
     return resultados
 
 
+def buscar_hibrido(query: str, k: int = 3) -> List[Tuple[str, float]]:
+    """
+    Búsqueda híbrida léxica (BM25) + vectorial con Reciprocal Rank Fusion.
+    
+    Si la consulta trae SKUs o medidas ("GPL-002", "16 oz") y el mejor resultado
+    BM25 los contiene todos, se responde solo con BM25: sin llamada de embeddings.
+    
+    Args:
+        query: Texto de búsqueda
+        k: Número máximo de resultados
+    
+    Returns:
+        List[Tuple[str, float]]: (texto, puntaje) de mayor a menor relevancia.
+        El puntaje es BM25 en la ruta solo-léxica y RRF en la híbrida.
+    """
+    vs = vector_store_actual()
+    
+    if vs.bm25 is None:
+        return _textos_de_hits(vs, _buscar_ids_batch(vs, [query], k, UMBRAL_SIMILITUD)[0])
+    
+    lexicos, hits = _hits_lexicos(vs.bm25, query, k)
+    if hits is None:
+        vectoriales = _buscar_ids_batch(vs, [query], k * 4, UMBRAL_SIMILITUD)[0]
+        hits = fusion_rrf([[idx for idx, _ in vectoriales], [idx for idx, _ in lexicos]], k)
+    
+    return _textos_de_hits(vs, hits)
+
+
+async def buscar_hibrido_async(query: str, k: int = 3) -> List[Tuple[str, float]]:
+    """
+    Versión async de buscar_hibrido: el embedding de la consulta se pide con
+    aiohttp y el loop sigue atendiendo otras conversaciones mientras tanto.
+    La primera carga del vector store (disco) va a un hilo.
+    """
+    if _vector_store is None:
+        await asyncio.to_thread(vector_store_actual)
+    vs = vector_store_actual()
+    
+    if vs.bm25 is None:
+        hits = (await _buscar_ids_batch_async(vs, [query], k, UMBRAL_SIMILITUD))[0]
+        return _textos_de_hits(vs, hits)
+    
+    lexicos, hits = _hits_lexicos(vs.bm25, query, k)
+    if hits is None:
+        vectoriales = (await _buscar_ids_batch_async(vs, [query], k * 4, UMBRAL_SIMILITUD))[0]
+        hits = fusion_rrf([[idx for idx, _ in vectoriales], [idx for idx, _ in lexicos]], k)
+    
+    return _textos_de_hits(vs, hits)
+
+
 # =============================================================================
 # DEFINICIÓN DE HERRAMIENTAS
 # =============================================================================
 
+def _formatear_fragmentos(resultados: List[Tuple[str, float]]) -> str:
+    if not resultados:
+        mensaje = "No se encontró información relevante en los documentos de Everlast."
+        print(f"   ⚠️  {mensaje}")
+        return mensaje
+    
+    contexto = "\n\n".join(
+        f"{SEPARADOR_FRAGMENTOS}\n\n{texto}" for texto, _ in resultados
+    )
+    
+    print(f"   ✅ {len(resultados)} fragmentos recuperados")
+    print(f"   📄 Vista previa: {contexto[:150]}...")
+    
+    return contexto
+
+
 def buscar_documentos_everlast(query: str) -> str:
     """
     Busca información relevante en la base de conocimiento de Everlast.
@@ -175,21 +707,26 @@ def buscar_documentos_everlast(query: str) -> str:
     print(f"   Query: '{query}'")
     
     try:
-        # Buscar chunks similares
-        resultados = buscar_similares(query, k=3)
-        
-        if not resultados:
-            mensaje = "No se encontró información relevante en los documentos de Everlast."
-            print(f"   ⚠️  {mensaje}")
-            return mensaje
+        # Buscar chunks (BM25 + vectorial)
+        return _formatear_fragmentos(buscar_hibrido(query, k=3))
         
-        # Formatear contexto
-        contexto = "\n\n--- FRAGMENTO ---\n\n".join(resultados)
-        
-        print(f"   ✅ {len(resultados)} fragmentos recuperados")
-        print(f"   📄 Vista previa: {contexto[:150]}...")
+    except FileNotFoundError as e:
+        print(f"   ❌ {e}")
+        return str(e)
         
-        return contexto
+    except Exception as e:
+        error_msg = f"Error al buscar en documentos: {str(e)}"
+        print(f"   ❌ {error_msg}")
+        return error_msg
+
+
+async def buscar_documentos_everlast_async(query: str) -> str:
+    """Versión async de buscar_documentos_everlast (para AgenteEverlast.procesar_async)"""
+    print(f"\n🔍 [TOOL] BusquedaDocumentosEverlast (async)")
+    print(f"   Query: '{query}'")
+    
+    try:
+        return _formatear_fragmentos(await buscar_hibrido_async(query, k=3))
         
     except FileNotFoundError as e:
         print(f"   ❌ {e}")
@@ -201,6 +738,38 @@ def buscar_documentos_everlast(query: str) -> str:
         return error_msg
 
 
+def consultar_catalogo(consulta: str) -> str:
+    """
+    Consulta exacta al catálogo de productos: SKU, categoría, peso/talla,
+    color y rango de precio. No usa embeddings ni red.
+    
+    Args:
+        consulta: Filtros "clave=valor" separados por ';' (ej: "categoria=guantes;
+            peso=16 oz; precio<=40000") o texto libre ("GPL-002", "guantes 16 oz rojo")
+    
+    Returns:
+        str: Una línea por producto encontrado o mensaje si no hay coincidencias
+    """
+    print(f"\n🏷️  [TOOL] CatalogoProductos")
+    print(f"   Consulta: '{consulta}'")
+    
+    try:
+        productos = obtener_catalogo().consultar(consulta)
+        
+        if not productos:
+            mensaje = "Ningún producto del catálogo cumple esos criterios."
+            print(f"   ⚠️  {mensaje}")
+            return mensaje
+        
+        print(f"   ✅ {len(productos)} productos")
+        return "\n".join(producto.formatear() for producto in productos)
+        
+    except Exception as e:
+        error_msg = f"Error al consultar el catálogo: {str(e)}"
+        print(f"   ❌ {error_msg}")
+        return error_msg
+
+
 def simple_calculator(expression: str) -> str:
     """
     Calculadora simple para operaciones matemáticas básicas.
@@ -244,42 +813,77 @@ def simple_calculator(expression: str) -> str:
 # CREACIÓN DE OBJETOS TOOL
 # =============================================================================
 
-everlast_rag_tool = Tool(
-    name="BusquedaDocumentosEverlast",
-    func=buscar_documentos_everlast,
-    description=(
-        "Busca información específica en la base de conocimiento interna de "
-        "Everlast Chile. Contiene datos sobre: productos (guantes, vendas, sacos, "
-        "ropa deportiva), especificaciones técnicas, tablas de tallas, políticas "
-        "de envío, políticas de devolución, y recomendaciones de uso.\n\n"
-        "**CUÁNDO USAR:** Usa esta herramienta SIEMPRE como primera opción para "
-        "cualquier pregunta relacionada con Everlast, sus productos o servicios.\n\n"
-        "**INPUT:** La pregunta específica del usuario en español.\n"
-        "**OUTPUT:** Fragmentos de texto relevantes de los documentos internos."
-    )
-)
-
-calculator_tool = Tool(
-    name="CalculadoraSimple",
-    func=simple_calculator,
-    description=(
-        "Calculadora para operaciones matemáticas básicas. Soporta suma (+), "
-        "resta (-), multiplicación (*), división (/) y paréntesis.\n\n"
-        "**CUÁNDO USAR:** Para calcular descuentos, conversiones de unidades, "
-        "totales de compra, porcentajes, etc.\n\n"
-        "**INPUT:** Expresión matemática como string. "
-        "Ejemplos: '100 * 0.8', '(50+30)*1.19', '16 * 0.453592'\n"
-        "**OUTPUT:** El resultado numérico del cálculo."
-    )
-)
+# Los Tool de LangChain se arman recién cuando alguien los pide (get_tools o
+# tools_everlast.everlast_rag_tool): importar langchain_core.tools toma
+# ~0.3 s y el agente llama a las funciones directo, sin usarlos.
+DEFINICIONES_TOOLS = {
+    "everlast_rag_tool": dict(
+        name="BusquedaDocumentosEverlast",
+        func=buscar_documentos_everlast,
+        description=(
+            "Busca información específica en la base de conocimiento interna de "
+            "Everlast Chile. Contiene datos sobre: productos (guantes, vendas, sacos, "
+            "ropa deportiva), especificaciones técnicas, tablas de tallas, políticas "
+            "de envío, políticas de devolución, y recomendaciones de uso.\n\n"
+            "**CUÁNDO USAR:** Usa esta herramienta SIEMPRE como primera opción para "
+            "cualquier pregunta relacionada con Everlast, sus productos o servicios.\n\n"
+            "**INPUT:** La pregunta específica del usuario en español.\n"
+            "**OUTPUT:** Fragmentos de texto relevantes de los documentos internos."
+        )
+    ),
+    "catalogo_tool": dict(
+        name="CatalogoProductos",
+        func=consultar_catalogo,
+        description=(
+            "Consulta exacta del catálogo de productos Everlast: SKU, precio por "
+            "peso/talla, colores y categoría.\n\n"
+            "**CUÁNDO USAR:** Para precios, disponibilidad de tallas, pesos o colores, "
+            "y para filtrar productos por rango de precio.\n\n"
+            "**INPUT:** Filtros 'clave=valor' separados por ';' (claves: sku, categoria, "
+            "color, peso/talla, nombre, precio con <=, >= o =). "
+            "Ejemplos: 'sku=GPL-002', 'categoria=guantes; peso=16 oz; precio<=40000'\n"
+            "**OUTPUT:** Una línea por producto con SKU, nombre, precios por variante y colores."
+        )
+    ),
+    "calculator_tool": dict(
+        name="CalculadoraSimple",
+        func=simple_calculator,
+        description=(
+            "Calculadora para operaciones matemáticas básicas. Soporta suma (+), "
+            "resta (-), multiplicación (*), división (/) y paréntesis.\n\n"
+            "**CUÁNDO USAR:** Para calcular descuentos, conversiones de unidades, "
+            "totales de compra, porcentajes, etc.\n\n"
+            "**INPUT:** Expresión matemática como string. "
+            "Ejemplos: '100 * 0.8', '(50+30)*1.19', '16 * 0.453592'\n"
+            "**OUTPUT:** El resultado numérico del cálculo."
+        )
+    ),
+}
+
+_tools_cache: Dict[str, object] = {}
+
 
+def _crear_tool(nombre: str):
+    """Tool de LangChain de una definición (se crea una vez)"""
+    if nombre not in _tools_cache:
+        from langchain_core.tools import Tool
+        _tools_cache[nombre] = Tool(**DEFINICIONES_TOOLS[nombre])
+    return _tools_cache[nombre]
 
-def get_tools() -> List[Tool]:
+
+def __getattr__(nombre: str):
+    """Compatibilidad: tools_everlast.everlast_rag_tool etc. siguen existiendo (perezosos)"""
+    if nombre in DEFINICIONES_TOOLS:
+        return _crear_tool(nombre)
+    raise AttributeError(f"module {__name__!r} has no attribute {nombre!r}")
+
+
+def get_tools() -> List["Tool"]:
     """
     Retorna la lista completa de herramientas disponibles para el agente.
     
     Returns:
-        List[Tool]: Lista de herramientas configuradas
+        List[Tool]: Lista de herramientas configuradas (langchain_core.tools.Tool)
     """
     print("\n📦 Inicializando herramientas del agente...")
     
@@ -290,7 +894,7 @@ def get_tools() -> List[Tool]:
     except Exception as e:
         print(f"   ⚠️  Advertencia: {e}")
     
-    tools = [everlast_rag_tool, calculator_tool]
+    tools = [_crear_tool(nombre) for nombre in DEFINICIONES_TOOLS]
     print(f"   ✅ {len(tools)} herramientas disponibles: {[t.name for t in tools]}\n")
     
     return tools
@@ -328,6 +932,13 @@ if __name__ == '__main__':
     except Exception as e:
         print(f"\n❌ Error: {e}")
     
+    # Segunda vez: el embedding sale de la caché
+    try:
+        buscar_similares(query_prueba, k=3)
+        print(f"\n📊 Caché de embeddings: {obtener_cache_embeddings().estadisticas()}")
+    except Exception as e:
+        print(f"\n❌ Error: {e}")
+    
     # PRUEBA 2: Calculadora
     print("\n" + "=" * 80)
     print("PRUEBA 2: Calculadora")
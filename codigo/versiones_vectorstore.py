@@ -0,0 +1,157 @@
+"""
+versiones_vectorstore.py
+========================
+Versiones inmutables del vector store publicadas de forma atómica.
+
+Estructura en disco:
+
+    datos/vectorstore_faiss/
+    ├── ACTUAL                    # nombre de la versión vigente
+    ├── versiones/
+    │   ├── 20250101-120000-4242/ # index.faiss, chunks_*, bm25, catalogo.json, ...
+    │   └── 20250102-093000-5151/
+    └── .checkpoint_embeddings/   # lotes de un build en curso
+
+create_vectorstore.py construye en versiones/.tmp-<version>/, la renombra a
+versiones/<version>/ (rename atómico de directorio) y recién entonces
+reemplaza ACTUAL con os.replace. Un lector ve la versión anterior completa o
+la nueva completa, nunca una a medio escribir. Las versiones no se modifican
+después de publicadas: el build incremental parte de la vigente y escribe
+una nueva.
+
+Un vector store antiguo (archivos directo en vectorstore_faiss/, sin ACTUAL)
+se sigue leyendo tal cual.
+
+Autor: Evaluación 2 - Everlast Chile
+"""
+
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+
+ARCHIVO_ACTUAL = "ACTUAL"
+CARPETA_VERSIONES = "versiones"
+PREFIJO_STAGING = ".tmp-"
+
+
+def nombre_version() -> str:
+    """Nombre ordenable por fecha (el pid evita choques entre builds simultáneos)"""
+    return f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+
+
+def version_actual(raiz: Path) -> Optional[str]:
+    """Versión vigente según ACTUAL (None si el vector store no está versionado)"""
+    try:
+        version = (Path(raiz) / ARCHIVO_ACTUAL).read_text(encoding="utf-8").strip()
+    except FileNotFoundError:
+        return None
+    return version or None
+
+
+def carpeta_actual(raiz: Path) -> Path:
+    """Carpeta con los archivos de la versión vigente (la raíz si no hay versiones)"""
+    raiz = Path(raiz)
+    version = version_actual(raiz)
+    if version is None:
+        return raiz
+    return raiz / CARPETA_VERSIONES / version
+
+
+def carpeta_version(raiz: Path, version: str) -> Path:
+    """
+    Carpeta de una versión ya leída de ACTUAL (la raíz si no hay versiones).
+    A diferencia de carpeta_actual no vuelve a leer ACTUAL: si otro build
+    publicó entretanto, se sigue cargando la versión pedida.
+    """
+    raiz = Path(raiz)
+    if not (raiz / ARCHIVO_ACTUAL).exists():
+        return raiz
+    return raiz / CARPETA_VERSIONES / version
+
+
+def listar_versiones(raiz: Path) -> List[str]:
+    """Versiones publicadas, de la más antigua a la más nueva"""
+    carpeta = Path(raiz) / CARPETA_VERSIONES
+    if not carpeta.exists():
+        return []
+    return sorted(
+        d.name for d in carpeta.iterdir()
+        if d.is_dir() and not d.name.startswith(PREFIJO_STAGING)
+    )
+
+
+def preparar_version(raiz: Path) -> Tuple[str, Path]:
+    """
+    Crea la carpeta temporal donde se construye una versión nueva.
+
+    Returns:
+        (version, carpeta_staging)
+    """
+    version = nombre_version()
+    staging = Path(raiz) / CARPETA_VERSIONES / f"{PREFIJO_STAGING}{version}"
+    staging.mkdir(parents=True, exist_ok=False)
+    return version, staging
+
+
+def publicar_version(raiz: Path, version: str, staging: Path) -> Path:
+    """
+    Publica una versión construida en staging: rename atómico de la carpeta y
+    luego reemplazo atómico de ACTUAL.
+
+    Returns:
+        Carpeta final de la versión
+    """
+    raiz = Path(raiz)
+    final = raiz / CARPETA_VERSIONES / version
+    os.replace(staging, final)
+
+    tmp = raiz / f"{ARCHIVO_ACTUAL}.tmp{os.getpid()}"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(version)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, raiz / ARCHIVO_ACTUAL)
+    return final
+
+
+def descartar_staging(staging: Path):
+    """Borra una construcción que falló a la mitad"""
+    shutil.rmtree(staging, ignore_errors=True)
+
+
+def podar_versiones(raiz: Path, conservar: int = 3, staging_max_horas: float = 24) -> List[str]:
+    """
+    Borra versiones viejas dejando la vigente y las `conservar` más nuevas
+    (para volver atrás escribiendo su nombre en ACTUAL). También limpia
+    carpetas de staging abandonadas por builds que murieron.
+
+    Los procesos que aún tengan memory-mapped una versión borrada siguen
+    leyéndola hasta soltarla (en Windows el borrado falla y se reintenta en
+    la próxima poda).
+
+    Returns:
+        Versiones borradas
+    """
+    raiz = Path(raiz)
+    vigente = version_actual(raiz)
+    versiones = listar_versiones(raiz)
+    sobrantes = [v for v in versiones[:-conservar] if v != vigente] if conservar > 0 else \
+        [v for v in versiones if v != vigente]
+
+    borradas = []
+    for version in sobrantes:
+        shutil.rmtree(raiz / CARPETA_VERSIONES / version, ignore_errors=True)
+        if not (raiz / CARPETA_VERSIONES / version).exists():
+            borradas.append(version)
+
+    carpeta = raiz / CARPETA_VERSIONES
+    if carpeta.exists():
+        limite = time.time() - staging_max_horas * 3600
+        for d in carpeta.iterdir():
+            if d.name.startswith(PREFIJO_STAGING) and d.stat().st_mtime < limite:
+                shutil.rmtree(d, ignore_errors=True)
+
+    return borradas